@@ -0,0 +1,327 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from cache_documentos import escribir_atomico
+
+# CONTROL DE ADMISIÓN DE GENERACIONES
+# Un documento del currículo se arma en milisegundos; uno que sale de la IA ocupa un hilo varios
+# segundos. Para que en las horas pico los segundos no frenen a los primeros:
+# - Carril prioritario: las generaciones con entrada en el currículo pasan siempre, sin fichas ni turno.
+# - Fichas por cliente (clave de API con cuota propia o IP): un balde de `rafaga` fichas que se recarga a
+#   `tasa` por segundo; sin ficha la generación se rechaza con 429 y Retry-After hasta la próxima. Un lote
+#   gasta una ficha por documento fuera del currículo; si pide más que la ráfaga, pasa con el balde lleno y
+#   lo deja en negativo hasta que se recargue.
+# - Turnos por worker: a lo sumo `max_en_curso` generaciones a la vez; las siguientes esperan en orden
+#   de llegada mientras la cola no pase de `max_cola` y la espera estimada (puesto en la cola por la
+#   duración media reciente, repartido entre los turnos) no pase de `max_espera_segundos`; si no, 503
+#   con Retry-After igual a esa espera, y la ficha tomada vuelve al balde.
+# Los límites se cambian en caliente; con un archivo, todos los workers releen el mismo. Los baldes y los
+# turnos son de cada worker.
+
+LIMITES_POR_DEFECTO = {
+    'tasa': 0.0,
+    'rafaga': 10,
+    'max_en_curso': 0,
+    'max_cola': 8,
+    'max_espera_segundos': 15.0,
+    'cuotas': {},
+}
+# Clientes cuyo balde se recuerda (los menos recientes se olvidan, con el balde lleno)
+MAX_CLIENTES = 10000
+RELECTURA_SEGUNDOS = 1.0
+
+
+class Rechazada(Exception):
+    def __init__(self, codigo, motivo, reintentar):
+        super().__init__(motivo)
+        self.codigo = codigo
+        # Segundos para la cabecera Retry-After
+        self.reintentar = reintentar
+
+
+def _numero(clave, valor, entero=False, minimo=0):
+    if isinstance(valor, bool) or not isinstance(valor, int if entero else (int, float)) or valor < minimo:
+        tipo = 'un entero' if entero else 'un número'
+        raise ValueError(f'{clave} debe ser {tipo} mayor o igual a {minimo}')
+    return valor if entero else float(valor)
+
+
+def _validar_cuotas(cuotas):
+    # {clave de API: {"nombre": ..., "tasa": ..., "rafaga": ...}}; tasa y rafaga por defecto las globales
+    if not isinstance(cuotas, dict):
+        raise ValueError('cuotas debe ser un objeto {clave: {nombre, tasa, rafaga}}')
+    validadas = {}
+    for clave, cuota in cuotas.items():
+        if not clave or not isinstance(cuota, dict):
+            raise ValueError(f'Cuota inválida para {clave!r}')
+        validada = {}
+        for campo, valor in cuota.items():
+            if campo == 'nombre':
+                validada[campo] = str(valor)
+            elif campo == 'tasa':
+                validada[campo] = _numero(f'cuotas.{clave}.tasa', valor)
+            elif campo == 'rafaga':
+                validada[campo] = _numero(f'cuotas.{clave}.rafaga', valor, entero=True, minimo=1)
+            else:
+                raise ValueError(f'Campo desconocido en la cuota de {clave!r}: {campo}')
+        validadas[clave] = validada
+    return validadas
+
+
+def validar_limites(cambios, actuales=LIMITES_POR_DEFECTO):
+    # Los límites actuales con los cambios aplicados; "cuotas" se reemplaza completo
+    if not isinstance(cambios, dict):
+        raise ValueError('Se esperaba un objeto con los límites')
+    limites = dict(actuales)
+    for clave, valor in cambios.items():
+        if clave in ('tasa', 'max_espera_segundos'):
+            limites[clave] = _numero(clave, valor)
+        elif clave in ('max_en_curso', 'max_cola'):
+            limites[clave] = _numero(clave, valor, entero=True)
+        elif clave == 'rafaga':
+            limites[clave] = _numero(clave, valor, entero=True, minimo=1)
+        elif clave == 'cuotas':
+            limites[clave] = _validar_cuotas(valor)
+        else:
+            raise ValueError(f'Límite desconocido: {clave}')
+    return limites
+
+
+def ip_cliente(remota, reenviada, saltos):
+    # Con `saltos` proxies de confianza delante, la IP del cliente es la que anotó el más externo de ellos
+    # en X-Forwarded-For; lo que esté más a la izquierda lo puede escribir el propio cliente
+    if saltos and reenviada:
+        ips = [ip.strip() for ip in reenviada.split(',')]
+        if len(ips) >= saltos:
+            return ips[-saltos]
+    return remota
+
+
+class Turno:
+    # Lo que ocupa una generación admitida; se libera una sola vez (al salir del with o a mano)
+    def __init__(self, control, ocupa):
+        self._control = control
+        self._ocupa = ocupa
+        self._inicio = time.monotonic()
+
+    def liberar(self):
+        if self._ocupa:
+            self._ocupa = False
+            self._control._liberar(time.monotonic() - self._inicio)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.liberar()
+
+
+class ControlAdmision:
+    def __init__(self, limites=None, archivo=None):
+        # archivo: JSON con los límites, compartido entre workers ('' o None: solo en memoria)
+        self.archivo = archivo or None
+        self._limites = validar_limites(limites or {})
+        self._base = self._limites
+        self._baldes = OrderedDict()
+        self._cola = deque()
+        self._en_curso = 0
+        self._ocupacion = {}
+        self._duracion_media = None
+        self._decisiones = {'prioritarias': 0, 'admitidas': 0, 'limitadas': 0, 'rechazadas': 0}
+        self._lock = threading.Lock()
+        self._condicion = threading.Condition(self._lock)
+        self._leido = 0.0
+        self._mtime = None
+        self._releer()
+
+    @property
+    def limites(self):
+        self._releer()
+        return self._limites
+
+    # Límites en caliente
+
+    def _releer(self):
+        if not self.archivo or time.monotonic() - self._leido < RELECTURA_SEGUNDOS:
+            return
+        self._leido = time.monotonic()
+        try:
+            mtime = os.stat(self.archivo).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.archivo, 'rb') as archivo:
+                limites = validar_limites(json.loads(archivo.read()), self._base)
+        except (OSError, ValueError):
+            # Sin archivo (nadie ajustó todavía) o a medio corregir: siguen los límites que había
+            return
+        with self._condicion:
+            self._mtime = mtime
+            self._limites = limites
+            self._condicion.notify_all()
+
+    def ajustar(self, cambios):
+        # Lanza ValueError si algún límite es inválido, sin aplicar ninguno
+        with self._condicion:
+            limites = validar_limites(cambios, self._limites)
+            if self.archivo:
+                escribir_atomico(self.archivo, json.dumps(limites, ensure_ascii=False, indent=2).encode('utf-8'))
+                self._mtime = os.stat(self.archivo).st_mtime_ns
+            self._limites = limites
+            # Con más turnos o más espera permitida, los que esperan vuelven a mirar
+            self._condicion.notify_all()
+        return limites
+
+    # Admisión
+
+    def admitir(self, clave=None, ip=None, prioritaria=False, ocupar=True, fichas=1):
+        # ocupar=False solo gasta las fichas (la generación espera en otra cola, como la de trabajos)
+        limites = self.limites
+        if prioritaria:
+            with self._lock:
+                self._decisiones['prioritarias'] += 1
+            return Turno(self, False)
+        cliente = self._tomar_fichas(limites, clave, ip, fichas)
+        if ocupar:
+            try:
+                self._esperar_turno()
+            except Rechazada:
+                # Sin turno la generación no se hizo: las fichas vuelven al balde
+                self._devolver_fichas(cliente, limites, clave, fichas)
+                raise
+        with self._lock:
+            self._decisiones['admitidas'] += 1
+        return Turno(self, ocupar)
+
+    def _cuota(self, limites, clave, ip):
+        # (cliente, tasa, rafaga): con clave de API con cuota propia, la suya; si no, la de la IP
+        cuota = limites['cuotas'].get(clave) if clave else None
+        if cuota is not None:
+            return f'clave:{clave}', cuota.get('tasa', limites['tasa']), cuota.get('rafaga', limites['rafaga'])
+        return f'ip:{ip}', limites['tasa'], limites['rafaga']
+
+    def _tomar_fichas(self, limites, clave, ip, fichas):
+        # Devuelve el cliente al que se le tomaron las fichas (None sin límite de tasa)
+        cliente, tasa, rafaga = self._cuota(limites, clave, ip)
+        if not tasa:
+            return None
+
+        ahora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.pop(cliente, None)
+            if balde is None:
+                balde = [float(rafaga), ahora]
+            else:
+                balde[0] = min(float(rafaga), balde[0] + (ahora - balde[1]) * tasa)
+                balde[1] = ahora
+            self._baldes[cliente] = balde
+            while len(self._baldes) > MAX_CLIENTES:
+                self._baldes.popitem(last=False)
+            necesarias = min(fichas, rafaga)
+            if balde[0] >= necesarias:
+                balde[0] -= fichas
+                return cliente
+            self._decisiones['limitadas'] += 1
+            faltan = (necesarias - balde[0]) / tasa
+        raise Rechazada(429, 'Demasiadas solicitudes de este cliente, intenta nuevamente en unos segundos',
+                        max(1, math.ceil(faltan)))
+
+    def _devolver_fichas(self, cliente, limites, clave, fichas):
+        if cliente is None:
+            return
+        rafaga = self._cuota(limites, clave, None)[2]
+        with self._lock:
+            balde = self._baldes.get(cliente)
+            # Si el cliente ya se olvidó, su balde vuelve lleno de todos modos
+            if balde is not None:
+                balde[0] = min(float(rafaga), balde[0] + fichas)
+
+    def _espera_estimada(self, puesto):
+        # Segundos hasta que se libere el turno del que está en ese puesto de la cola (1: el primero)
+        if self._duracion_media is None:
+            return 0.0
+        return puesto * self._duracion_media / max(1, self._limites['max_en_curso'])
+
+    def _libre(self):
+        maximo = self._limites['max_en_curso']
+        return not maximo or self._en_curso < maximo
+
+    def _rechazar(self, puesto):
+        self._decisiones['rechazadas'] += 1
+        espera = self._espera_estimada(puesto)
+        return Rechazada(503, 'Hay demasiadas generaciones en curso, intenta nuevamente en unos segundos',
+                         max(1, math.ceil(espera)))
+
+    def _esperar_turno(self):
+        with self._condicion:
+            if self._libre() and not self._cola:
+                self._en_curso += 1
+                return
+            puesto = len(self._cola) + 1
+            if len(self._cola) >= self._limites['max_cola'] \
+                    or self._espera_estimada(puesto) > self._limites['max_espera_segundos']:
+                raise self._rechazar(puesto)
+
+            turno = object()
+            self._cola.append(turno)
+            limite = time.monotonic() + self._limites['max_espera_segundos']
+            try:
+                while self._cola[0] is not turno or not self._libre():
+                    queda = limite - time.monotonic()
+                    if queda <= 0:
+                        raise self._rechazar(self._cola.index(turno) + 1)
+                    self._condicion.wait(queda)
+                self._en_curso += 1
+            finally:
+                self._cola.remove(turno)
+                self._condicion.notify_all()
+
+    def _liberar(self, segundos):
+        with self._condicion:
+            self._en_curso -= 1
+            # Media móvil: pesa más lo reciente, que es lo que va a tardar el próximo turno
+            if self._duracion_media is None:
+                self._duracion_media = segundos
+            else:
+                self._duracion_media += 0.2 * (segundos - self._duracion_media)
+            self._condicion.notify_all()
+
+    # Ocupación (consultas a la IA y renders en curso, de cualquier ruta)
+
+    @contextmanager
+    def ocupando(self, tipo):
+        with self._lock:
+            self._ocupacion[tipo] = self._ocupacion.get(tipo, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._ocupacion[tipo] -= 1
+
+    def en_curso(self, tipo=None):
+        # Sin tipo: generaciones con turno
+        with self._lock:
+            return self._en_curso if tipo is None else self._ocupacion.get(tipo, 0)
+
+    def en_cola(self):
+        with self._lock:
+            return len(self._cola)
+
+    def estado(self):
+        limites = self.limites
+        with self._lock:
+            return {
+                'limites': limites,
+                'archivo': self.archivo,
+                'en_curso': dict(self._ocupacion, generaciones=self._en_curso),
+                'en_cola': len(self._cola),
+                'duracion_media_segundos': self._duracion_media,
+                'espera_estimada_segundos': 0.0 if self._libre() and not self._cola
+                else self._espera_estimada(len(self._cola) + 1),
+                'clientes': len(self._baldes),
+                'decisiones': dict(self._decisiones),
+            }
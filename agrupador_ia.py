@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+from cache_ia import clave_ia
+from resiliencia_ia import restante
+
+# AGRUPADOR DE CONSULTAS A LA IA
+# Las consultas que llegan dentro de una ventana corta (o hasta completar max_elementos) se envían
+# juntas en un solo prompt que pide un arreglo JSON. Cada llamador recibe su elemento; si el suyo no
+# se pudo leer, el propio llamador lo reintenta con una consulta individual, igual que si quedó solo en su
+# lote. La consulta del lote corre fuera de la petición de cada llamador: se le pasa como límite el
+# presupuesto que vence primero entre ellos, y cada llamador la espera solo lo que le queda del suyo.
+
+
+class _Pedido:
+    def __init__(self, ciclo, area, tema):
+        self.ciclo = ciclo
+        self.area = area
+        self.tema = tema
+        self.listo = threading.Event()
+        self.resultado = None
+        self.solo = False
+        # Instante (monotonic) en que vence el presupuesto del llamador; None si no tiene
+        queda = restante()
+        self.limite = None if queda is None else time.monotonic() + queda
+
+
+class AgrupadorIA:
+    def __init__(self, consultar_lote, consultar_uno, ventana_segundos=0.05, max_elementos=4, registro=None):
+        # consultar_lote([(ciclo, area, tema), ...], limite=None) -> [dict o None, ...] en el mismo orden;
+        # limite: instante (monotonic) en que vence el presupuesto más corto del lote
+        # consultar_uno(ciclo, area, tema) -> dict o None
+        self.consultar_lote = consultar_lote
+        self.consultar_uno = consultar_uno
+        self.ventana_segundos = ventana_segundos
+        self.max_elementos = max_elementos
+        self.registro = registro or logging.getLogger(__name__)
+        self._abierto = None
+        self._lock = threading.Lock()
+        self.contadores = {'lotes': 0, 'elementos_agrupados': 0, 'individuales': 0, 'reintentos_individuales': 0,
+                           'errores_lote': 0, 'esperas_vencidas': 0}
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def consultar(self, ciclo, area, tema):
+        clave = clave_ia(ciclo, area, tema)
+        despachar = None
+        with self._lock:
+            if self._abierto is None:
+                self._abierto = {}
+                temporizador = threading.Timer(self.ventana_segundos, self._cerrar, (self._abierto,))
+                temporizador.daemon = True
+                temporizador.start()
+            lote = self._abierto
+            # Temas equivalentes dentro del mismo lote comparten una sola entrada del prompt
+            pedido = lote.get(clave)
+            if pedido is None:
+                pedido = lote[clave] = _Pedido(ciclo, area, tema)
+            if len(lote) >= self.max_elementos:
+                self._abierto = None
+                despachar = lote
+
+        if despachar is not None:
+            self._despachar(despachar)
+
+        queda = None if pedido.limite is None else max(0.0, pedido.limite - time.monotonic())
+        if not pedido.listo.wait(queda):
+            # Se acabó el presupuesto de este llamador antes que el lote: ya no alcanza para reintentar
+            self._contar('esperas_vencidas')
+            return None
+        if pedido.solo:
+            self._contar('individuales')
+            return self.consultar_uno(ciclo, area, tema)
+        if pedido.resultado is None:
+            self._contar('reintentos_individuales')
+            return self.consultar_uno(ciclo, area, tema)
+        return pedido.resultado
+
+    def _cerrar(self, lote):
+        with self._lock:
+            if self._abierto is not lote:
+                return
+            self._abierto = None
+        self._despachar(lote)
+
+    def _despachar(self, lote):
+        pedidos = list(lote.values())
+        try:
+            if len(pedidos) == 1:
+                # Un pedido solo no necesita el formato de arreglo: su llamador lo consulta individualmente,
+                # dentro de su propio presupuesto
+                pedidos[0].solo = True
+                return
+            limites = [p.limite for p in pedidos if p.limite is not None]
+            resultados = self.consultar_lote([(p.ciclo, p.area, p.tema) for p in pedidos],
+                                             limite=min(limites) if limites else None)
+            with self._lock:
+                self.contadores['lotes'] += 1
+                self.contadores['elementos_agrupados'] += len(pedidos)
+            for pedido, resultado in zip(pedidos, resultados):
+                pedido.resultado = resultado
+        except Exception:
+            # Los llamadores reintentan por separado
+            self._contar('errores_lote')
+            self.registro.exception('Falló la consulta de un lote de %d temas a la IA', len(pedidos))
+        finally:
+            for pedido in pedidos:
+                pedido.listo.set()
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores)
@@ -1,416 +1,235 @@
-from flask import Flask, request, jsonify, send_file, render_template_string
+# arranque va primero: marca el inicio para medir también las demás importaciones
+from arranque import RegistroArranque
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from docx import Document
-from docx.shared import Inches, Pt, RGBColor
+from docx.shared import Inches, Pt, RGBColor, Twips
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-import openai
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml import OxmlElement, parse_xml
 import os
 from io import BytesIO
 import json
+import hmac
+import tempfile
+import time
+import threading
+import itertools
+import logging
+from html import escape
+from contextlib import contextmanager
+from copy import deepcopy
+from plantilla_docx import MotorPlantilla
+from cache_documentos import CacheDocumentos, clave_documento
+from revisiones import AlmacenRevisiones
+from curriculo import Curriculo
+from cache_ia import CacheIA, clave_ia
+from trabajos import GestorTrabajos, ColaLlena
+from admision import ControlAdmision, Rechazada, ip_cliente
+from servicio_render import ServicioRender
+from json_incremental import ParserCamposJSON
+from lote import zip_en_stream
+from estaticos import RecursoEstatico
+from recuperacion import IndiceTemas
+from sugerencias import IndiceSugerencias
+from agrupador_ia import AgrupadorIA
+from deduplicacion import Deduplicador, SinResultado
+from resiliencia_ia import Interruptor, LlamadorIA, InterruptorAbierto, PresupuestoAgotado, presupuesto
+from metricas import Metricas, BUCKETS_BYTES
+from perfiles import Perfilador, FORMATOS as FORMATOS_PERFIL
+from memoria import MonitorMemoria, rss_bytes
+from lista_cotejo import (anchos_columnas, filas_cotejo, leer_estudiantes, leer_criterios_adicionales,
+                          sumar_criterios)
+from esquema_ia import (CAMPOS_CONTENIDO, FUNCION_CONTENIDO, FUNCION_LOTE, LONGITUDES, funcion_contenido,
+                        funcion_lote, tokens_maximos, validar_contenido)
 
 app = Flask(__name__)
+# Nivel de los registros de la app (aperturas del interruptor de la IA, coberturas ganadas)
+app.logger.setLevel(os.environ.get('LOG_NIVEL', 'INFO').upper())
+arranque = RegistroArranque(app.logger)
+arranque.marcar('importaciones')
+
+# Configurar OpenAI API (el paquete se importa con la primera consulta a la IA, ver cliente_ia())
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+# URL base del API; para pruebas de carga se apunta al servidor falso de ia_falsa.py
+OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE')
+IA_MODELO = os.environ.get('IA_MODELO', 'gpt-3.5-turbo')
+
+# Contadores de la salida estructurada de la IA (respuestas ilegibles y reparaciones de campos)
+contadores_ia = {
+    'llamadas': 0,
+    'errores': 0,
+    'respuestas_invalidas': 0,
+    'reparaciones': 0,
+    'reparaciones_fallidas': 0,
+    'aciertos_recuperacion': 0,
+    'timeouts': 0,
+    'rechazos_interruptor': 0,
+    'coberturas': 0,
+    'coberturas_ganadas': 0,
+}
+_lock_contadores_ia = threading.Lock()
+
+# Motor de render: 'plantilla' (esqueleto XML precompilado) o 'python-docx' (constructor original)
+DOCX_MOTOR = os.environ.get('DOCX_MOTOR', 'plantilla')
+# Cambiar al modificar el diseño del documento para invalidar la cache de .docx
+VERSION_DOCUMENTO = 2
+
+# Cache de documentos: LRU en memoria + almacén en disco compartido entre workers ('' desactiva el disco)
+cache_documentos = CacheDocumentos(
+    directorio=os.environ.get('DOCX_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-docx')),
+    max_bytes_memoria=int(os.environ.get('DOCX_CACHE_MEMORIA_MB', '64')) * 1024 * 1024,
+    max_bytes_disco=int(os.environ.get('DOCX_CACHE_DISCO_MB', '512')) * 1024 * 1024
+)
+
+# Cache persistente de respuestas de la IA, compartida entre workers ('' la desactiva)
+IA_CACHE_PATH = os.environ.get('IA_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'prototipo-ia.sqlite3'))
+cache_ia = CacheIA(
+    IA_CACHE_PATH,
+    ttl_segundos=float(os.environ.get('IA_CACHE_TTL_HORAS', '720')) * 3600,
+    max_bytes=int(os.environ.get('IA_CACHE_MAX_MB', '64')) * 1024 * 1024
+) if IA_CACHE_PATH else None
+
+# Trabajos de generación en segundo plano (estado y archivos en disco, visibles para todos los workers)
+gestor_trabajos = GestorTrabajos(
+    os.environ.get('TRABAJOS_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-trabajos')),
+    hilos=int(os.environ.get('TRABAJOS_HILOS', '4')),
+    max_en_cola=int(os.environ.get('TRABAJOS_MAX_COLA', '32')),
+    ttl_segundos=int(os.environ.get('TRABAJOS_TTL_SEGUNDOS', '3600'))
+)
+
+# Entradas de cada documento generado, para editarlo con PATCH /documentos/<revision> ('' solo en memoria)
+revisiones = AlmacenRevisiones(
+    os.environ.get('REVISIONES_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-revisiones')),
+    ttl_segundos=float(os.environ.get('REVISIONES_TTL_HORAS', '720')) * 3600
+)
+
+# Modo streaming (opcional): la página muestra los campos a medida que la IA los genera
+IA_STREAMING = os.environ.get('IA_STREAMING', '0') == '1'
+
+# Generación por lotes: hilos para las consultas y tamaño máximo de un lote
+LOTE_HILOS = int(os.environ.get('LOTE_HILOS', '4'))
+LOTE_MAX_ELEMENTOS = int(os.environ.get('LOTE_MAX_ELEMENTOS', '200'))
+
+# Constructor python-docx en procesos aparte (0 lo corre en el hilo de la petición): cantidad de procesos,
+# documentos que arma cada uno antes de reemplazarlo y documentos que pueden esperar un proceso libre
+RENDER_PROCESOS = int(os.environ.get('RENDER_PROCESOS', '2'))
+RENDER_MAX_TRABAJOS = int(os.environ.get('RENDER_MAX_TRABAJOS', '500'))
+RENDER_MAX_COLA = int(os.environ.get('RENDER_MAX_COLA', '32'))
+
+MIMETYPE_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Agrupación de consultas a la IA (opcional): ventana en milisegundos (0 la desactiva) y tamaño máximo del lote
+IA_LOTE_VENTANA_MS = float(os.environ.get('IA_LOTE_VENTANA_MS', '0'))
+IA_LOTE_MAX = int(os.environ.get('IA_LOTE_MAX', '4'))
+
+# Recuperación de temas: sobre el umbral se sirve la entrada curada sin llamar a la IA; por debajo,
+# las K entradas más parecidas se pasan a la IA como referencia
+IA_RECUPERACION_UMBRAL = float(os.environ.get('IA_RECUPERACION_UMBRAL', '0.6'))
+IA_RECUPERACION_K = int(os.environ.get('IA_RECUPERACION_K', '3'))
+PUNTAJE_MINIMO_REFERENCIA = 0.2
+
+# Latencia de la IA: timeout de cada llamada y presupuesto total por petición (por debajo del --timeout de
+# 30 s de gunicorn); IA_COBERTURA_MS lanza una segunda llamada si la primera no respondió en ese tiempo
+# (0 la desactiva). El interruptor deja de llamar a la IA durante el enfriamiento cuando la fracción de
+# errores y timeouts en la ventana alcanza el umbral (0 lo desactiva)
+IA_TIMEOUT_SEGUNDOS = float(os.environ.get('IA_TIMEOUT_SEGUNDOS', '20'))
+IA_PRESUPUESTO_SEGUNDOS = float(os.environ.get('IA_PRESUPUESTO_SEGUNDOS', '25'))
+IA_COBERTURA_MS = float(os.environ.get('IA_COBERTURA_MS', '0'))
+interruptor_ia = Interruptor(
+    umbral=float(os.environ.get('IA_INTERRUPTOR_UMBRAL', '0.5')),
+    minimo=int(os.environ.get('IA_INTERRUPTOR_MINIMO', '10')),
+    ventana_segundos=float(os.environ.get('IA_INTERRUPTOR_VENTANA_SEGUNDOS', '60')),
+    enfriamiento_segundos=float(os.environ.get('IA_INTERRUPTOR_ENFRIAMIENTO_SEGUNDOS', '30')),
+    registro=app.logger
+)
+
+# Consultas a la IA y documentos idénticos pedidos a la vez esperan el resultado del primero, dentro del
+# worker y entre workers a través de esta carpeta ('' solo dentro del worker); tras DEDUP_ESPERA_SEGUNDOS
+# cada uno sigue por su cuenta
+deduplicador = Deduplicador(
+    os.environ.get('DEDUP_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-dedup')),
+    espera_segundos=float(os.environ.get('DEDUP_ESPERA_SEGUNDOS', '60'))
+)
+
+# Control de admisión de las generaciones que pueden llamar a la IA (ver admision.py): fichas por cliente
+# (clave de API en X-Api-Key con cuota propia, o IP) y turnos por worker; los límites en 0 quedan desactivados
+# y los aciertos del currículo pasan siempre. Con ADMISION_PATH los ajustes de /admin/admision los releen
+# todos los workers
+admision = ControlAdmision({
+    'tasa': float(os.environ.get('ADMISION_TASA', '0')),
+    'rafaga': int(os.environ.get('ADMISION_RAFAGA', '10')),
+    'max_en_curso': int(os.environ.get('ADMISION_MAX_EN_CURSO', '0')),
+    'max_cola': int(os.environ.get('ADMISION_MAX_COLA', '8')),
+    'max_espera_segundos': float(os.environ.get('ADMISION_MAX_ESPERA_SEGUNDOS', '15')),
+}, archivo=os.environ.get('ADMISION_PATH', ''))
+# Proxies de confianza delante de la app (Render pone uno): la IP del cliente sale de X-Forwarded-For
+PROXY_SALTOS = int(os.environ.get('PROXY_SALTOS', '0'))
+
+# Token para los endpoints /admin (si no se define, quedan desactivados)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Métricas Prometheus en /metrics, sumadas entre workers a través de una carpeta compartida ('' solo este proceso)
+metricas = Metricas(
+    os.environ.get('METRICAS_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-metricas')),
+    intervalo=float(os.environ.get('METRICAS_INTERVALO_SEGUNDOS', '2'))
+)
+metricas.histograma('prototipo_etapa_segundos', 'Duración de cada etapa de la generación', etiquetas=('etapa',))
+metricas.histograma('prototipo_peticion_segundos', 'Duración de las peticiones HTTP', etiquetas=('endpoint',))
+metricas.histograma('prototipo_respuesta_bytes', 'Tamaño de las respuestas HTTP', BUCKETS_BYTES, etiquetas=('endpoint',))
+metricas.contador('prototipo_peticiones_total', 'Peticiones HTTP por endpoint y código', etiquetas=('endpoint', 'codigo'))
+metricas.contador('prototipo_db_total', 'Búsquedas en el currículo', etiquetas=('resultado',))
+metricas.contador('prototipo_ia_eventos_total', 'Llamadas a la IA, errores, JSON inválido, reparaciones y aciertos de recuperación', etiquetas=('evento',))
+metricas.contador('prototipo_contenido_generico_total', 'Documentos armados con el contenido genérico de respaldo')
+metricas.contador('prototipo_cache_total', 'Consultas a las caches', etiquetas=('cache', 'resultado'))
+metricas.contador('prototipo_admision_total', 'Generaciones admitidas o rechazadas (429 por cliente, 503 por carga), por carril', etiquetas=('carril', 'resultado'))
+metricas.contador('prototipo_ediciones_total', 'Documentos editados con PATCH, reemitiendo solo lo que cambió o completos', etiquetas=('render',))
+metricas.medidor('prototipo_peticiones_en_curso', 'Peticiones HTTP en curso', etiquetas=('endpoint',))
+metricas.medidor('prototipo_ia_en_curso', 'Consultas a la IA en curso')
+metricas.medidor_funcion('prototipo_admision_en_curso', 'Generaciones con turno del control de admisión',
+                         lambda: admision.en_curso())
+metricas.medidor_funcion('prototipo_admision_en_cola', 'Generaciones esperando turno del control de admisión',
+                         lambda: admision.en_cola())
+metricas.medidor_funcion('prototipo_render_en_curso', 'Documentos armándose en este worker',
+                         lambda: admision.en_curso('render'))
+metricas.medidor_funcion('prototipo_trabajos_en_curso', 'Trabajos en segundo plano en cola o en proceso',
+                         lambda: gestor_trabajos.en_curso())
+metricas.medidor_funcion('prototipo_ia_interruptor_abierto', 'Workers con el interruptor de la IA abierto o probando una llamada',
+                         lambda: int(interruptor_ia.estado != 'cerrado'))
+
+# Perfiles de peticiones: con la cabecera X-Perfilar (el ADMIN_TOKEN) o 1 de cada PERFIL_MUESTREO peticiones
+# (0 lo desactiva) se perfila la petición completa; con PERFIL_UMBRAL_SEGUNDOS se guardan además, solo
+# muestreadas, las peticiones que tarden más que el umbral
+perfilador = Perfilador(
+    os.environ.get('PERFILES_DIR', os.path.join(tempfile.gettempdir(), 'prototipo-perfiles')),
+    max_perfiles=int(os.environ.get('PERFILES_MAX', '50')),
+    intervalo=float(os.environ.get('PERFIL_INTERVALO_MS', '5')) / 1000
+)
+PERFIL_MUESTREO = int(os.environ.get('PERFIL_MUESTREO', '0'))
+PERFIL_UMBRAL_SEGUNDOS = float(os.environ.get('PERFIL_UMBRAL_SEGUNDOS', '0'))
+_contador_perfiles = itertools.count(1)
+
+# Memoria de los workers (ver memoria.py): con MEMORIA_TRACEMALLOC (profundidad de las pilas, 0 lo desactiva)
+# se instrumenta con tracemalloc y se compara una instantánea cada MEMORIA_INSTANTANEA_CADA peticiones de
+# cada tipo; sobre MEMORIA_MAX_RSS_MB (0 sin techo) el worker se recicla tras terminar lo que tiene en curso
+memoria = MonitorMemoria(
+    marcos=int(os.environ.get('MEMORIA_TRACEMALLOC', '0')),
+    cada=int(os.environ.get('MEMORIA_INSTANTANEA_CADA', '50')),
+    max_rss_mb=float(os.environ.get('MEMORIA_MAX_RSS_MB', '0')),
+    registro=app.logger
+)
+metricas.medidor_funcion('prototipo_rss_bytes', 'Memoria residente del proceso', lambda: rss_bytes() or 0)
+
+# Al terminar de importar, saca del recolector de basura los objetos creados hasta ahí, para que los
+# workers de gunicorn --preload sigan compartiendo esas páginas con el maestro
+ARRANQUE_CONGELAR = os.environ.get('ARRANQUE_CONGELAR', '1') == '1'
+arranque.marcar('configuracion')
 
-# Configurar OpenAI API
-openai.api_key = os.environ.get('OPENAI_API_KEY')
 
 # BASE DE DATOS CON COMPETENCIAS REALES DEL CURRÍCULO NACIONAL PERUANO
-COMPETENCIAS_DB = {
-    "Comunicación": {
-        "III": {
-            "temas": ["Textos narrativos", "Fábulas y leyendas", "Descripción de personas y objetos", "Lectura comprensiva", "Producción de textos"],
-            "competencia": "Se comunica oralmente en su lengua materna.",
-            "capacidades": [
-                "Obtiene información del texto oral",
-                "Infiere e interpreta información del texto",
-                "Adecúa, organiza y desarrolla ideas de forma coherente y cohesionada"
-            ],
-            "estandar": "Se comunica oralmente mediante diversos tipos de textos; identifica información explícita; realiza inferencias sencillas; se expresa con pronunciación y entonación adecuadas.",
-            "criterios": [
-                "Comprende información explícita en textos orales simples sobre temas cotidianos",
-                "Expresa sus ideas con claridad, usando palabras apropiadas y gestos"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Valora y practica la justicia, solidaridad y responsabilidad en la comunidad."
-        },
-        "IV": {
-            "temas": ["Narrativa clásica", "Poesía y rima", "Cartas y mensajes", "Cuento literario", "Reportaje"],
-            "competencia": "Lee diversos tipos de textos escritos en su lengua materna.",
-            "capacidades": [
-                "Obtiene información explícita del texto",
-                "Realiza inferencias e interpreta el significado del texto",
-                "Reflexiona y evalúa la forma, el contenido y contexto del texto"
-            ],
-            "estandar": "Lee diversos tipos de textos con estructuras complejas, vocabulario variado; identifica información; realiza inferencias; opina sobre lo leído.",
-            "criterios": [
-                "Identifica la información central y detalles en textos con estructura narrativa",
-                "Formula opiniones sobre la intención del autor basándose en elementos textuales"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Inclusión o atención a la diversidad",
-            "descripcion_enfoque": "Respeta y valora la diversidad de las personas en todos sus aspectos."
-        },
-        "V": {
-            "temas": ["Literatura infantil", "Textos informativos complejos", "Ensayos cortos", "Drama y teatro", "Análisis de medios de comunicación"],
-            "competencia": "Escribe diversos tipos de textos en su lengua materna.",
-            "capacidades": [
-                "Adecúa el texto a la situación comunicativa",
-                "Organiza y desarrolla ideas de forma coherente y cohesionada",
-                "Utiliza convenciones del lenguaje escrito de forma apropiada"
-            ],
-            "estandar": "Escribe textos complejos de distintos tipos; adecúa su contenido a la audiencia; organiza sus ideas; usa vocabulario variado; aplica convenciones del lenguaje escrito.",
-            "criterios": [
-                "Produce textos con estructura clara, coherencia entre ideas y vocabulario pertinente",
-                "Revisa y corrige sus textos considerando puntuación, ortografía y coherencia"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Derechos humanos",
-            "descripcion_enfoque": "Promueve y defiende los derechos humanos para todos."
-        }
-    },
-    "Matemática": {
-        "III": {
-            "temas": ["Números naturales hasta 100", "Suma y resta", "Figuras geométricas", "Medición de longitud", "Patrones numéricos"],
-            "competencia": "Resuelve problemas de cantidad.",
-            "capacidades": [
-                "Traduce cantidades a expresiones numéricas",
-                "Comunica su comprensión sobre los números",
-                "Usa estrategias y procedimientos de estimación y cálculo"
-            ],
-            "estandar": "Resuelve problemas de cantidad relacionados con agregar, quitar e igualar con números naturales hasta 100; usa estrategias de cálculo; explica su procedimiento.",
-            "criterios": [
-                "Resuelve sumas y restas con números hasta 100 de forma correcta",
-                "Explica sus estrategias usando lenguaje matemático apropiado"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Persigue mejorar constantemente en la realización de tareas y comprensión de conceptos."
-        },
-        "IV": {
-            "temas": ["Fracciones", "Multiplicación y división", "Números decimales", "Áreas y perímetros", "Datos y gráficos"],
-            "competencia": "Resuelve problemas de regularidad, equivalencia y cambio.",
-            "capacidades": [
-                "Traduce datos y condiciones a expresiones algebraicas",
-                "Comunica su comprensión sobre relaciones algebraicas",
-                "Usa estrategias para resolver ecuaciones"
-            ],
-            "estandar": "Resuelve problemas con fracciones, decimales y operaciones; identifica patrones en secuencias; usa estrategias variadas de cálculo; justifica sus procedimientos.",
-            "criterios": [
-                "Realiza operaciones con fracciones y decimales demostrando comprensión",
-                "Reconoce y completa patrones numéricos justificando la regla"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Busca resultados que beneficien a todos los integrantes de la comunidad."
-        },
-        "V": {
-            "temas": ["Proporcionalidad", "Potencias y raíces", "Ecuaciones lineales", "Volumen y capacidad", "Probabilidad básica"],
-            "competencia": "Resuelve problemas de forma, movimiento y localización.",
-            "capacidades": [
-                "Modela objetos con formas geométricas",
-                "Comunica su comprensión sobre formas y relaciones geométricas",
-                "Usa estrategias para medir y calcular propiedades de figuras"
-            ],
-            "estandar": "Resuelve problemas geométricos identificando propiedades de figuras; calcula perímetros, áreas y volúmenes; justifica sus estrategias con argumentos geométricos.",
-            "criterios": [
-                "Calcula correctamente áreas y perímetros de figuras compuestas",
-                "Justifica sus cálculos usando propiedades geométricas"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Inclusión o atención a la diversidad",
-            "descripcion_enfoque": "Valora la diversidad de estrategias de resolución de problemas."
-        }
-    },
-    "Personal Social": {
-        "III": {
-            "temas": ["Mi familia y comunidad", "Normas en el hogar", "Costumbres y tradiciones", "El respeto", "Seguridad personal"],
-            "competencia": "Construye su identidad.",
-            "capacidades": [
-                "Se valora a sí mismo",
-                "Autorregula sus emociones",
-                "Reflexiona sobre sus prácticas culturales"
-            ],
-            "estandar": "Conoce sus características personales; identifica sus emociones y las de otros; respeta las diferencias; practica valores como respeto y responsabilidad.",
-            "criterios": [
-                "Expresa sus emociones e identifica cómo se sienten los demás",
-                "Sigue normas de convivencia en diferentes contextos"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Derechos humanos",
-            "descripcion_enfoque": "Promueve el reconocimiento y respeto de los derechos de todos."
-        },
-        "IV": {
-            "temas": ["Organización social", "Roles familiares", "Tradiciones regionales", "Convivencia democrática", "Responsabilidad ciudadana"],
-            "competencia": "Convive y participa democráticamente.",
-            "capacidades": [
-                "Interactúa con todas las personas",
-                "Construye normas y asume acuerdos y leyes",
-                "Participa en asuntos públicos"
-            ],
-            "estandar": "Practica la empatía; construye normas consensuadas; participa en decisiones comunitarias; muestra disposición a trabajar en equipo.",
-            "criterios": [
-                "Propone soluciones pacíficas ante conflictos cotidianos",
-                "Participa activamente en la toma de decisiones del grupo"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Trabaja por el bienestar común considerando los intereses de todos."
-        },
-        "V": {
-            "temas": ["Ciudadanía y participación", "Instituciones públicas", "Derechos y deberes", "Patrimonio cultural", "Sostenibilidad ambiental"],
-            "competencia": "Gestiona responsablemente el espacio y el ambiente.",
-            "capacidades": [
-                "Comprende las dinámicas entre elementos naturales y sociales",
-                "Maneja responsablemente recursos",
-                "Evalúa problemáticas ambientales"
-            ],
-            "estandar": "Identifica elementos naturales y sociales; evalúa problemáticas ambientales; propone soluciones sostenibles; reconoce su rol en el cuidado del ambiente.",
-            "criterios": [
-                "Explica cómo los elementos naturales influyen en la vida de las personas",
-                "Propone acciones para conservar y proteger el ambiente"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Inclusión o atención a la diversidad",
-            "descripcion_enfoque": "Considera a todos los seres humanos y al ambiente en sus decisiones."
-        }
-    },
-    "Ciencia y Tecnología": {
-        "III": {
-            "temas": ["Seres vivos y su hábitat", "El cuerpo humano", "Ciclo del agua", "Fuentes de luz", "Seguridad en el hogar"],
-            "competencia": "Indaga mediante métodos científicos para construir conocimientos.",
-            "capacidades": [
-                "Problematiza situaciones",
-                "Diseña estrategias para indagación",
-                "Genera y registra datos",
-                "Analiza datos e información"
-            ],
-            "estandar": "Realiza indagaciones simples; observa características de objetos; predice cambios; comunica sus conclusiones; plantea preguntas sobre fenómenos naturales.",
-            "criterios": [
-                "Realiza observaciones ordenadas de fenómenos naturales",
-                "Comunica sus predicciones y conclusiones de forma clara"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Persigue comprender los fenómenos con precisión y rigor."
-        },
-        "IV": {
-            "temas": ["Cadenas alimenticias", "Reproducción de plantas y animales", "Estados de la materia", "Fuerzas y movimiento", "Efectos del calor"],
-            "competencia": "Explica el mundo natural basándose en conocimientos científicos.",
-            "capacidades": [
-                "Comprende y aplica conocimientos científicos",
-                "Argumenta afirmaciones sobre fenómenos naturales"
-            ],
-            "estandar": "Identifica características de los seres vivos; comprende procesos naturales como ciclos de vida; explica fenómenos físicos con lenguaje científico.",
-            "criterios": [
-                "Describe correctamente los ciclos de vida de organismos",
-                "Explica relaciones causa-efecto en fenómenos naturales"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Reconoce la importancia de la naturaleza para la vida."
-        },
-        "V": {
-            "temas": ["Ecología y ecosistemas", "Genética básica", "Energía y recursos", "Tecnología y sostenibilidad", "Cambio climático"],
-            "competencia": "Diseña y construye soluciones tecnológicas.",
-            "capacidades": [
-                "Determina una alternativa de solución tecnológica",
-                "Diseña la alternativa de solución tecnológica",
-                "Implementa y valida la alternativa"
-            ],
-            "estandar": "Diseña soluciones a problemas tecnológicos; valida su funcionamiento; evalúa el impacto ambiental; propone mejoras sostenibles.",
-            "criterios": [
-                "Diseña prototipos simples con materiales reciclables",
-                "Evalúa la efectividad y sostenibilidad de su solución"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Busca mejorar continuamente sus diseños tecnológicos."
-        }
-    },
-    "Educación Religiosa": {
-        "III": {
-            "temas": ["Dios creador", "Virtudes cristianas", "La Biblia", "Principales festividades religiosas", "Amor y fraternidad"],
-            "competencia": "Construye su identidad como persona humana, amada por Dios.",
-            "capacidades": [
-                "Valora su dignidad personal",
-                "Reconoce la obra creadora de Dios",
-                "Reflexiona sobre valores religiosos"
-            ],
-            "estandar": "Reconoce que Dios lo ama; identifica valores como bondad, respeto y solidaridad; participa en celebraciones religiosas; respeta crencias diferentes.",
-            "criterios": [
-                "Expresa su fe reconociendo que Dios lo ama como persona",
-                "Practica virtudes cristianas en su convivencia diaria"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Derechos humanos",
-            "descripcion_enfoque": "Reconoce la dignidad de la persona como creada a imagen de Dios."
-        },
-        "IV": {
-            "temas": ["Jesucristo redentor", "Mandamientos de la ley de Dios", "Sacramentos", "Comunidades religiosas", "Servicio al prójimo"],
-            "competencia": "Asume la experiencia del encuentro personal y comunitario con Dios.",
-            "capacidades": [
-                "Se relaciona con Dios en forma auténtica",
-                "Experimenta encuentros con Dios",
-                "Valora la vida en comunidad"
-            ],
-            "estandar": "Experimenta que Dios ama al ser humano; vive valores como caridad y justicia; participa en acciones comunitarias; respeta opciones religiosas.",
-            "criterios": [
-                "Identifica acciones que demuestran el amor de Dios en la vida",
-                "Realiza compromisos de servicio hacia los demás"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Busca el bien común y la construcción de comunidades solidarias."
-        },
-        "V": {
-            "temas": ["Encíclicas y doctrina social", "Ecología integral", "Justicia social", "Diálogo interreligioso", "Responsabilidad moral"],
-            "competencia": "Actúa coherentemente en razón de su fe según los principios de su conciencia moral.",
-            "capacidades": [
-                "Practica virtudes morales",
-                "Toma decisiones responsables",
-                "Compromete con la justicia y paz"
-            ],
-            "estandar": "Actúa según sus principios morales; busca la justicia y paz; respeta otras tradiciones religiosas; trabaja por el bien común.",
-            "criterios": [
-                "Fundamenta sus decisiones morales basándose en su fe",
-                "Participa en acciones de justicia social y paz"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Inclusión o atención a la diversidad",
-            "descripcion_enfoque": "Valora el diálogo como medio para entender diferentes perspectivas."
-        }
-    },
-    "Arte y Cultura": {
-        "III": {
-            "temas": ["Expresión artística", "Dibujo y pintura", "Canciones infantiles", "Danzas folclóricas", "Artesanía local"],
-            "competencia": "Aprecia críticamente manifestaciones artístico-culturales.",
-            "capacidades": [
-                "Percibe manifestaciones artísticas",
-                "Contextualiza manifestaciones artísticas",
-                "Reflexiona creadora y críticamente"
-            ],
-            "estandar": "Aprecia manifestaciones artísticas; identifica elementos visuales y sonoros; comparte opiniones sobre arte; respeta expresiones culturales diferentes.",
-            "criterios": [
-                "Identifica elementos de color y forma en obras artísticas",
-                "Expresa qué siente ante diferentes manifestaciones culturales"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Busca apreciar el arte con sensibilidad y profundidad."
-        },
-        "IV": {
-            "temas": ["Técnicas de pintura", "Música regional", "Teatro de títeres", "Patrimonio cultural local", "Cerámica y escultura"],
-            "competencia": "Crea proyectos artísticos.",
-            "capacidades": [
-                "Genera ideas artísticas",
-                "Planifica proyectos artísticos",
-                "Ejecuta técnicas artísticas",
-                "Evalúa proyectos"
-            ],
-            "estandar": "Crea proyectos artísticos combinando elementos visuales y sonoros; utiliza técnicas apropiadas; experimenta con diferentes materiales; reflexiona sobre su proceso.",
-            "criterios": [
-                "Utiliza técnicas de pintura o escultura con creatividad",
-                "Explica el proceso y significado de su obra artística"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Reconoce el arte como expresión de la identidad comunitaria."
-        },
-        "V": {
-            "temas": ["Historia del arte", "Artes visuales contemporáneas", "Música clásica y moderna", "Danza contemporánea", "Cine y audiovisual"],
-            "competencia": "Se expresa artísticamente a través de diversos lenguajes.",
-            "capacidades": [
-                "Explora técnicas artísticas",
-                "Desarrolla ideas artísticas",
-                "Utiliza materiales y herramientas",
-                "Reflexiona sobre procesos artísticos"
-            ],
-            "estandar": "Se expresa artísticamente de forma creativa; domina técnicas variadas; comunica su visión artística; analiza y valora obras de otros.",
-            "criterios": [
-                "Crea obras originales usando técnicas diversas",
-                "Analiza críticamente obras de arte identificando técnica y mensaje"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Persigue la excelencia en su expresión artística."
-        }
-    },
-    "Educación Física": {
-        "III": {
-            "temas": ["Juegos y movimiento corporal", "Actividades lúdicas", "Higiene y salud", "Ejercicios de coordinación", "Seguridad en el juego"],
-            "competencia": "Interactúa a través de sus habilidades sociomotrices.",
-            "capacidades": [
-                "Produce movimientos variados",
-                "Colabora en juegos",
-                "Valora el trabajo en equipo"
-            ],
-            "estandar": "Realiza movimientos variados con control; participa en juegos respetando reglas; colabora en equipo; demuestra seguridad corporal.",
-            "criterios": [
-                "Ejecuta movimientos coordinados en actividades lúdicas",
-                "Respeta reglas y normas en juegos colectivos"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Orientación al bien común",
-            "descripcion_enfoque": "Trabaja en equipo por el logro de objetivos comunes."
-        },
-        "IV": {
-            "temas": ["Deportes individuales", "Deportes de equipo", "Acondicionamiento físico", "Primeros auxilios básicos", "Nutrición y actividad física"],
-            "competencia": "Asume una vida saludable.",
-            "capacidades": [
-                "Comprende las relaciones entre actividad, nutrición, postura y salud",
-                "Incorpora prácticas saludables",
-                "Mantiene su cuerpo saludable"
-            ],
-            "estandar": "Participa en actividades físicas con técnica apropiada; practica hábitos saludables; cuida su cuerpo; desarrolla capacidades físicas.",
-            "criterios": [
-                "Realiza ejercicios de acondicionamiento físico correctamente",
-                "Explica la importancia de la nutrición en la actividad física"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Se desenvuelve en entornos virtuales generados por las TIC",
-            "enfoque_transversal": "Inclusión o atención a la diversidad",
-            "descripcion_enfoque": "Adapta actividades respetando capacidades y limitaciones de todos."
-        },
-        "V": {
-            "temas": ["Atletismo", "Deportes de contacto", "Danza y movimiento", "Manejo del estrés", "Vida activa y bienestar"],
-            "competencia": "Se desenvuelve de manera autónoma a través de su motricidad.",
-            "capacidades": [
-                "Comprende su cuerpo y sus movimientos",
-                "Ejecuta movimientos variados",
-                "Evalúa su desempeño"
-            ],
-            "estandar": "Ejecuta movimientos variados con precisión y eficacia; desarrolla capacidades físicas; practica actividad física regular; evalúa su progreso.",
-            "criterios": [
-                "Realiza técnicas deportivas con eficacia y control",
-                "Evalúa su desempeño físico e identifica áreas de mejora"
-            ],
-            "instrumento": "Lista de cotejo",
-            "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
-            "enfoque_transversal": "Búsqueda de la excelencia",
-            "descripcion_enfoque": "Busca mejorar continuamente su desempeño físico."
-        }
-    }
-}
+# Por área y ciclo, en un archivo JSON que se valida completo al arrancar (ver curriculo.py)
+CURRICULO_PATH = os.environ.get('CURRICULO_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'curriculo.json'))
+curriculo = Curriculo.cargar(CURRICULO_PATH)
+arranque.marcar('curriculo')
 
 # HTML INTEGRADO
 HTML_TEMPLATE = """<!DOCTYPE html>
@@ -557,6 +376,21 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             text-align: center;
         }
 
+        .preview {
+            background: #f8f8ff;
+            border-left: 4px solid #667eea;
+            padding: 15px;
+            border-radius: 8px;
+            margin-top: 20px;
+            font-size: 13px;
+            color: #333;
+            display: none;
+        }
+
+        .preview p {
+            margin-bottom: 8px;
+        }
+
         .tema-list {
             background: #f5f5f5;
             padding: 10px;
@@ -567,6 +401,15 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             max-height: 100px;
             overflow-y: auto;
         }
+
+        .sugerencia {
+            color: #667eea;
+            cursor: pointer;
+        }
+
+        .sugerencia:hover {
+            text-decoration: underline;
+        }
     </style>
 </head>
 <body>
@@ -579,9 +422,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 <label for="ciclo">Ciclo Educativo:</label>
                 <select id="ciclo" name="ciclo" required>
                     <option value="">Selecciona un ciclo</option>
-                    <option value="III">III Ciclo (1° y 2° grado)</option>
-                    <option value="IV">IV Ciclo (3° y 4° grado)</option>
-                    <option value="V">V Ciclo (5° y 6° grado)</option>
+<!--OPCIONES_CICLO-->
                 </select>
             </div>
 
@@ -589,13 +430,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 <label for="area">Área Curricular:</label>
                 <select id="area" name="area" required>
                     <option value="">Selecciona un área</option>
-                    <option value="Comunicación">Comunicación</option>
-                    <option value="Matemática">Matemática</option>
-                    <option value="Personal Social">Personal Social</option>
-                    <option value="Ciencia y Tecnología">Ciencia y Tecnología</option>
-                    <option value="Educación Religiosa">Educación Religiosa</option>
-                    <option value="Arte y Cultura">Arte y Cultura</option>
-                    <option value="Educación Física">Educación Física</option>
+<!--OPCIONES_AREA-->
                 </select>
             </div>
 
@@ -605,6 +440,16 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 <div class="tema-list" id="temaList"></div>
             </div>
 
+            <div class="form-group">
+                <label for="numEstudiantes">Número de estudiantes:</label>
+                <input type="number" id="numEstudiantes" name="num_estudiantes" min="1" max="200" value="20">
+            </div>
+
+            <div class="form-group">
+                <label for="nomina">Lista de estudiantes (CSV, opcional):</label>
+                <input type="file" id="nomina" name="estudiantes" accept=".csv,text/csv">
+            </div>
+
             <button type="submit" id="submitBtn">Generar Documento</button>
         </form>
 
@@ -613,27 +458,153 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             <p>Generando documento con IA, por favor espera...</p>
         </div>
 
+        <div class="preview" id="preview"></div>
         <div class="error" id="error"></div>
         <div class="success" id="success"></div>
     </div>
 
     <script>
-        const temasDB = """ + json.dumps(COMPETENCIAS_DB) + """;
+        const usarStreaming = """ + json.dumps(IA_STREAMING) + """;
+        let esperaSugerencias = null;
+
+        const ETIQUETAS = {
+            competencia: 'Competencia',
+            capacidades: 'Capacidades',
+            estandar: 'Estándar',
+            criterios: 'Criterios',
+            instrumento: 'Instrumento',
+            competencia_transversal: 'Competencia transversal',
+            enfoque_transversal: 'Enfoque transversal',
+            descripcion_enfoque: 'Descripción del enfoque'
+        };
 
         document.getElementById('ciclo').addEventListener('change', actualizarTemas);
         document.getElementById('area').addEventListener('change', actualizarTemas);
+        document.getElementById('tema').addEventListener('input', () => {
+            // Se espera a que el docente deje de escribir un momento antes de consultar
+            clearTimeout(esperaSugerencias);
+            esperaSugerencias = setTimeout(actualizarTemas, 150);
+        });
 
-        function actualizarTemas() {
+        async function actualizarTemas() {
             const ciclo = document.getElementById('ciclo').value;
             const area = document.getElementById('area').value;
+            const tema = document.getElementById('tema').value;
+            const temaList = document.getElementById('temaList');
+
+            if (!tema && !(ciclo && area)) {
+                temaList.replaceChildren();
+                return;
+            }
+
+            try {
+                const response = await fetch('/api/temas/sugerir?' + new URLSearchParams({ area, ciclo, q: tema }));
+                const datos = await response.json();
+                mostrarSugerencias(datos.sugerencias || []);
+            } catch (err) {
+                temaList.replaceChildren();
+            }
+        }
+
+        function mostrarSugerencias(sugerencias) {
             const temaList = document.getElementById('temaList');
+            if (!sugerencias.length) {
+                temaList.replaceChildren();
+                return;
+            }
+
+            const titulo = document.createElement('strong');
+            titulo.textContent = 'Temas sugeridos:';
+            const nodos = [titulo, document.createElement('br')];
+            sugerencias.forEach((sugerencia, i) => {
+                if (i > 0) {
+                    nodos.push(document.createTextNode(' • '));
+                }
+                const opcion = document.createElement('span');
+                opcion.className = 'sugerencia';
+                opcion.textContent = sugerencia.tema;
+                opcion.addEventListener('click', () => {
+                    document.getElementById('tema').value = sugerencia.tema;
+                });
+                nodos.push(opcion);
+            });
+            temaList.replaceChildren(...nodos);
+        }
+
+        async function esperarTrabajo(id) {
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const response = await fetch(`/generar/jobs/${id}`);
+                const estado = await response.json();
+
+                if (!response.ok) {
+                    throw new Error(estado.error || 'Error al consultar el documento');
+                }
+                if (estado.estado === 'completado') {
+                    return estado;
+                }
+                if (estado.estado === 'error') {
+                    throw new Error(estado.error || 'Error al generar el documento');
+                }
+            }
+        }
 
-            if (ciclo && area && temasDB[area] && temasDB[area][ciclo]) {
-                const temas = temasDB[area][ciclo].temas;
-                temaList.innerHTML = '<strong>Temas sugeridos:</strong><br>' + temas.join(' • ');
-            } else {
-                temaList.innerHTML = '';
+        async function generarConTrabajo(formData) {
+            const response = await fetch('/generar/jobs', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(formData)
+            });
+
+            const trabajo = await response.json();
+            if (!response.ok) {
+                throw new Error(trabajo.error || 'Error al generar el documento');
             }
+
+            // El servidor responde de inmediato; se consulta el estado hasta que el archivo esté listo
+            await esperarTrabajo(trabajo.id);
+            return trabajo;
+        }
+
+        function mostrarCampo(campo, valor) {
+            const preview = document.getElementById('preview');
+            let item = document.getElementById('campo-' + campo);
+            if (!item) {
+                item = document.createElement('p');
+                item.id = 'campo-' + campo;
+                preview.appendChild(item);
+            }
+            const etiqueta = document.createElement('strong');
+            etiqueta.textContent = (ETIQUETAS[campo] || campo) + ': ';
+            item.replaceChildren(etiqueta, document.createTextNode(Array.isArray(valor) ? valor.join(' • ') : valor));
+        }
+
+        function generarConStreaming(formData) {
+            return new Promise((resolve, reject) => {
+                const preview = document.getElementById('preview');
+                preview.replaceChildren();
+                preview.style.display = 'block';
+
+                const fuente = new EventSource('/generar/stream?' + new URLSearchParams(formData));
+                fuente.addEventListener('campo', (e) => {
+                    const datos = JSON.parse(e.data);
+                    mostrarCampo(datos.campo, datos.valor);
+                });
+                fuente.addEventListener('completado', (e) => {
+                    fuente.close();
+                    resolve(JSON.parse(e.data));
+                });
+                fuente.addEventListener('fallo', (e) => {
+                    fuente.close();
+                    reject(new Error(JSON.parse(e.data).error));
+                });
+                fuente.onerror = () => {
+                    fuente.close();
+                    reject(new Error('Se perdió la conexión con el servidor'));
+                };
+            });
         }
 
         document.getElementById('competenciaForm').addEventListener('submit', async (e) => {
@@ -653,35 +624,30 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             const formData = {
                 ciclo: document.getElementById('ciclo').value,
                 area: document.getElementById('area').value,
-                tema: document.getElementById('tema').value
+                tema: document.getElementById('tema').value,
+                num_estudiantes: document.getElementById('numEstudiantes').value
             };
 
             try {
-                const response = await fetch('/generar', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(formData)
-                });
-
-                if (response.ok) {
-                    const blob = await response.blob();
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    a.download = `Competencias_${formData.area}_Ciclo_${formData.ciclo}.docx`;
-                    document.body.appendChild(a);
-                    a.click();
-                    window.URL.revokeObjectURL(url);
-                    document.body.removeChild(a);
-
-                    success.textContent = '✅ Documento generado exitosamente. Descarga iniciada.';
-                    success.style.display = 'block';
-                } else {
-                    const errorData = await response.json();
-                    throw new Error(errorData.error || 'Error al generar el documento');
+                // Con nómina los nombres van en el cuerpo del trabajo; el streaming usa solo la cantidad
+                const nomina = document.getElementById('nomina').files[0];
+                if (nomina) {
+                    formData.estudiantes = await nomina.text();
                 }
+
+                const resultado = usarStreaming && !nomina
+                    ? await generarConStreaming(formData)
+                    : await generarConTrabajo(formData);
+
+                const a = document.createElement('a');
+                a.href = resultado.url_archivo;
+                a.download = `Competencias_${formData.area}_Ciclo_${formData.ciclo}.docx`;
+                document.body.appendChild(a);
+                a.click();
+                document.body.removeChild(a);
+
+                success.textContent = '✅ Documento generado exitosamente. Descarga iniciada.';
+                success.style.display = 'block';
             } catch (err) {
                 error.textContent = '❌ ' + err.message;
                 error.style.display = 'block';
@@ -710,12 +676,205 @@ def set_cell_border(cell, **kwargs):
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return pagina_inicio.respuesta(request)
+
+@app.route('/api/curriculo')
+def api_curriculo():
+    recurso = recursos_curriculo.get((request.args.get('area'), request.args.get('ciclo')))
+    if recurso is None:
+        return jsonify({'error': 'Área o ciclo no encontrado'}), 404
+    return recurso.respuesta(request)
+
+@app.route('/api/temas/sugerir')
+def sugerir_temas():
+    limite = max(1, min(request.args.get('limite', 8, type=int), 50))
+    sugerencias = indice_sugerencias.sugerir(
+        request.args.get('q', ''),
+        area=request.args.get('area'),
+        ciclo=request.args.get('ciclo'),
+        limite=limite
+    )
+    return jsonify({'sugerencias': sugerencias})
+
+@app.route('/api/curriculo/temas')
+def api_curriculo_temas():
+    recurso = recursos_temas.get((request.args.get('area'), request.args.get('ciclo')))
+    if recurso is None:
+        return jsonify({'error': 'Área o ciclo no encontrado'}), 404
+    return recurso.respuesta(request)
+
+@contextmanager
+def medir(etapas, nombre):
+    inicio = time.perf_counter()
+    try:
+        with memoria.etapa(nombre):
+            yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        if etapas is not None:
+            etapas[nombre] = etapas.get(nombre, 0) + segundos
+        metricas.observar('prototipo_etapa_segundos', segundos, etapa=nombre)
+
+def endpoint_metricas():
+    return request.endpoint or 'desconocido'
+
+@app.before_request
+def iniciar_metricas_peticion():
+    g.inicio_peticion = time.perf_counter()
+    metricas.incrementar('prototipo_peticiones_en_curso', 1, endpoint=endpoint_metricas())
+
+@app.after_request
+def registrar_metricas_respuesta(respuesta):
+    endpoint = endpoint_metricas()
+    metricas.incrementar('prototipo_peticiones_total', endpoint=endpoint, codigo=respuesta.status_code)
+    if respuesta.content_length is not None:
+        metricas.observar('prototipo_respuesta_bytes', respuesta.content_length, endpoint=endpoint)
+    return respuesta
+
+@app.teardown_request
+def terminar_metricas_peticion(error=None):
+    # En las respuestas en streaming corre cuando termina el stream
+    if 'inicio_peticion' not in g:
+        return
+    endpoint = endpoint_metricas()
+    metricas.incrementar('prototipo_peticiones_en_curso', -1, endpoint=endpoint)
+    metricas.observar('prototipo_peticion_segundos', time.perf_counter() - g.inicio_peticion, endpoint=endpoint)
+
+@app.before_request
+def iniciar_memoria():
+    g.memoria = memoria.iniciar()
+
+@app.teardown_request
+def terminar_memoria(error=None):
+    # Después de la respuesta (o del stream): si hay que reciclar el worker, esta petición ya terminó
+    if 'memoria' in g:
+        memoria.terminar(endpoint_metricas(), g.pop('memoria'))
+
+@app.before_request
+def registrar_primera_peticion():
+    terminar = arranque.peticion()
+    if terminar is not None:
+        g.primera_peticion = terminar
+
+@app.teardown_request
+def terminar_primera_peticion(error=None):
+    terminar = g.pop('primera_peticion', None)
+    if terminar is not None:
+        terminar()
+
+def motivo_perfil():
+    # 'cabecera', 'muestreo' o None (sin cProfile)
+    if request.endpoint in ('exponer_metricas', 'listar_perfiles', 'descargar_perfil'):
+        return None
+    token = request.headers.get('X-Perfilar')
+    if token and ADMIN_TOKEN and hmac.compare_digest(token, ADMIN_TOKEN):
+        return 'cabecera'
+    if PERFIL_MUESTREO > 0 and next(_contador_perfiles) % PERFIL_MUESTREO == 0:
+        return 'muestreo'
+    return None
+
+@app.before_request
+def iniciar_perfil():
+    motivo = motivo_perfil()
+    if motivo is not None or (PERFIL_UMBRAL_SEGUNDOS > 0 and request.endpoint != 'exponer_metricas'):
+        g.perfil = perfilador.iniciar(motivo)
+
+@app.after_request
+def anunciar_perfil(respuesta):
+    if 'perfil' in g and g.perfil.motivo is not None:
+        respuesta.headers['X-Perfil-Id'] = g.perfil.id
+    return respuesta
+
+@app.teardown_request
+def guardar_perfil(error=None):
+    sesion = g.pop('perfil', None)
+    if sesion is None:
+        return
+    perfilador.terminar(sesion, {
+        'metodo': request.method,
+        'ruta': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'error': repr(error) if error is not None else None,
+    }, umbral=PERFIL_UMBRAL_SEGUNDOS)
+
+@app.route('/metrics')
+def exponer_metricas():
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
+def contar_cache(cache, entrada):
+    metricas.incrementar('prototipo_cache_total', cache=cache, resultado='fallo' if entrada is None else 'acierto')
+    return entrada
+
+def nombre_archivo(ciclo, area):
+    return f'Competencias_{area}_Ciclo_{ciclo}.docx'
+
+def opciones_cotejo(datos):
+    # Nómina (lista o CSV) o cantidad de estudiantes, y criterios extra para la lista de cotejo
+    return {
+        'estudiantes': leer_estudiantes(datos.get('estudiantes'), datos.get('num_estudiantes')),
+        'criterios_adicionales': leer_criterios_adicionales(datos.get('criterios_adicionales')),
+    }
+
+def datos_peticion():
+    # JSON o formulario multipart; en el formulario la nómina puede subirse como archivo CSV
+    if request.mimetype != 'multipart/form-data':
+        return request.get_json(silent=True) or {}
+    datos = request.form.to_dict()
+    if 'criterios_adicionales' in request.form:
+        datos['criterios_adicionales'] = request.form.getlist('criterios_adicionales')
+    archivo = request.files.get('estudiantes')
+    if archivo:
+        contenido = archivo.read()
+        try:
+            datos['estudiantes'] = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # CSV guardado desde Excel en Windows
+            datos['estudiantes'] = contenido.decode('cp1252', errors='replace')
+    return datos
+
+def producir_documento(ciclo, area, tema, etapas, renderizar=None, estudiantes=None, criterios_adicionales=None,
+                       contenido=None):
+    # contenido: ya obtenido por el llamador (el servidor asíncrono consulta la IA por su cuenta)
+    if contenido is None:
+        with medir(etapas, 'buscar_en_db'):
+            contenido = buscar_en_db(ciclo, area)
+
+    if not contenido:
+        with medir(etapas, 'ia'):
+            contenido = generar_contenido_ia(ciclo, area, tema)
+
+    estudiantes = estudiantes or leer_estudiantes()
+    if criterios_adicionales:
+        # Lanza ValueError si con los de este contenido no entran en la tabla
+        contenido = dict(contenido, criterios=sumar_criterios(contenido.get('criterios', []), criterios_adicionales))
+
+    clave = clave_documento(VERSION_DOCUMENTO, DOCX_MOTOR, ciclo, area, tema, contenido, estudiantes)
+    entrada = contar_cache('documentos', cache_documentos.obtener(clave))
+    if entrada is None:
+        # El mismo documento pedido a la vez (en este u otro worker) se arma una sola vez
+        entrada = deduplicador.ejecutar(
+            f'documento|{clave}',
+            lambda: renderizar_y_guardar(clave, ciclo, area, tema, contenido, etapas, renderizar, estudiantes),
+            codificar=lambda entrada: entrada[0].encode('ascii') + b'\n' + entrada[1],
+            decodificar=lambda datos: (datos[:datos.index(b'\n')].decode('ascii'), datos[datos.index(b'\n') + 1:])
+        )
+    registrar_revision(clave, ciclo, area, tema, contenido, estudiantes)
+    return entrada + (clave,)
+
+def registrar_revision(clave, ciclo, area, tema, contenido, estudiantes):
+    # La revisión de un documento es su clave en la cache: mismas entradas, misma revisión
+    revisiones.registrar(clave, {'ciclo': ciclo, 'area': area, 'tema': tema, 'contenido': contenido,
+                                 'estudiantes': estudiantes})
+
+def renderizar_y_guardar(clave, ciclo, area, tema, contenido, etapas, renderizar=None, estudiantes=None):
+    with medir(etapas, 'render'), admision.ocupando('render'):
+        archivo = (renderizar or renderizar_en_proceso)(ciclo, area, tema, contenido, estudiantes)
+    return cache_documentos.guardar(clave, archivo)
 
 @app.route('/generar', methods=['POST'])
 def generar_documento():
     try:
-        data = request.json
+        data = datos_peticion()
         ciclo = data.get('ciclo')
         area = data.get('area')
         tema = data.get('tema')
@@ -723,62 +882,812 @@ def generar_documento():
         if not all([ciclo, area, tema]):
             return jsonify({'error': 'Faltan datos requeridos'}), 400
 
-        contenido = buscar_en_db(ciclo, area)
+        try:
+            opciones = opciones_cotejo(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        if not contenido:
-            contenido = generar_contenido_ia(ciclo, area, tema)
+        try:
+            with admitir_generacion(ciclo, area):
+                etag, archivo, revision = producir_documento(ciclo, area, tema, {}, **opciones)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Rechazada as e:
+            return respuesta_rechazada(e)
+        except ColaLlena:
+            return respuesta_cola_llena()
 
-        doc = crear_documento_word(ciclo, area, tema, contenido)
+        return respuesta_documento(etag, archivo, revision, nombre_archivo(ciclo, area))
 
-        file_stream = BytesIO()
-        doc.save(file_stream)
-        file_stream.seek(0)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return send_file(
-            file_stream,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+def admitir_generacion(ciclo, area, ocupar=True):
+    # Con entrada en el currículo el documento sale en milisegundos: va por el carril prioritario, sin
+    # fichas ni turno. Lanza Rechazada (429 o 503)
+    return admitir_peticion(curriculo.buscar(area, ciclo) is not None, ocupar)
+
+def admitir_lote(elementos):
+    # Una ficha por cada elemento fuera del currículo; el lote ocupa un turno mientras dura la descarga.
+    # Solo con elementos del currículo va por el carril prioritario
+    fichas = sum(1 for elemento in elementos if not isinstance(elemento, dict)
+                 or curriculo.buscar(elemento.get('area'), elemento.get('ciclo')) is None)
+    return admitir_peticion(fichas == 0, fichas=fichas)
+
+def admitir_peticion(prioritaria, ocupar=True, fichas=1):
+    carril = 'prioritario' if prioritaria else 'general'
+    ip = ip_cliente(request.remote_addr, request.headers.get('X-Forwarded-For'), PROXY_SALTOS)
+    try:
+        turno = admision.admitir(request.headers.get('X-Api-Key'), ip, prioritaria, ocupar, fichas)
+    except Rechazada as e:
+        metricas.incrementar('prototipo_admision_total', carril=carril, resultado=e.codigo)
+        raise
+    metricas.incrementar('prototipo_admision_total', carril=carril, resultado='admitida')
+    return turno
+
+def respuesta_rechazada(e):
+    respuesta = jsonify({'error': str(e)})
+    respuesta.headers['Retry-After'] = str(e.reintentar)
+    return respuesta, e.codigo
+
+def respuesta_cola_llena():
+    respuesta = jsonify({'error': 'Hay demasiados documentos en proceso, intenta nuevamente en unos segundos'})
+    respuesta.headers['Retry-After'] = '5'
+    return respuesta, 503
+
+def respuesta_documento(etag, archivo, revision, nombre):
+    if request.if_none_match.contains_weak(etag):
+        cache_documentos.registrar_no_modificado()
+        metricas.incrementar('prototipo_cache_total', cache='documentos', resultado='no_modificado')
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag)
+    else:
+        respuesta = send_file(
+            BytesIO(archivo),
+            mimetype=MIMETYPE_DOCX,
             as_attachment=True,
-            download_name=f'Competencias_{area}_Ciclo_{ciclo}.docx'
+            download_name=nombre,
+            etag=etag
         )
+    # Id para editar el documento con PATCH /documentos/<revision>
+    respuesta.headers['X-Revision'] = revision
+    return respuesta
+
+def evento_sse(nombre, datos):
+    return f"event: {nombre}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+@app.route('/generar/stream')
+def generar_stream():
+    ciclo = request.args.get('ciclo')
+    area = request.args.get('area')
+    tema = request.args.get('tema')
+
+    if not all([ciclo, area, tema]):
+        return jsonify({'error': 'Faltan datos requeridos'}), 400
+
+    try:
+        estudiantes = leer_estudiantes(num_estudiantes=request.args.get('num_estudiantes'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        turno = admitir_generacion(ciclo, area)
+    except Rechazada as e:
+        return respuesta_rechazada(e)
+
+    def eventos():
+        etapas = {}
+        try:
+            with medir(etapas, 'buscar_en_db'):
+                contenido = buscar_en_db(ciclo, area)
+
+            if contenido:
+                for campo in CAMPOS_CONTENIDO:
+                    if campo in contenido:
+                        yield evento_sse('campo', {'campo': campo, 'valor': contenido[campo]})
+            else:
+                inicio = time.perf_counter()
+                campos = generar_contenido_ia_stream(ciclo, area, tema)
+                while True:
+                    try:
+                        campo, valor = next(campos)
+                    except StopIteration as fin:
+                        contenido = fin.value
+                        break
+                    if 'primer_campo' not in etapas:
+                        etapas['primer_campo'] = time.perf_counter() - inicio
+                        metricas.observar('prototipo_etapa_segundos', etapas['primer_campo'], etapa='primer_campo')
+                    yield evento_sse('campo', {'campo': campo, 'valor': valor})
+                etapas['ia'] = time.perf_counter() - inicio
+                metricas.observar('prototipo_etapa_segundos', etapas['ia'], etapa='ia')
+
+            # El documento se arma en cuanto se cierra el último campo
+            clave = clave_documento(VERSION_DOCUMENTO, DOCX_MOTOR, ciclo, area, tema, contenido, estudiantes)
+            entrada = contar_cache('documentos', cache_documentos.obtener(clave))
+            if entrada is None:
+                with medir(etapas, 'render'), admision.ocupando('render'):
+                    archivo = renderizar_en_proceso(ciclo, area, tema, contenido, estudiantes)
+                entrada = cache_documentos.guardar(clave, archivo)
+            etag, archivo = entrada
+            registrar_revision(clave, ciclo, area, tema, contenido, estudiantes)
+
+            estado = gestor_trabajos.registrar(etapas, etag, archivo, nombre_archivo(ciclo, area), clave)
+            yield evento_sse('completado', {
+                'id': estado['id'],
+                'url_archivo': f"/generar/jobs/{estado['id']}/archivo",
+                'revision': clave,
+                'etapas': etapas
+            })
+
+        except Exception as e:
+            yield evento_sse('fallo', {'error': str(e)})
+
+    respuesta = Response(
+        stream_with_context(eventos()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # El turno dura lo que dura el stream
+    respuesta.call_on_close(turno.liberar)
+    return respuesta
+
+def renderizar_en_proceso(ciclo, area, tema, contenido, estudiantes=None):
+    # El motor de plantilla tarda menos que enviar el trabajo a otro proceso; solo el constructor
+    # python-docx justifica salir del proceso
+    if DOCX_MOTOR == 'python-docx' and servicio_render is not None:
+        return servicio_render.renderizar(ciclo, area, tema, contenido, estudiantes)
+    return renderizar_docx(ciclo, area, tema, contenido, estudiantes)
+
+def calentar_render():
+    # Primer documento de cada proceso de render: deja importado python-docx y cargada la plantilla base
+    entrada = next(iter(curriculo))
+    renderizar_docx(entrada.ciclo, entrada.area, 'Calentamiento', entrada.como_dict(), leer_estudiantes())
+
+def procesar_elemento_lote(elemento):
+    if not isinstance(elemento, dict):
+        raise ValueError('Elemento inválido')
+    ciclo = elemento.get('ciclo')
+    area = elemento.get('area')
+    tema = elemento.get('tema')
+    if not all([ciclo, area, tema]):
+        raise ValueError('Faltan datos requeridos')
+
+    etapas = {}
+    etag, archivo, revision = producir_documento(ciclo, area, tema, etapas, **opciones_cotejo(elemento))
+    return archivo, {'etag': etag, 'revision': revision, 'etapas': etapas}
+
+def nombre_entrada_lote(indice, elemento):
+    nombre = nombre_archivo(elemento['ciclo'], elemento['area'])
+    return f"{indice + 1:03d}_" + nombre.replace('/', '-').replace('\\', '-')
+
+@app.route('/generar/lote', methods=['POST'])
+def generar_lote():
+    data = request.get_json(silent=True)
+    elementos = data.get('elementos') if isinstance(data, dict) else data
+
+    if not isinstance(elementos, list) or not elementos:
+        return jsonify({'error': 'Se requiere una lista de elementos con ciclo, area y tema'}), 400
+    if len(elementos) > LOTE_MAX_ELEMENTOS:
+        return jsonify({'error': f'El lote admite como máximo {LOTE_MAX_ELEMENTOS} elementos'}), 400
+
+    try:
+        turno = admitir_lote(elementos)
+    except Rechazada as e:
+        return respuesta_rechazada(e)
+
+    respuesta = Response(
+        stream_with_context(zip_en_stream(elementos, procesar_elemento_lote, nombre_entrada_lote, hilos=LOTE_HILOS)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=Competencias_lote.zip'}
+    )
+    # El turno dura lo que dura la descarga
+    respuesta.call_on_close(turno.liberar)
+    return respuesta
+
+def ejecutar_trabajo(datos, etapas):
+    etag, archivo, revision = producir_documento(datos['ciclo'], datos['area'], datos['tema'], etapas,
+                                                 estudiantes=datos.get('estudiantes'),
+                                                 criterios_adicionales=datos.get('criterios_adicionales'))
+    return etag, archivo, nombre_archivo(datos['ciclo'], datos['area']), revision
+
+@app.route('/generar/jobs', methods=['POST'])
+def crear_trabajo():
+    data = datos_peticion()
+    datos = {campo: data.get(campo) for campo in ('ciclo', 'area', 'tema')}
+
+    if not all(datos.values()):
+        return jsonify({'error': 'Faltan datos requeridos'}), 400
+
+    try:
+        datos.update(opciones_cotejo(data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # El trabajo espera en la cola de trabajos, no en la de turnos: solo gasta la ficha
+        admitir_generacion(datos['ciclo'], datos['area'], ocupar=False)
+        estado = gestor_trabajos.enviar(ejecutar_trabajo, datos)
+    except Rechazada as e:
+        return respuesta_rechazada(e)
+    except ColaLlena:
+        return respuesta_cola_llena()
+
+    return jsonify({
+        'id': estado['id'],
+        'estado': estado['estado'],
+        'url_estado': f"/generar/jobs/{estado['id']}",
+        'url_archivo': f"/generar/jobs/{estado['id']}/archivo"
+    }), 202
+
+@app.route('/generar/jobs/<id_trabajo>')
+def consultar_trabajo(id_trabajo):
+    estado = gestor_trabajos.obtener(id_trabajo)
+    if estado is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(estado)
+
+@app.route('/generar/jobs/<id_trabajo>/archivo')
+def descargar_trabajo(id_trabajo):
+    estado = gestor_trabajos.obtener(id_trabajo)
+    if estado is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if estado['estado'] != 'completado':
+        return jsonify({'error': 'El documento aún no está listo', 'estado': estado['estado']}), 409
+
+    return send_file(
+        gestor_trabajos.ruta_archivo(id_trabajo),
+        mimetype=MIMETYPE_DOCX,
+        as_attachment=True,
+        download_name=estado['nombre_archivo'],
+        etag=estado['etag']
+    )
+
+def aplicar_cambios(entradas, cambios):
+    # Devuelve (entradas de la nueva revisión, campos del contenido que la IA debe volver a generar)
+    entradas = dict(entradas, contenido=dict(entradas['contenido']))
+    if 'tema' in cambios:
+        if not isinstance(cambios['tema'], str) or not cambios['tema'].strip():
+            raise ValueError('tema debe ser un texto')
+        entradas['tema'] = cambios['tema']
+
+    contenido = cambios.get('contenido') or {}
+    if not isinstance(contenido, dict):
+        raise ValueError('contenido debe ser un objeto con los campos a cambiar')
+    for campo, valor in contenido.items():
+        if campo not in CAMPOS_CONTENIDO:
+            raise ValueError(f'Campo desconocido: {campo}')
+        if campo in LONGITUDES:
+            if not isinstance(valor, list) or not all(isinstance(v, str) for v in valor):
+                raise ValueError(f'{campo} debe ser una lista de textos')
+            valor = [v.strip() for v in valor if v.strip()]
+            if not valor:
+                raise ValueError(f'{campo} no puede quedar vacío')
+        elif not isinstance(valor, str) or not valor.strip():
+            raise ValueError(f'{campo} debe ser un texto')
+        else:
+            valor = valor.strip()
+        entradas['contenido'][campo] = valor
+
+    adicionales = leer_criterios_adicionales(cambios.get('criterios_adicionales'))
+    if adicionales or 'criterios' in entradas['contenido']:
+        entradas['contenido']['criterios'] = sumar_criterios(entradas['contenido'].get('criterios', []), adicionales)
+
+    if 'estudiantes' in cambios or 'num_estudiantes' in cambios:
+        entradas['estudiantes'] = leer_estudiantes(cambios.get('estudiantes'), cambios.get('num_estudiantes'))
+
+    regenerar = cambios.get('regenerar') or []
+    if not isinstance(regenerar, list) or not all(campo in CAMPOS_CONTENIDO for campo in regenerar):
+        raise ValueError(f'regenerar debe ser una lista de campos: {", ".join(CAMPOS_CONTENIDO)}')
+    return entradas, list(dict.fromkeys(regenerar))
+
+def regenerar_campos(ciclo, area, tema, contenido, campos):
+    # Solo los campos pedidos, con el resto del contenido como contexto; None si la IA no respondió bien
+    if interruptor_ia.abierto():
+        contar_ia('rechazos_interruptor')
+        return None
+    contexto = {campo: contenido[campo] for campo in CAMPOS_CONTENIDO if campo in contenido and campo not in campos}
+    with presupuesto(IA_PRESUPUESTO_SEGUNDOS):
+        datos = llamar_funcion_ia(ciclo, area, tema, campos, contexto=contexto)
+    if datos is None:
+        return None
+    regenerados, faltantes = validar_contenido(datos, campos)
+    return None if faltantes else regenerados
+
+def reemitir_documento(revision_anterior, anteriores, entradas):
+    # Con el motor de plantilla se parte del .docx de la revisión anterior y solo se emiten los slots cuyo
+    # texto cambió; las filas de la lista de cotejo, solo si cambió la nómina o la cantidad de criterios.
+    # None si no hay de dónde partir (motor python-docx o el .docx ya salió de la cache)
+    if DOCX_MOTOR == 'python-docx':
+        return None
+    previo = cache_documentos.obtener(revision_anterior)
+    if previo is None:
+        return None
+
+    num_anterior = len(anteriores['contenido'].get('criterios', []))
+    num_criterios = len(entradas['contenido'].get('criterios', []))
+    textos_antes = textos_contenido(anteriores['ciclo'], anteriores['area'], anteriores['tema'], anteriores['contenido'])
+    textos = textos_contenido(entradas['ciclo'], entradas['area'], entradas['tema'], entradas['contenido'])
+    cambiados = {nombre: texto for nombre, texto in textos.items() if textos_antes.get(nombre) != texto}
+    if entradas['estudiantes'] != anteriores['estudiantes'] or num_criterios != num_anterior:
+        cambiados['filas_cotejo'] = filas_cotejo(entradas['estudiantes'], num_criterios)
+    try:
+        return motor_plantilla.reemitir(previo[1], num_anterior, cambiados, num_criterios)
+    except ValueError:
+        return None
+
+def producir_revision(revision_anterior, anteriores, entradas, etapas):
+    ciclo, area, tema = entradas['ciclo'], entradas['area'], entradas['tema']
+    contenido, estudiantes = entradas['contenido'], entradas['estudiantes']
+    clave = clave_documento(VERSION_DOCUMENTO, DOCX_MOTOR, ciclo, area, tema, contenido, estudiantes)
+    entrada = contar_cache('documentos', cache_documentos.obtener(clave))
+    if entrada is None:
+        with medir(etapas, 'render'):
+            archivo = reemitir_documento(revision_anterior, anteriores, entradas)
+            metricas.incrementar('prototipo_ediciones_total', render='completo' if archivo is None else 'parcial')
+            if archivo is None:
+                archivo = renderizar_en_proceso(ciclo, area, tema, contenido, estudiantes)
+        entrada = cache_documentos.guardar(clave, archivo)
+    registrar_revision(clave, ciclo, area, tema, contenido, estudiantes)
+    return entrada + (clave,)
+
+@app.route('/documentos/<revision>')
+def consultar_documento(revision):
+    entradas = revisiones.obtener(revision)
+    if entradas is None:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+    return jsonify(dict(entradas, revision=revision))
+
+@app.route('/documentos/<revision>', methods=['PATCH'])
+def editar_documento(revision):
+    # Cambios a nivel de campo sobre un documento ya generado: sin currículo ni IA, salvo los campos
+    # pedidos en "regenerar"
+    anteriores = revisiones.obtener(revision)
+    if anteriores is None:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+
+    cambios = request.get_json(silent=True)
+    if not isinstance(cambios, dict) or not cambios:
+        return jsonify({'error': 'Se requiere un objeto JSON con los cambios'}), 400
+    try:
+        entradas, regenerar = aplicar_cambios(anteriores, cambios)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        etapas = {}
+        if regenerar:
+            with medir(etapas, 'ia'):
+                regenerados = regenerar_campos(entradas['ciclo'], entradas['area'], entradas['tema'],
+                                               entradas['contenido'], regenerar)
+            if regenerados is None:
+                return jsonify({'error': 'No se pudieron regenerar los campos, intenta nuevamente'}), 502
+            entradas['contenido'].update(regenerados)
+
+        try:
+            etag, archivo, nueva = producir_revision(revision, anteriores, entradas, etapas)
+        except ColaLlena:
+            return respuesta_cola_llena()
+
+        respuesta = respuesta_documento(etag, archivo, nueva, nombre_archivo(entradas['ciclo'], entradas['area']))
+        respuesta.headers['X-Revision-Anterior'] = revision
+        return respuesta
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def es_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/admin/cache/documentos')
+def estado_cache_documentos():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify(cache_documentos.estadisticas())
+
+@app.route('/admin/cache/ia', methods=['GET', 'DELETE'])
+def administrar_cache_ia():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    if cache_ia is None:
+        return jsonify({'error': 'Cache de IA desactivada'}), 404
+
+    filtros = {campo: request.args.get(campo) for campo in ('ciclo', 'area', 'tema')}
+    if request.method == 'DELETE':
+        return jsonify({'eliminadas': cache_ia.purgar(**filtros)})
+
+    limite = request.args.get('limite', 100, type=int)
+    return jsonify({
+        'estadisticas': cache_ia.estadisticas(),
+        'entradas': cache_ia.listar(limite=limite, **filtros)
+    })
+
+@app.route('/admin/ia')
+def estado_ia():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+
+    with _lock_contadores_ia:
+        contadores = dict(contadores_ia)
+    llamadas = contadores['llamadas'] or 1
+    return jsonify({
+        'contadores': contadores,
+        'tasa_respuestas_invalidas': contadores['respuestas_invalidas'] / llamadas,
+        'tasa_reparaciones': contadores['reparaciones'] / llamadas,
+        'agrupador': agrupador_ia.estadisticas() if agrupador_ia is not None else None,
+        'interruptor': interruptor_ia.estadisticas(),
+        'deduplicacion': deduplicador.estadisticas()
+    })
+
+@app.route('/admin/arranque')
+def estado_arranque():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify(arranque.reporte())
+
+@app.route('/admin/curriculo')
+def estado_curriculo():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify(dict(curriculo.memoria(), archivo=CURRICULO_PATH))
+
+@app.route('/admin/admision', methods=['GET', 'PATCH'])
+def administrar_admision():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    if request.method == 'PATCH':
+        try:
+            admision.ajustar(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(admision.estado())
+
+@app.route('/admin/memoria', methods=['GET', 'DELETE'])
+def administrar_memoria():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    if request.method == 'DELETE':
+        memoria.reiniciar()
+    agrupar = request.args.get('agrupar', 'lineno')
+    if agrupar not in ('lineno', 'traceback'):
+        return jsonify({'error': "agrupar debe ser 'lineno' o 'traceback'"}), 400
+    return jsonify(memoria.estado(limite=min(request.args.get('limite', 20, type=int), 200), agrupar=agrupar))
+
+@app.route('/admin/perfiles')
+def listar_perfiles():
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify({'perfiles': perfilador.listar()})
+
+@app.route('/admin/perfiles/<id_perfil>.<formato>')
+def descargar_perfil(id_perfil, formato):
+    if not es_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    datos = perfilador.leer(id_perfil, formato)
+    if datos is None:
+        return jsonify({'error': 'Perfil no encontrado'}), 404
+    return Response(datos, mimetype=FORMATOS_PERFIL[formato], headers={
+        'Content-Disposition': f'attachment; filename={id_perfil}.{formato}'
+    })
+
 def buscar_en_db(ciclo, area):
-    try:
-        if area in COMPETENCIAS_DB and ciclo in COMPETENCIAS_DB[area]:
-            return COMPETENCIAS_DB[area][ciclo]
-    except:
-        pass
+    entrada = curriculo.buscar(area, ciclo)
+    if entrada is not None:
+        metricas.incrementar('prototipo_db_total', resultado='acierto')
+        return entrada.como_dict()
+    metricas.incrementar('prototipo_db_total', resultado='fallo')
     return None
 
-def generar_contenido_ia(ciclo, area, tema):
-    prompt = f"Eres un asistente pedagógico experto en el Currículo Nacional de Educación Básica del Perú. Genera información educativa para Ciclo {ciclo}, Área {area}, Tema {tema}. Responde SOLO en JSON válido sin explicaciones. Incluye: competencia, capacidades (lista de 3), estandar, criterios (lista de 2), instrumento (siempre 'Lista de cotejo'), competencia_transversal, enfoque_transversal, descripcion_enfoque."
+def buscar_por_tema(ciclo, tema):
+    coincidencias = indice_temas.buscar(tema, ciclo, k=1)
+    if coincidencias and coincidencias[0][1] >= IA_RECUPERACION_UMBRAL:
+        area_db, ciclo_db = coincidencias[0][0]
+        contar_ia('aciertos_recuperacion')
+        return curriculo.buscar(area_db, ciclo_db).como_dict()
+    return None
 
+def referencias_curriculo(ciclo, tema, k):
+    lineas = []
+    for (area_db, ciclo_db), puntaje in indice_temas.buscar(tema, ciclo, k=k):
+        if puntaje < PUNTAJE_MINIMO_REFERENCIA:
+            continue
+        entrada = curriculo.buscar(area_db, ciclo_db)
+        lineas.append(f"- {area_db} ({ciclo_db}): {entrada.competencia} Capacidades: {'; '.join(entrada.capacidades)}")
+    return "\n".join(lineas)
+
+def generar_contenido_ia(ciclo, area, tema):
+    contenido = buscar_por_tema(ciclo, tema)
+    if contenido is not None:
+        return contenido
+
+    if cache_ia is not None:
+        try:
+            contenido = contar_cache('ia', cache_ia.obtener(ciclo, area, tema))
+            if contenido is not None:
+                return contenido
+        except Exception:
+            metricas.incrementar('prototipo_cache_total', cache='ia', resultado='error')
+
+    # El mismo tema pedido a la vez (en este u otro worker) se consulta a la IA una sola vez. Si esa consulta
+    # no trae contenido, los que esperaban no se quedan con el genérico: uno de ellos vuelve a consultar
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres experto en educación peruana. Responde en JSON válido."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
+        contenido = deduplicador.ejecutar(
+            f'ia|{clave_ia(ciclo, area, tema)}',
+            lambda: con_resultado(consultar_y_guardar(ciclo, area, tema)),
+            codificar=lambda valor: json.dumps(valor, ensure_ascii=False).encode('utf-8'),
+            decodificar=json.loads
         )
-
-        contenido_texto = response.choices[0].message.content.strip()
-        inicio = contenido_texto.find('{')
-        fin = contenido_texto.rfind('}') + 1
-
-        if inicio >= 0 and fin > inicio:
-            return json.loads(contenido_texto[inicio:fin])
+    except SinResultado:
+        return generar_contenido_generico(ciclo, area, tema)
+    indice_sugerencias.agregar(tema, area, ciclo, origen='ia')
+    return contenido
+
+def con_resultado(contenido):
+    # La IA no lanza excepciones (interruptor abierto, tiempo agotado, error, reparación fallida: None); para
+    # el deduplicador eso es una falla, no un resultado que compartir
+    if contenido is None:
+        raise SinResultado()
+    return contenido
+
+def consultar_y_guardar(ciclo, area, tema):
+    if interruptor_ia.abierto():
+        contar_ia('rechazos_interruptor')
+        return None
+    with presupuesto(IA_PRESUPUESTO_SEGUNDOS), admision.ocupando('ia'):
+        if agrupador_ia is not None:
+            contenido = agrupador_ia.consultar(ciclo, area, tema)
         else:
-            return generar_contenido_generico(ciclo, area, tema)
+            contenido = consultar_ia(ciclo, area, tema)
+    # El contenido genérico nunca se guarda en la cache
+    if contenido is not None and cache_ia is not None:
+        try:
+            cache_ia.guardar(ciclo, area, tema, contenido)
+        except Exception:
+            pass
+    return contenido
+
+def cliente_ia():
+    # openai (con aiohttp y requests) es más de la mitad del tiempo de importar la app: se importa con la
+    # primera consulta a la IA, así los workers que solo sirven el currículo y la cache no lo cargan
+    global _openai
+    if _openai is None:
+        with _lock_openai:
+            if _openai is None:
+                inicio = time.perf_counter()
+                import openai
+                openai.api_key = OPENAI_API_KEY
+                openai.api_base = OPENAI_API_BASE or openai.api_base
+                arranque.diferida('openai', time.perf_counter() - inicio)
+                _openai = openai
+    return _openai
+
+_openai = None
+_lock_openai = threading.Lock()
+
+def contar_ia(nombre):
+    with _lock_contadores_ia:
+        contadores_ia[nombre] += 1
+    metricas.incrementar('prototipo_ia_eventos_total', evento=nombre)
+
+def evento_error_ia(error):
+    if isinstance(error, InterruptorAbierto):
+        return 'rechazos_interruptor'
+    if isinstance(error, PresupuestoAgotado) or isinstance(error, cliente_ia().error.Timeout):
+        return 'timeouts'
+    return 'errores'
+
+def mensajes_ia(ciclo, area, tema, campos=CAMPOS_CONTENIDO, contexto=None):
+    # Prompt corto: la descripción de cada campo viaja en el esquema de la función
+    prompt = f"Ciclo {ciclo}, Área {area}, Tema {tema}."
+    if contexto:
+        prompt += f" Ya definido: {json.dumps(contexto, ensure_ascii=False)}. Completa solo: {', '.join(campos)}."
+    elif IA_RECUPERACION_K > 0:
+        referencias = referencias_curriculo(ciclo, tema, IA_RECUPERACION_K)
+        if referencias:
+            prompt += f"\nReferencias del currículo:\n{referencias}"
+    return [
+        {"role": "system", "content": "Eres experto en el Currículo Nacional de Educación Básica del Perú. Registra la información pedagógica de la unidad."},
+        {"role": "user", "content": prompt}
+    ]
+
+def argumentos_funcion(mensaje):
+    # Argumentos de la llamada a función; si el modelo respondió como texto, se busca el JSON en él
+    llamada = mensaje.get('function_call')
+    texto = llamada.get('arguments', '') if llamada else (mensaje.get('content') or '')
+    inicio = texto.find('{')
+    fin = texto.rfind('}') + 1
+    if inicio < 0 or fin <= inicio:
+        raise ValueError('La respuesta no contiene JSON')
+    with medir(None, 'ia_parse'):
+        return json.loads(texto[inicio:fin])
+
+def llamar_funcion_ia(ciclo, area, tema, campos, contexto=None):
+    contar_ia('llamadas')
+    try:
+        with metricas.en_curso('prototipo_ia_en_curso'):
+            response = llamador_ia.llamar(
+                cliente_ia().ChatCompletion.create,
+                model=IA_MODELO,
+                messages=mensajes_ia(ciclo, area, tema, campos, contexto),
+                functions=[funcion_contenido(campos)],
+                function_call={"name": FUNCION_CONTENIDO},
+                temperature=0.7,
+                max_tokens=tokens_maximos(campos)
+            )
+    except Exception as e:
+        contar_ia(evento_error_ia(e))
+        return None
 
-    except:
-        return generar_contenido_generico(ciclo, area, tema)
+    try:
+        datos = argumentos_funcion(response.choices[0].message)
+    except Exception:
+        contar_ia('respuestas_invalidas')
+        return None
+    return datos if isinstance(datos, dict) else None
+
+def completar_contenido(ciclo, area, tema, datos):
+    # Valida la respuesta contra el esquema y pide de nuevo solo los campos que falten
+    contenido, faltantes = validar_contenido(datos)
+    if not faltantes:
+        return contenido
+
+    contar_ia('reparaciones')
+    parche = llamar_funcion_ia(ciclo, area, tema, faltantes, contexto=contenido)
+    if parche is not None:
+        reparados, faltantes = validar_contenido(parche, faltantes)
+        contenido.update(reparados)
+    if faltantes:
+        contar_ia('reparaciones_fallidas')
+        return None
+    return {campo: contenido[campo] for campo in CAMPOS_CONTENIDO}
+
+def consultar_ia(ciclo, area, tema):
+    datos = llamar_funcion_ia(ciclo, area, tema, CAMPOS_CONTENIDO)
+    if datos is None:
+        return None
+    return completar_contenido(ciclo, area, tema, datos)
+
+def consultar_ia_lote(peticiones, limite=None):
+    # Corre fuera de las peticiones que esperan el lote: limite es el presupuesto más corto entre ellas
+    lineas = []
+    for i, (ciclo, area, tema) in enumerate(peticiones):
+        linea = f"{i + 1}. Ciclo {ciclo}, Área {area}, Tema {tema}"
+        # En lote solo se agrega la referencia más cercana de cada tema, para no alargar el prompt
+        referencia = referencias_curriculo(ciclo, tema, 1) if IA_RECUPERACION_K > 0 else ''
+        if referencia:
+            linea += f" (referencia {referencia[2:]})"
+        lineas.append(linea)
+    temas = "\n".join(lineas)
+    resultados = [None] * len(peticiones)
+
+    contar_ia('llamadas')
+    try:
+        with metricas.en_curso('prototipo_ia_en_curso'):
+            response = llamador_ia.llamar(
+                cliente_ia().ChatCompletion.create,
+                limite=limite,
+                model=IA_MODELO,
+                messages=[
+                    {"role": "system", "content": "Eres experto en el Currículo Nacional de Educación Básica del Perú. Registra la información pedagógica de cada unidad."},
+                    {"role": "user", "content": f"Un elemento por tema, con su indice:\n{temas}"}
+                ],
+                functions=[funcion_lote()],
+                function_call={"name": FUNCION_LOTE},
+                temperature=0.7,
+                max_tokens=min(3500, tokens_maximos(elementos=len(peticiones)))
+            )
+    except Exception as e:
+        contar_ia(evento_error_ia(e))
+        return resultados
+
+    try:
+        elementos = argumentos_funcion(response.choices[0].message).get('elementos')
+    except Exception:
+        contar_ia('respuestas_invalidas')
+        return resultados
+
+    # Los elementos incompletos quedan en None y cada llamador los reintenta por separado
+    for posicion, elemento in enumerate(elementos if isinstance(elementos, list) else []):
+        if not isinstance(elemento, dict):
+            continue
+        indice = elemento.get('indice', posicion + 1)
+        contenido, faltantes = validar_contenido(elemento)
+        if not faltantes and isinstance(indice, int) and 1 <= indice <= len(peticiones):
+            resultados[indice - 1] = contenido
+    return resultados
+
+def consultar_ia_stream(ciclo, area, tema):
+    # Generador: entrega (campo, valor) en cuanto cada campo se cierra y devuelve el dict completo
+    # (o None si la respuesta no es un JSON válido)
+    parser = ParserCamposJSON()
+    contenido = {}
+    contar_ia('llamadas')
+    # El generador se reanuda entre yields, así que el presupuesto viaja como límite explícito
+    limite = time.monotonic() + IA_PRESUPUESTO_SEGUNDOS
+    try:
+        # Un stream abandonado por el cliente también descuenta la consulta en curso (GeneratorExit)
+        with metricas.en_curso('prototipo_ia_en_curso'):
+            response = llamador_ia.llamar(
+                cliente_ia().ChatCompletion.create,
+                limite=limite,
+                model=IA_MODELO,
+                messages=mensajes_ia(ciclo, area, tema),
+                functions=[funcion_contenido()],
+                function_call={"name": FUNCION_CONTENIDO},
+                temperature=0.7,
+                max_tokens=tokens_maximos(),
+                stream=True
+            )
+
+            for chunk in response:
+                delta = chunk['choices'][0]['delta']
+                texto = (delta.get('function_call') or {}).get('arguments') or delta.get('content')
+                if not texto:
+                    continue
+                for campo, valor in parser.alimentar(texto):
+                    contenido[campo] = valor
+                    yield campo, valor
+                if parser.terminado:
+                    break
+                if time.monotonic() > limite:
+                    raise PresupuestoAgotado()
+
+    except ValueError:
+        contar_ia('respuestas_invalidas')
+        return None
+    except Exception as e:
+        contar_ia(evento_error_ia(e))
+        return None
+
+    if not parser.terminado:
+        contar_ia('respuestas_invalidas')
+        return None
+
+    completo = completar_contenido(ciclo, area, tema, contenido)
+    if completo is None:
+        return None
+    # Se reenvían los campos reparados o normalizados por la validación
+    for campo in CAMPOS_CONTENIDO:
+        if contenido.get(campo) != completo[campo]:
+            yield campo, completo[campo]
+    return completo
+
+def generar_contenido_ia_stream(ciclo, area, tema):
+    # Igual que generar_contenido_ia, pero entregando los campos a medida que están disponibles
+    contenido = buscar_por_tema(ciclo, tema)
+    if contenido is None and cache_ia is not None:
+        try:
+            contenido = contar_cache('ia', cache_ia.obtener(ciclo, area, tema))
+        except Exception:
+            metricas.incrementar('prototipo_cache_total', cache='ia', resultado='error')
+
+    if contenido is not None:
+        for campo in CAMPOS_CONTENIDO:
+            if campo in contenido:
+                yield campo, contenido[campo]
+        return contenido
+
+    if interruptor_ia.abierto():
+        contar_ia('rechazos_interruptor')
+    else:
+        contenido = yield from consultar_ia_stream(ciclo, area, tema)
+    if contenido is None:
+        # El contenido genérico reemplaza los campos ya enviados y nunca se guarda en la cache
+        contenido = generar_contenido_generico(ciclo, area, tema)
+        for campo in CAMPOS_CONTENIDO:
+            yield campo, contenido[campo]
+        return contenido
+
+    if cache_ia is not None:
+        try:
+            cache_ia.guardar(ciclo, area, tema, contenido)
+        except Exception:
+            pass
+    indice_sugerencias.agregar(tema, area, ciclo, origen='ia')
+    return contenido
 
 def generar_contenido_generico(ciclo, area, tema):
+    metricas.incrementar('prototipo_contenido_generico_total')
     return {
         "competencia": f"Competencia del área de {area} - Ciclo {ciclo}",
         "capacidades": [
@@ -797,8 +1706,84 @@ def generar_contenido_generico(ciclo, area, tema):
         "descripcion_enfoque": "Busca el beneficio común y la construcción de comunidades solidarias."
     }
 
-def crear_documento_word(ciclo, area, tema, contenido):
-    doc = Document()
+def textos_documento(ciclo, area, tema, contenido, estudiantes=None):
+    # Textos variables del documento, uno por run; el motor de plantilla usa estas mismas claves como slots
+    textos = textos_contenido(ciclo, area, tema, contenido)
+    textos['filas_cotejo'] = filas_cotejo(estudiantes or leer_estudiantes(), len(contenido.get('criterios', [])))
+    return textos
+
+def textos_contenido(ciclo, area, tema, contenido):
+    # Todos los textos salvo las filas de la lista de cotejo, que dependen de la nómina
+    capacidades = contenido.get('capacidades', [])
+    criterios = contenido.get('criterios', [])
+
+    comp_text = f"{contenido.get('competencia', 'N/A')}\n\nCapacidades:\n"
+    comp_text += "\n".join([f"• {cap}" for cap in capacidades])
+
+    crit_text = "\n".join([f"• {crit}" for crit in criterios])
+
+    trans_text = f"{contenido.get('competencia_transversal', 'N/A')}\n\n"
+    trans_text += f"Enfoque: {contenido.get('enfoque_transversal', 'N/A')}\n\n"
+    trans_text += contenido.get('descripcion_enfoque', 'N/A')
+
+    textos = {
+        'ciclo': f'{ciclo}  |  ',
+        'area': f'{area}  |  ',
+        'tema': f'{tema}',
+        'competencias': comp_text,
+        'estandar': contenido.get('estandar', 'No disponible'),
+        'criterios': crit_text if crit_text else 'No disponible',
+        'instrumento': contenido.get('instrumento', 'No disponible'),
+        'transversal': trans_text,
+        'cotejo_competencia': f'{contenido.get("competencia", "N/A")}',
+        'cotejo_criterios': " | ".join(criterios),
+    }
+    for idx, criterio in enumerate(criterios):
+        textos[f'criterio_{idx}'] = f'{criterio}'
+    return textos
+
+def crear_documento_word(ciclo, area, tema, contenido, estudiantes=None):
+    # Devuelve un Document propio, que el llamador puede conservar
+    textos = textos_documento(ciclo, area, tema, contenido, estudiantes)
+    return construir_documento(textos, len(contenido.get('criterios', [])))
+
+def renderizar_docx(ciclo, area, tema, contenido, estudiantes=None):
+    if DOCX_MOTOR == 'python-docx':
+        with medir(None, 'crear_documento_word'):
+            textos = textos_documento(ciclo, area, tema, contenido, estudiantes)
+            doc = construir_documento(textos, len(contenido.get('criterios', [])), documento_base())
+        with medir(None, 'doc_save'):
+            file_stream = BytesIO()
+            doc.save(file_stream)
+        return file_stream.getvalue()
+
+    with medir(None, 'plantilla'):
+        textos = textos_documento(ciclo, area, tema, contenido, estudiantes)
+        return motor_plantilla.renderizar(textos, len(contenido.get('criterios', [])))
+
+def documento_nuevo():
+    # Abrir la plantilla por defecto de python-docx cuesta ~15 ms (sobre todo styles.xml); se abre una vez
+    # al importar (en el maestro, con gunicorn --preload) y cada documento es una copia completa (~10 ms)
+    return deepcopy(_plantilla_base)
+
+def documento_base():
+    # Solo para armar y guardar en el acto (renderizar_docx): cada hilo reusa su propia copia de la plantilla
+    # y para cada documento solo se repone una copia del document.xml vacío, la única parte que modifica el
+    # constructor. El siguiente documento del mismo hilo reescribe este, así que no debe salir de ahí
+    base = getattr(_documentos_base, 'doc', None)
+    if base is None:
+        base = _documentos_base.doc = deepcopy(_plantilla_base)
+    base.part._element = deepcopy(_documento_vacio)
+    return base.part.document
+
+_plantilla_base = Document()
+_documento_vacio = deepcopy(_plantilla_base.element)
+_documentos_base = threading.local()
+
+def construir_documento(textos, num_criterios, doc=None):
+    # doc: documento vacío donde armar (sin él, uno nuevo)
+    if doc is None:
+        doc = documento_nuevo()
 
     # Configurar márgenes
     section = doc.sections[0]
@@ -814,11 +1799,11 @@ def crear_documento_word(ciclo, area, tema, contenido):
     doc.add_paragraph()
     info = doc.add_paragraph()
     info.add_run('Ciclo: ').bold = True
-    info.add_run(f'{ciclo}  |  ')
+    info.add_run(textos['ciclo'])
     info.add_run('Área: ').bold = True
-    info.add_run(f'{area}  |  ')
+    info.add_run(textos['area'])
     info.add_run('Tema: ').bold = True
-    info.add_run(f'{tema}')
+    info.add_run(textos['tema'])
 
     doc.add_paragraph()
 
@@ -839,23 +1824,11 @@ def crear_documento_word(ciclo, area, tema, contenido):
 
     row = tabla1.add_row()
 
-    comp_text = f"{contenido.get('competencia', 'N/A')}\n\nCapacidades:\n"
-    capacidades = contenido.get('capacidades', [])
-    comp_text += "\n".join([f"• {cap}" for cap in capacidades])
-    row.cells[0].text = comp_text
-
-    row.cells[1].text = contenido.get('estandar', 'No disponible')
-
-    criterios = contenido.get('criterios', [])
-    crit_text = "\n".join([f"• {crit}" for crit in criterios])
-    row.cells[2].text = crit_text if crit_text else 'No disponible'
-
-    row.cells[3].text = contenido.get('instrumento', 'No disponible')
-
-    trans_text = f"{contenido.get('competencia_transversal', 'N/A')}\n\n"
-    trans_text += f"Enfoque: {contenido.get('enfoque_transversal', 'N/A')}\n\n"
-    trans_text += contenido.get('descripcion_enfoque', 'N/A')
-    row.cells[4].text = trans_text
+    row.cells[0].text = textos['competencias']
+    row.cells[1].text = textos['estandar']
+    row.cells[2].text = textos['criterios']
+    row.cells[3].text = textos['instrumento']
+    row.cells[4].text = textos['transversal']
 
     # SALTO DE PÁGINA
     doc.add_page_break()
@@ -872,20 +1845,17 @@ def crear_documento_word(ciclo, area, tema, contenido):
     # Descripción
     desc = doc.add_paragraph()
     desc.add_run('Competencia: ').bold = True
-    desc.add_run(f'{contenido.get("competencia", "N/A")}')
+    desc.add_run(textos['cotejo_competencia'])
 
     desc2 = doc.add_paragraph()
     desc2.add_run('Criterios de evaluación: ').bold = True
-    criterios_text = " | ".join(contenido.get('criterios', []))
-    desc2.add_run(criterios_text)
+    desc2.add_run(textos['cotejo_criterios'])
 
     doc.add_paragraph()
 
         # Crear tabla de cotejo CON COLUMNA DE NOMBRES
-    num_estudiantes = 20
-    num_criterios = len(contenido.get('criterios', []))
-    # +2 porque agregamos columna Nº y columna Nombres
-    tabla_cotejo = doc.add_table(rows=num_estudiantes + 2, cols=num_criterios + 2)
+    # +2 porque agregamos columna Nº y columna Nombres; las filas de estudiantes se agregan al final
+    tabla_cotejo = doc.add_table(rows=2, cols=num_criterios + 2)
     tabla_cotejo.style = 'Table Grid'
     
     # Encabezado: Número
@@ -903,10 +1873,9 @@ def crear_documento_word(ciclo, area, tema, contenido):
         run.font.size = Pt(10)
     
     # Encabezados de criterios (texto completo)
-    criterios_list = contenido.get('criterios', [])
-    for idx, criterio in enumerate(criterios_list):
+    for idx in range(num_criterios):
         cell = tabla_cotejo.rows[0].cells[idx + 2]  # +2 porque está después de Nº y Nombres
-        cell.text = f'{criterio}'  # Pone el criterio completo
+        cell.text = textos[f'criterio_{idx}']  # Pone el criterio completo
         for run in cell.paragraphs[0].runs:
             run.font.bold = True
             run.font.size = Pt(9)
@@ -925,21 +1894,23 @@ def crear_documento_word(ciclo, area, tema, contenido):
         for run in cell.paragraphs[0].runs:
             run.font.size = Pt(8)
     
-    # Llenar filas con números de estudiante
-    for i in range(2, num_estudiantes + 2):
-        cell_num = tabla_cotejo.rows[i].cells[0]
-        cell_num.text = str(i - 1)
-        for run in cell_num.paragraphs[0].runs:
-            run.font.size = Pt(9)
-    
-    # Configurar ancho de celdas - IMPORTANTE
+    # Configurar ancho de columnas - IMPORTANTE
+    # Una vez en la grilla y en las dos filas de encabezado; las filas de estudiantes ya traen el suyo
+    anchos = anchos_columnas(num_criterios)
+    for columna, ancho in zip(tabla_cotejo.columns, anchos):
+        columna.width = Twips(ancho)
     for row in tabla_cotejo.rows:
-        row.cells[0].width = Inches(0.4)      # Columna Nº (muy pequeña)
-        row.cells[1].width = Inches(3.2)      # Columna Nombres (ANCHA)
-        for idx in range(2, len(row.cells)):
-            row.cells[idx].width = Inches(0.6)  # Columnas criterios (pequeñas para marcar)
-
-
+        for cell, ancho in zip(row.cells, anchos):
+            cell.width = Twips(ancho)
+    
+    # Filas de estudiantes (Nº y nombre), emitidas como XML en un solo bloque
+    filas = textos['filas_cotejo']
+    if isinstance(filas, bytes):
+        bloque = parse_xml(f'<w:tbl {nsdecls("w")}>'.encode('utf-8') + filas + b'</w:tbl>')
+        tabla_cotejo._tbl.extend(list(bloque))
+    else:
+        # Esqueleto del motor de plantilla: una fila que solo lleva la marca del slot
+        tabla_cotejo.add_row().cells[0].text = filas
     # Pie de página
     doc.add_paragraph()
     footer = doc.add_paragraph('Documento generado por Asistente Pedagógico - Plataforma Educativa')
@@ -949,5 +1920,100 @@ def crear_documento_word(ciclo, area, tema, contenido):
 
     return doc
 
+def recursos_json(datos, cache_control):
+    # Un recurso precomprimido para el total, cada área y cada área+ciclo
+    def recurso(valor):
+        return RecursoEstatico(
+            json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+            'application/json',
+            cache_control
+        )
+
+    recursos = {(None, None): recurso(datos)}
+    for area, ciclos in datos.items():
+        recursos[(area, None)] = recurso(ciclos)
+        for ciclo, valor in ciclos.items():
+            recursos[(area, ciclo)] = recurso(valor)
+    return recursos
+
+def pagina_html(curriculo):
+    # Las opciones de ciclo y área salen del currículo cargado
+    opciones_ciclo = '\n'.join(
+        f'                    <option value="{escape(ciclo)}">{escape(ciclo)} Ciclo ({escape(grados)})</option>'
+        for ciclo, grados in curriculo.ciclos.items()
+    )
+    opciones_area = '\n'.join(
+        f'                    <option value="{escape(area)}">{escape(area)}</option>' for area in curriculo.areas
+    )
+    return HTML_TEMPLATE.replace('<!--OPCIONES_CICLO-->', opciones_ciclo).replace('<!--OPCIONES_AREA-->', opciones_area)
+
+# Respuestas armadas y comprimidas una sola vez al arrancar
+CACHE_CONTROL_CURRICULO = 'public, max-age=86400'
+pagina_inicio = RecursoEstatico(pagina_html(curriculo).encode('utf-8'), 'text/html', 'no-cache')
+recursos_curriculo = recursos_json(curriculo.como_dict(), CACHE_CONTROL_CURRICULO)
+recursos_temas = recursos_json(
+    {area: {ciclo: list(curriculo.buscar(area, ciclo).temas) for ciclo in curriculo.ciclos_de(area)}
+     for area in curriculo.areas},
+    CACHE_CONTROL_CURRICULO
+)
+arranque.marcar('recursos_estaticos')
+
+motor_plantilla = MotorPlantilla(construir_documento, filas=('filas_cotejo',))
+# Esqueletos de las cantidades de criterios del currículo y de la IA: la primera petición de cada worker
+# no paga su compilación (~60 ms); otras cantidades se compilan cuando se piden
+if DOCX_MOTOR != 'python-docx':
+    for _num_criterios in sorted({len(entrada.criterios) for entrada in curriculo} | {LONGITUDES['criterios']}):
+        motor_plantilla.esqueleto(_num_criterios)
+arranque.marcar('plantilla_docx')
+
+servicio_render = ServicioRender(
+    renderizar_docx,
+    procesos=RENDER_PROCESOS,
+    max_trabajos=RENDER_MAX_TRABAJOS,
+    max_en_cola=RENDER_MAX_COLA,
+    calentar=calentar_render,
+    precargar=['app']
+) if RENDER_PROCESOS > 0 else None
+metricas.medidor_funcion('prototipo_render_pendientes', 'Documentos en los procesos de render o esperando uno libre',
+                         lambda: servicio_render.estadisticas()['pendientes'] if servicio_render is not None else 0)
+
+indice_temas = IndiceTemas.desde_curriculo(curriculo)
+
+llamador_ia = LlamadorIA(
+    interruptor_ia,
+    timeout_segundos=IA_TIMEOUT_SEGUNDOS,
+    cobertura_segundos=IA_COBERTURA_MS / 1000,
+    contar=contar_ia,
+    registro=app.logger
+)
+
+def construir_indice_sugerencias():
+    indice = IndiceSugerencias()
+    for entrada in curriculo:
+        for tema in entrada.temas:
+            indice.agregar(tema, entrada.area, entrada.ciclo)
+
+    # Temas que ya generó la IA (la cache los guarda normalizados, sin tildes ni mayúsculas)
+    if cache_ia is not None:
+        try:
+            for entrada in cache_ia.listar(limite=5000):
+                indice.agregar(entrada['tema'].capitalize(), entrada['area'], entrada['ciclo'], origen='ia')
+        except Exception:
+            pass
+    return indice
+
+indice_sugerencias = construir_indice_sugerencias()
+
+agrupador_ia = AgrupadorIA(
+    consultar_ia_lote,
+    consultar_ia,
+    ventana_segundos=IA_LOTE_VENTANA_MS / 1000,
+    max_elementos=IA_LOTE_MAX,
+    registro=app.logger
+) if IA_LOTE_VENTANA_MS > 0 and IA_LOTE_MAX > 1 else None
+
+arranque.marcar('indices')
+arranque.terminar(congelar=ARRANQUE_CONGELAR)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,120 @@
+import gc
+import logging
+import os
+import threading
+import time
+
+# REPORTE DE ARRANQUE
+# Mide en qué se va el tiempo hasta la primera petición: el intérprete (y gunicorn) antes de importar la
+# app, cada etapa de la importación, las importaciones diferidas (openai) y, en cada worker, la espera
+# desde el fork hasta la primera petición y lo que esta tardó. app.py importa este módulo primero, así
+# el inicio de la importación queda marcado antes que el de Flask, docx y los demás.
+
+_INICIO = time.perf_counter()
+_INICIO_RELOJ = time.time()
+
+
+def inicio_proceso():
+    # Instante (epoch) en que arrancó el proceso, según /proc; None fuera de Linux
+    try:
+        with open('/proc/self/stat') as archivo:
+            campos = archivo.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as archivo:
+            encendido = float(archivo.read().split()[0])
+        return time.time() - encendido + int(campos[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def congelar_memoria():
+    # Con gunicorn --preload los workers comparten por copy-on-write las páginas del maestro. Cada
+    # recolección de basura escribe en la cabecera de todos los objetos que recorre y así copia páginas
+    # enteras; gc.freeze() deja los objetos de la importación fuera de las recolecciones del worker.
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+        return gc.get_freeze_count()
+    return 0
+
+
+class RegistroArranque:
+    def __init__(self, registro=None):
+        self.registro = registro or logging.getLogger(__name__)
+        self.pid = os.getpid()
+        self.etapas = []
+        self.diferidas = {}
+        self.congelados = 0
+        self.importacion_segundos = None
+        proceso = inicio_proceso()
+        if proceso is not None and proceso <= _INICIO_RELOJ:
+            self.etapas.append(('interprete', _INICIO_RELOJ - proceso))
+        self._ultima_marca = _INICIO
+        self._fin_importacion = None
+        self._lock = threading.Lock()
+        self._worker = None
+        self.bifurcado = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._al_bifurcar)
+
+    def marcar(self, nombre):
+        # Cierra una etapa de la importación: el tiempo desde la marca anterior
+        ahora = time.perf_counter()
+        self.etapas.append((nombre, ahora - self._ultima_marca))
+        self._ultima_marca = ahora
+
+    def terminar(self, congelar=True):
+        if congelar:
+            self.congelados = congelar_memoria()
+            self.marcar('congelar_memoria')
+        self._fin_importacion = self._ultima_marca
+        self.importacion_segundos = self._fin_importacion - _INICIO
+        self.registro.info('Arranque: app importada en %.2f s (%s)', self.importacion_segundos,
+                           ', '.join(f'{nombre} {segundos:.3f}' for nombre, segundos in self.etapas))
+
+    def diferida(self, nombre, segundos):
+        # Importaciones hechas con la primera petición que las necesita
+        with self._lock:
+            self.diferidas[nombre] = segundos
+        self.registro.info('Arranque: %s importado en %.2f s (diferido)', nombre, segundos)
+
+    def _al_bifurcar(self):
+        # En el worker recién creado: la importación la hizo el maestro (gunicorn --preload)
+        self.pid = os.getpid()
+        self.bifurcado = True
+        self._lock = threading.Lock()
+        self._worker = {'creado': time.perf_counter(), 'primera_peticion': None}
+
+    def peticion(self):
+        # Llamado al empezar cada petición; devuelve una función para cerrar la primera del proceso
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = {'creado': self._fin_importacion or time.perf_counter(), 'primera_peticion': None}
+        if self._worker['primera_peticion'] is not None:
+            return None
+        with self._lock:
+            if self._worker['primera_peticion'] is not None:
+                return None
+            inicio = time.perf_counter()
+            self._worker['primera_peticion'] = {'espera_segundos': inicio - self._worker['creado']}
+
+        def terminar_peticion():
+            primera = self._worker['primera_peticion']
+            primera['duracion_segundos'] = time.perf_counter() - inicio
+            self.registro.info('Arranque: primera petición del proceso %d a %.2f s de su inicio, respondida en %.3f s',
+                               self.pid, primera['espera_segundos'], primera['duracion_segundos'])
+
+        return terminar_peticion
+
+    def reporte(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'precargado': self.bifurcado,
+                'etapas': [{'etapa': nombre, 'segundos': round(segundos, 4)} for nombre, segundos in self.etapas],
+                'importacion_segundos': round(self.importacion_segundos or 0, 4),
+                'diferidas': {nombre: round(segundos, 4) for nombre, segundos in self.diferidas.items()},
+                'objetos_congelados': self.congelados,
+                'primera_peticion': dict(self._worker['primera_peticion'])
+                                    if self._worker and self._worker['primera_peticion'] else None,
+            }
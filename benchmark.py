@@ -0,0 +1,259 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Caches y trabajos en un directorio aparte, que se borra al terminar: el benchmark no debe leer ni ensuciar
+# los del servidor
+_DIRECTORIO = tempfile.mkdtemp(prefix='prototipo-benchmark-')
+os.environ.update({
+    'DOCX_CACHE_DIR': '',
+    'DOCX_CACHE_MEMORIA_MB': '0',
+    'IA_CACHE_PATH': '',
+    'TRABAJOS_DIR': os.path.join(_DIRECTORIO, 'trabajos'),
+    'METRICAS_DIR': os.path.join(_DIRECTORIO, 'metricas'),
+    'PERFILES_DIR': os.path.join(_DIRECTORIO, 'perfiles'),
+    'DEDUP_DIR': os.path.join(_DIRECTORIO, 'dedup'),
+    'REVISIONES_DIR': os.path.join(_DIRECTORIO, 'revisiones'),
+    'IA_LOTE_VENTANA_MS': '0',
+})
+
+import app  # noqa: E402
+from cache_documentos import clave_documento  # noqa: E402
+
+# MICRO-BENCHMARKS DEL ARMADO DE DOCUMENTOS
+# Mide cada etapa por separado, sin red ni IA, sobre las 21 combinaciones del currículo y sobre
+# entradas sintéticas grandes; reporta ops/s, p50/p99 y pico de memoria.
+#
+#   python benchmark.py --salida resultados.json
+#   python benchmark.py --comparar resultados.json --tolerancia 0.25
+#
+# Con --comparar termina con código 1 si el p50 de alguna etapa empeora más que la tolerancia.
+
+FORMATO = 1
+
+
+def casos_curriculo():
+    for entrada in app.curriculo:
+        yield entrada.ciclo, entrada.area, entrada.temas[0], entrada.como_dict(), None
+
+
+def casos_sinteticos():
+    base = app.curriculo.buscar('Matemática', 'IV').como_dict()
+    largo = ' '.join(['Resuelve problemas de cantidad con estrategias diversas y argumenta sus procedimientos.'] * 60)
+    return {
+        'criterios_12': ('IV', 'Matemática', 'Fracciones', dict(
+            base, criterios=[f'Criterio {i}: {base["criterios"][i % 2]}' for i in range(12)]), None),
+        'textos_largos': ('IV', 'Matemática', 'Fracciones', dict(
+            base,
+            competencia=largo,
+            estandar=largo,
+            descripcion_enfoque=largo,
+            capacidades=[largo] * 3,
+            criterios=[largo] * 2,
+        ), None),
+        'nomina_200': ('IV', 'Matemática', 'Fracciones', base, [f'Estudiante {i:03d}' for i in range(200)]),
+    }
+
+
+def grupos_casos():
+    grupos = {'curriculo': list(casos_curriculo())}
+    for nombre, caso in casos_sinteticos().items():
+        grupos[nombre] = [caso]
+    return grupos
+
+
+# Cada etapa recibe un caso y devuelve (preparar, operacion): preparar() corre fuera de la medición y su
+# resultado se pasa a operacion()
+
+def etapa_buscar_en_db(ciclo, area, tema, contenido, estudiantes):
+    return None, lambda _: app.buscar_en_db(ciclo, area)
+
+
+def etapa_textos_documento(ciclo, area, tema, contenido, estudiantes):
+    return None, lambda _: app.textos_documento(ciclo, area, tema, contenido, estudiantes)
+
+
+def etapa_crear_documento_word(ciclo, area, tema, contenido, estudiantes):
+    # Como en renderizar_docx: sobre la plantilla que reusa el hilo, no sobre una copia nueva
+    def armar(_):
+        textos = app.textos_documento(ciclo, area, tema, contenido, estudiantes)
+        return app.construir_documento(textos, len(contenido.get('criterios', [])), app.documento_base())
+    return None, armar
+
+
+def etapa_doc_save(ciclo, area, tema, contenido, estudiantes):
+    def preparar():
+        return app.crear_documento_word(ciclo, area, tema, contenido, estudiantes)
+    return preparar, lambda doc: doc.save(io.BytesIO())
+
+
+def etapa_renderizar_plantilla(ciclo, area, tema, contenido, estudiantes):
+    textos = app.textos_documento(ciclo, area, tema, contenido, estudiantes)
+    num_criterios = len(contenido.get('criterios', []))
+    return None, lambda _: app.motor_plantilla.renderizar(textos, num_criterios)
+
+
+def etapa_set_cell_border(ciclo, area, tema, contenido, estudiantes):
+    def preparar():
+        doc = app.Document()
+        return doc.add_table(rows=1, cols=1).rows[0].cells[0]
+    return preparar, lambda celda: app.set_cell_border(celda)
+
+
+def etapa_clave_documento(ciclo, area, tema, contenido, estudiantes):
+    return None, lambda _: clave_documento(app.VERSION_DOCUMENTO, app.DOCX_MOTOR, ciclo, area, tema,
+                                           contenido, estudiantes)
+
+
+ETAPAS = {
+    'buscar_en_db': etapa_buscar_en_db,
+    'textos_documento': etapa_textos_documento,
+    'crear_documento_word': etapa_crear_documento_word,
+    'doc_save': etapa_doc_save,
+    'renderizar_plantilla': etapa_renderizar_plantilla,
+    'set_cell_border': etapa_set_cell_border,
+    'clave_documento': etapa_clave_documento,
+}
+
+# Etapas que no dependen del tamaño del contenido: las entradas sintéticas no agregan información
+SOLO_CURRICULO = {'buscar_en_db', 'set_cell_border'}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def medir_grupo(etapa, casos, repeticiones, segundos_min):
+    operaciones = [etapa(*caso) for caso in casos]
+
+    # Calentamiento: compila esqueletos y llena caches internas antes de medir
+    for preparar, operacion in operaciones:
+        operacion(preparar() if preparar else None)
+
+    muestras = []
+    total = 0.0
+    # Como timeit: sin recolector de ciclos durante la medición, para que no caiga en una operación al azar
+    gc.collect()
+    gc.disable()
+    try:
+        inicio = time.perf_counter()
+        while len(muestras) < repeticiones * len(casos) or time.perf_counter() - inicio < segundos_min:
+            for preparar, operacion in operaciones:
+                argumento = preparar() if preparar else None
+                t0 = time.perf_counter()
+                operacion(argumento)
+                duracion = time.perf_counter() - t0
+                muestras.append(duracion)
+                total += duracion
+    finally:
+        gc.enable()
+
+    # Pico de memoria en una pasada aparte: tracemalloc hace más lentas las operaciones medidas
+    pico = 0
+    for preparar, operacion in operaciones:
+        argumento = preparar() if preparar else None
+        tracemalloc.start()
+        try:
+            operacion(argumento)
+            pico = max(pico, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'ops': len(muestras),
+        'ops_por_segundo': round(len(muestras) / total, 2) if total else None,
+        'p50_ms': round(percentil(muestras, 50) * 1000, 4),
+        'p99_ms': round(percentil(muestras, 99) * 1000, 4),
+        'pico_memoria_kb': round(pico / 1024, 1),
+    }
+
+
+def ejecutar(etapas, repeticiones, segundos_min):
+    grupos = grupos_casos()
+    resultados = {}
+    for nombre in etapas:
+        resultados[nombre] = {}
+        for grupo, casos in grupos.items():
+            if nombre in SOLO_CURRICULO and grupo != 'curriculo':
+                continue
+            resultados[nombre][grupo] = medida = medir_grupo(ETAPAS[nombre], casos, repeticiones, segundos_min)
+            print(f"{nombre:22} {grupo:14} {medida['ops_por_segundo']:>11} ops/s  "
+                  f"p50 {medida['p50_ms']:>9.3f} ms  p99 {medida['p99_ms']:>9.3f} ms  "
+                  f"memoria {medida['pico_memoria_kb']:>9.1f} KB", flush=True)
+    return {
+        'formato': FORMATO,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+    }
+
+
+def comparar(actual, base, tolerancia, minimo_ms=0.005):
+    # Devuelve las regresiones: (etapa, grupo, p50 base, p50 actual). Diferencias por debajo de minimo_ms
+    # son ruido del reloj en etapas de microsegundos
+    regresiones = []
+    for nombre, grupos in actual['resultados'].items():
+        for grupo, medida in grupos.items():
+            anterior = base.get('resultados', {}).get(nombre, {}).get(grupo)
+            if not anterior:
+                continue
+            if medida['p50_ms'] - anterior['p50_ms'] > max(anterior['p50_ms'] * tolerancia, minimo_ms):
+                regresiones.append((nombre, grupo, anterior['p50_ms'], medida['p50_ms']))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks del armado de documentos')
+    parser.add_argument('--etapas', default=','.join(ETAPAS),
+                        help='etapas a medir, separadas por comas (por defecto todas)')
+    parser.add_argument('--repeticiones', type=int, default=20, help='mediciones mínimas por caso')
+    parser.add_argument('--segundos', type=float, default=0.5, help='tiempo mínimo por etapa y grupo')
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='resultados JSON de referencia')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='empeoramiento admitido del p50 respecto a la referencia (0.25 = 25%%)')
+    parser.add_argument('--minimo-ms', type=float, default=0.005,
+                        help='diferencia absoluta mínima del p50 para contar como regresión')
+    args = parser.parse_args(argv)
+
+    etapas = [nombre.strip() for nombre in args.etapas.split(',') if nombre.strip()]
+    desconocidas = [nombre for nombre in etapas if nombre not in ETAPAS]
+    if desconocidas:
+        parser.error(f"etapas desconocidas: {', '.join(desconocidas)}")
+
+    resultados = ejecutar(etapas, args.repeticiones, args.segundos)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(resultados, base, args.tolerancia, args.minimo_ms)
+        for nombre, grupo, anterior, actual in regresiones:
+            print(f'REGRESIÓN {nombre} / {grupo}: p50 {anterior:.3f} ms -> {actual:.3f} ms '
+                  f'(+{(actual / anterior - 1) * 100 if anterior else 100:.0f}%)', file=sys.stderr)
+        if regresiones:
+            return 1
+        print(f'Sin regresiones respecto a {args.comparar} (tolerancia {args.tolerancia:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    finally:
+        shutil.rmtree(_DIRECTORIO, ignore_errors=True)
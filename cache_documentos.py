@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# CACHE DE DOCUMENTOS RENDERIZADOS
+# Nivel 1: LRU en memoria limitado por bytes (por proceso).
+# Nivel 2: almacén en disco direccionado por contenido, compartido por todos los workers:
+#   objetos/<ab>/<sha256 del .docx>   bytes del documento
+#   claves/<ab>/<sha256 de la entrada>  sha256 del documento que le corresponde
+# El sha256 del documento es también su ETag.
+
+
+def clave_documento(*partes):
+    canonico = json.dumps(partes, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def escribir_atomico(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
+        raise
+
+
+class CacheDocumentos:
+    def __init__(self, directorio=None, max_bytes_memoria=64 * 1024 * 1024,
+                 max_bytes_disco=512 * 1024 * 1024, escrituras_por_poda=100):
+        self.directorio = directorio
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.escrituras_por_poda = escrituras_por_poda
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        self.contadores = {
+            'hits_memoria': 0,
+            'hits_disco': 0,
+            'misses': 0,
+            'no_modificado': 0,
+        }
+
+    def _ruta(self, tipo, digest):
+        return os.path.join(self.directorio, tipo, digest[:2], digest)
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def _recordar(self, clave, etag, datos):
+        if len(datos) > self.max_bytes_memoria:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(clave, None)
+            if anterior is not None:
+                self._bytes_memoria -= len(anterior[1])
+            self._memoria[clave] = (etag, datos)
+            self._bytes_memoria += len(datos)
+            while self._bytes_memoria > self.max_bytes_memoria:
+                _, (_, expulsado) = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(expulsado)
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+                self.contadores['hits_memoria'] += 1
+                return entrada
+
+        if self.directorio:
+            try:
+                with open(self._ruta('claves', clave), 'rb') as f:
+                    etag = f.read().decode('ascii')
+                ruta_objeto = self._ruta('objetos', etag)
+                with open(ruta_objeto, 'rb') as f:
+                    datos = f.read()
+                # La fecha de modificación hace de "último uso" para la poda
+                os.utime(ruta_objeto)
+            except OSError:
+                pass
+            else:
+                self._recordar(clave, etag, datos)
+                self._contar('hits_disco')
+                return etag, datos
+
+        self._contar('misses')
+        return None
+
+    def guardar(self, clave, datos):
+        etag = hashlib.sha256(datos).hexdigest()
+        self._recordar(clave, etag, datos)
+        if self.directorio:
+            try:
+                ruta_objeto = self._ruta('objetos', etag)
+                if not os.path.exists(ruta_objeto):
+                    escribir_atomico(ruta_objeto, datos)
+                escribir_atomico(self._ruta('claves', clave), etag.encode('ascii'))
+            except OSError:
+                # El disco es solo un acelerador: si falla, se sigue sirviendo desde memoria
+                pass
+            else:
+                self._quizas_podar()
+        return etag, datos
+
+    def registrar_no_modificado(self):
+        self._contar('no_modificado')
+
+    def _quizas_podar(self):
+        with self._lock:
+            self._escrituras += 1
+            if self._escrituras < self.escrituras_por_poda:
+                return
+            self._escrituras = 0
+        self.podar_disco()
+
+    def podar_disco(self):
+        # Elimina los objetos menos usados recientemente hasta quedar bajo el presupuesto;
+        # las claves que apunten a objetos borrados cuentan como miss y se vuelven a escribir
+        objetos = []
+        total = 0
+        raiz = os.path.join(self.directorio, 'objetos')
+        for carpeta, _, archivos in os.walk(raiz):
+            for nombre in archivos:
+                ruta = os.path.join(carpeta, nombre)
+                try:
+                    st = os.stat(ruta)
+                except OSError:
+                    continue
+                objetos.append((st.st_mtime, st.st_size, ruta))
+                total += st.st_size
+
+        objetos.sort()
+        for _, tamano, ruta in objetos:
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.unlink(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores,
+                        entradas_memoria=len(self._memoria),
+                        bytes_memoria=self._bytes_memoria,
+                        max_bytes_memoria=self.max_bytes_memoria,
+                        directorio=self.directorio)
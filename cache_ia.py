@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# CACHE PERSISTENTE DE RESPUESTAS DE LA IA
+# SQLite en modo WAL: varios workers de gunicorn pueden leer y escribir el mismo archivo.
+# La clave es (ciclo, area, tema) normalizados: sin tildes, sin mayúsculas y con espacios colapsados.
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
+
+
+def clave_ia(ciclo, area, tema):
+    return '|'.join(normalizar(parte) for parte in (ciclo, area, tema))
+
+
+class CacheIA:
+    def __init__(self, ruta, ttl_segundos=30 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        self.ruta = ruta
+        self.ttl_segundos = ttl_segundos
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self._crear_tabla()
+
+    def _conexion(self):
+        # Una conexión abierta antes de un fork (gunicorn --preload) no se usa en el hijo
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def _crear_tabla(self):
+        self._conexion().execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                clave TEXT PRIMARY KEY,
+                ciclo TEXT NOT NULL,
+                area TEXT NOT NULL,
+                tema TEXT NOT NULL,
+                contenido TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                creado REAL NOT NULL,
+                usado REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conexion().execute('CREATE INDEX IF NOT EXISTS respuestas_usado ON respuestas (usado)')
+
+    def obtener(self, ciclo, area, tema):
+        clave = clave_ia(ciclo, area, tema)
+        ahora = time.time()
+        conexion = self._conexion()
+        fila = conexion.execute(
+            'SELECT contenido, creado FROM respuestas WHERE clave = ?', (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        if ahora - fila[1] > self.ttl_segundos:
+            conexion.execute('DELETE FROM respuestas WHERE clave = ?', (clave,))
+            return None
+        conexion.execute(
+            'UPDATE respuestas SET usado = ?, hits = hits + 1 WHERE clave = ?', (ahora, clave)
+        )
+        return json.loads(fila[0])
+
+    def guardar(self, ciclo, area, tema, contenido):
+        texto = json.dumps(contenido, ensure_ascii=False)
+        ahora = time.time()
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO respuestas '
+            '(clave, ciclo, area, tema, contenido, bytes, creado, usado, hits) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)',
+            (clave_ia(ciclo, area, tema), normalizar(ciclo), normalizar(area), normalizar(tema),
+             texto, len(texto.encode('utf-8')), ahora, ahora)
+        )
+        self._expulsar()
+
+    def _expulsar(self):
+        conexion = self._conexion()
+        conexion.execute('DELETE FROM respuestas WHERE creado < ?', (time.time() - self.ttl_segundos,))
+        total = conexion.execute('SELECT COALESCE(SUM(bytes), 0) FROM respuestas').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Se eliminan las entradas usadas hace más tiempo hasta volver al presupuesto
+        sobrante = total - self.max_bytes
+        claves = []
+        for clave, tamano in conexion.execute('SELECT clave, bytes FROM respuestas ORDER BY usado'):
+            if sobrante <= 0:
+                break
+            claves.append((clave,))
+            sobrante -= tamano
+        conexion.executemany('DELETE FROM respuestas WHERE clave = ?', claves)
+
+    def _filtro(self, ciclo=None, area=None, tema=None):
+        condiciones = []
+        valores = []
+        for columna, valor in (('ciclo', ciclo), ('area', area), ('tema', tema)):
+            if valor:
+                condiciones.append(f'{columna} = ?')
+                valores.append(normalizar(valor))
+        donde = ' WHERE ' + ' AND '.join(condiciones) if condiciones else ''
+        return donde, valores
+
+    def listar(self, ciclo=None, area=None, tema=None, limite=100):
+        donde, valores = self._filtro(ciclo, area, tema)
+        filas = self._conexion().execute(
+            'SELECT ciclo, area, tema, bytes, creado, usado, hits FROM respuestas'
+            + donde + ' ORDER BY usado DESC LIMIT ?', valores + [limite]
+        ).fetchall()
+        columnas = ('ciclo', 'area', 'tema', 'bytes', 'creado', 'usado', 'hits')
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def purgar(self, ciclo=None, area=None, tema=None):
+        donde, valores = self._filtro(ciclo, area, tema)
+        return self._conexion().execute('DELETE FROM respuestas' + donde, valores).rowcount
+
+    def estadisticas(self):
+        entradas, total, hits = self._conexion().execute(
+            'SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(hits), 0) FROM respuestas'
+        ).fetchone()
+        return {
+            'ruta': self.ruta,
+            'entradas': entradas,
+            'bytes': total,
+            'hits': hits,
+            'max_bytes': self.max_bytes,
+            'ttl_segundos': self.ttl_segundos,
+        }
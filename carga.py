@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import ia_falsa
+
+# PRUEBA DE CARGA DE EXTREMO A EXTREMO
+# Levanta gunicorn app:app en local con cada modelo de worker pedido, apuntado al servidor falso de
+# ia_falsa.py, y le envía POST /generar con la concurrencia indicada: una parte de las peticiones son
+# combinaciones del currículo (sin IA) y el resto áreas fuera del currículo con temas únicos, que siempre
+# pasan por la IA. Reporta throughput, percentiles de latencia y tasa de errores por modelo.
+#
+#   python carga.py --modelos sync,gthread --workers 2 --concurrencia 16 --duracion 20 --proporcion-ia 0.3
+#   python carga.py --modelos gthread,asyncio --workers 1 --concurrencia 200 --latencia fija:2 --proporcion-ia 1
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__))
+AREAS_SIN_CURRICULO = ['Inglés', 'Educación para el Trabajo', 'Tutoría']
+CICLOS = ['III', 'IV', 'V']
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))]
+
+
+def esperar_servidor(url, segundos=30):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    return False
+
+
+def iniciar_gunicorn(modelo, workers, hilos, puerto, entorno, precargar=False):
+    # 'asyncio' sirve servidor_async.py con el worker de aiohttp; los demás son clases de worker para app:app
+    if modelo == 'asyncio':
+        objetivo, clase = 'servidor_async:crear_aplicacion', 'aiohttp.GunicornWebWorker'
+    else:
+        objetivo, clase = 'app:app', modelo
+    comando = [sys.executable, '-m', 'gunicorn', objetivo, '-b', f'127.0.0.1:{puerto}',
+               '-w', str(workers), '-k', clase, '--timeout', '120', '--log-level', 'warning']
+    if modelo == 'gthread':
+        comando += ['--threads', str(hilos)]
+    if precargar:
+        comando.append('--preload')
+    return subprocess.Popen(comando, cwd=DIRECTORIO_APP, env=entorno)
+
+
+def detener(proceso):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+def peticion_aleatoria(curriculo, proporcion_ia, aleatorio):
+    if aleatorio.random() < proporcion_ia:
+        # Área sin entrada en el currículo y tema nunca visto: no lo resuelven la base, la recuperación ni la cache
+        return 'ia', {
+            'ciclo': aleatorio.choice(CICLOS),
+            'area': aleatorio.choice(AREAS_SIN_CURRICULO),
+            'tema': f'Unidad de práctica {uuid.uuid4().hex[:12]}',
+        }
+    area = aleatorio.choice(sorted(curriculo))
+    ciclo = aleatorio.choice(sorted(curriculo[area]))
+    return 'db', {'ciclo': ciclo, 'area': area, 'tema': aleatorio.choice(curriculo[area][ciclo])}
+
+
+def enviar(base_url, datos, timeout):
+    cuerpo = json.dumps(datos).encode('utf-8')
+    peticion = urllib.request.Request(f'{base_url}/generar', data=cuerpo,
+                                      headers={'Content-Type': 'application/json'}, method='POST')
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            respuesta.read()
+            codigo = respuesta.status
+    except urllib.error.HTTPError as e:
+        codigo = e.code
+    except Exception:
+        codigo = None
+    return codigo, time.perf_counter() - inicio
+
+
+def correr_carga(base_url, curriculo, args):
+    resultados = []
+    lock = threading.Lock()
+    limite = time.monotonic() + args.duracion
+    contador = iter(range(args.peticiones)) if args.peticiones else None
+    lock_contador = threading.Lock()
+
+    def cliente(semilla):
+        aleatorio = random.Random(semilla)
+        while True:
+            if contador is not None:
+                with lock_contador:
+                    if next(contador, None) is None:
+                        return
+            elif time.monotonic() >= limite:
+                return
+            tipo, datos = peticion_aleatoria(curriculo, args.proporcion_ia, aleatorio)
+            codigo, segundos = enviar(base_url, datos, args.timeout)
+            with lock:
+                resultados.append((tipo, codigo, segundos))
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        for i in range(args.concurrencia):
+            pool.submit(cliente, (args.semilla or 0) * 1000 + i)
+    return resultados, time.perf_counter() - inicio
+
+
+def resumir(resultados, segundos):
+    def bloque(filas):
+        latencias = [s for _, codigo, s in filas if codigo == 200]
+        errores = sum(1 for _, codigo, _ in filas if codigo != 200)
+        return {
+            'peticiones': len(filas),
+            'por_segundo': round(len(filas) / segundos, 2) if segundos else None,
+            'tasa_errores': round(errores / len(filas), 4) if filas else None,
+            'p50_ms': round(percentil(latencias, 50) * 1000, 1) if latencias else None,
+            'p90_ms': round(percentil(latencias, 90) * 1000, 1) if latencias else None,
+            'p99_ms': round(percentil(latencias, 99) * 1000, 1) if latencias else None,
+        }
+
+    resumen = bloque(resultados)
+    resumen['segundos'] = round(segundos, 2)
+    resumen['codigos'] = {}
+    for _, codigo, _ in resultados:
+        resumen['codigos'][str(codigo)] = resumen['codigos'].get(str(codigo), 0) + 1
+    for tipo in ('db', 'ia'):
+        resumen[tipo] = bloque([fila for fila in resultados if fila[0] == tipo])
+    return resumen
+
+
+def imprimir(modelo, resumen):
+    print(f"\n== {modelo}: {resumen['peticiones']} peticiones en {resumen['segundos']} s "
+          f"({resumen['por_segundo']} req/s), errores {resumen['tasa_errores']:.2%}, códigos {resumen['codigos']}")
+    for tipo in ('total', 'db', 'ia'):
+        datos = resumen if tipo == 'total' else resumen[tipo]
+        if not datos['peticiones']:
+            continue
+        print(f"   {tipo:5} {datos['peticiones']:>6} pet  {datos['por_segundo']:>8} req/s  "
+              f"p50 {datos['p50_ms']} ms  p90 {datos['p90_ms']} ms  p99 {datos['p99_ms']} ms  "
+              f"errores {datos['tasa_errores']:.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga de /generar contra gunicorn local')
+    parser.add_argument('--modelos', default='sync,gthread', help="clases de worker de gunicorn separadas por comas ('asyncio': servidor_async.py)")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--hilos', type=int, default=8, help='hilos por worker para gthread')
+    parser.add_argument('--puerto', type=int, default=8100)
+    parser.add_argument('--concurrencia', type=int, default=16, help='clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=20, help='segundos de carga por modelo')
+    parser.add_argument('--peticiones', type=int, help='cantidad fija de peticiones en lugar de --duracion')
+    parser.add_argument('--proporcion-ia', type=float, default=0.2, help='fracción de peticiones que pasan por la IA')
+    parser.add_argument('--timeout', type=float, default=120, help='timeout de cada petición')
+    parser.add_argument('--precargar', action='store_true', help='importar la app una vez en el maestro (gunicorn --preload)')
+    parser.add_argument('--ia-url', help='URL base de un servidor de IA ya levantado (si no, se inicia ia_falsa)')
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados')
+    ia_falsa.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    servidor_ia = None
+    if args.ia_url:
+        ia_url = args.ia_url
+    else:
+        servidor_ia = ia_falsa.iniciar(config=ia_falsa.configuracion_desde(args))
+        ia_url = servidor_ia.url
+
+    reporte = {'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'), 'parametros': vars(args).copy(), 'modelos': {}}
+    reporte['parametros'].pop('latencia', None)
+    base_url = f'http://127.0.0.1:{args.puerto}'
+
+    for modelo in [m.strip() for m in args.modelos.split(',') if m.strip()]:
+        # Caches y trabajos nuevos en cada corrida, para que los modelos partan en igualdad de condiciones
+        directorio = tempfile.mkdtemp(prefix='prototipo-carga-')
+        entorno = dict(os.environ,
+                       OPENAI_API_BASE=ia_url,
+                       OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'clave-falsa') if args.ia_url else 'clave-falsa',
+                       DOCX_CACHE_DIR=os.path.join(directorio, 'docx'),
+                       IA_CACHE_PATH=os.path.join(directorio, 'ia.sqlite3'),
+                       TRABAJOS_DIR=os.path.join(directorio, 'trabajos'),
+                       REVISIONES_DIR=os.path.join(directorio, 'revisiones'),
+                       DEDUP_DIR=os.path.join(directorio, 'dedup'),
+                       PERFILES_DIR=os.path.join(directorio, 'perfiles'),
+                       METRICAS_DIR=os.path.join(directorio, 'metricas'))
+        proceso = iniciar_gunicorn(modelo, args.workers, args.hilos, args.puerto, entorno, args.precargar)
+        try:
+            if not esperar_servidor(f'{base_url}/api/curriculo/temas'):
+                print(f'{modelo}: gunicorn no respondió', file=sys.stderr)
+                continue
+            with urllib.request.urlopen(f'{base_url}/api/curriculo/temas') as respuesta:
+                curriculo = json.loads(respuesta.read())
+
+            llamadas_antes = servidor_ia.estadisticas()['peticiones'] if servidor_ia else None
+            resultados, segundos = correr_carga(base_url, curriculo, args)
+            resumen = resumir(resultados, segundos)
+            if servidor_ia:
+                resumen['llamadas_ia'] = servidor_ia.estadisticas()['peticiones'] - llamadas_antes
+            reporte['modelos'][modelo] = resumen
+            imprimir(modelo, resumen)
+        finally:
+            detener(proceso)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    if servidor_ia:
+        servidor_ia.shutdown()
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+    return 0 if reporte['modelos'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
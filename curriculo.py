@@ -0,0 +1,230 @@
+import argparse
+import json
+import sys
+from typing import NamedTuple, Tuple
+
+from lista_cotejo import MAX_CRITERIOS
+
+# CURRÍCULO NACIONAL
+# Las competencias de cada área y ciclo se leen de un archivo JSON (curriculo.json) y se validan completas
+# al cargarlo. Cada entrada queda como un registro inmutable (tupla con nombre, sin __dict__), sus listas
+# como tuplas, y todos los textos pasan por sys.intern: los que se repiten entre entradas (instrumentos,
+# enfoques y competencias transversales, nombres de área y ciclo) quedan en memoria una sola vez. Índices
+# por (área, ciclo), por competencia y por enfoque transversal.
+
+CAMPOS_LISTA = ('temas', 'capacidades', 'criterios')
+CAMPOS_TEXTO = ('competencia', 'estandar', 'instrumento', 'competencia_transversal', 'enfoque_transversal',
+                'descripcion_enfoque')
+# Orden de las claves en el archivo y en como_dict()
+CAMPOS = ('temas', 'competencia', 'capacidades', 'estandar', 'criterios', 'instrumento', 'competencia_transversal',
+          'enfoque_transversal', 'descripcion_enfoque')
+
+
+class CurriculoInvalido(ValueError):
+    pass
+
+
+class Entrada(NamedTuple):
+    area: str
+    ciclo: str
+    temas: Tuple[str, ...]
+    competencia: str
+    capacidades: Tuple[str, ...]
+    estandar: str
+    criterios: Tuple[str, ...]
+    instrumento: str
+    competencia_transversal: str
+    enfoque_transversal: str
+    descripcion_enfoque: str
+
+    def como_dict(self):
+        # Contenido del documento con las mismas claves y listas que el resto de la app (y que las claves de
+        # la cache de documentos)
+        return {campo: list(valor) if campo in CAMPOS_LISTA else valor
+                for campo, valor in zip(CAMPOS, self[2:])}
+
+
+def _errores_entrada(ruta, entrada):
+    if not isinstance(entrada, dict):
+        return [f'{ruta}: debe ser un objeto']
+    errores = []
+    for campo in sorted(set(entrada) - set(CAMPOS)):
+        errores.append(f'{ruta}: campo desconocido {campo!r}')
+    for campo in CAMPOS:
+        valor = entrada.get(campo)
+        if valor is None:
+            errores.append(f'{ruta}: falta {campo!r}')
+        elif campo in CAMPOS_LISTA:
+            if not isinstance(valor, list) or not valor or not all(isinstance(v, str) and v.strip() for v in valor):
+                errores.append(f'{ruta}: {campo!r} debe ser una lista no vacía de textos')
+        elif not isinstance(valor, str) or not valor.strip():
+            errores.append(f'{ruta}: {campo!r} debe ser un texto no vacío')
+    criterios = entrada.get('criterios')
+    if isinstance(criterios, list) and len(criterios) > MAX_CRITERIOS:
+        errores.append(f'{ruta}: más de {MAX_CRITERIOS} criterios')
+    return errores
+
+
+def _sin_duplicados(pares):
+    # json.load se queda en silencio con el último de dos ciclos (o áreas) repetidos
+    objeto = {}
+    for clave, valor in pares:
+        if clave in objeto:
+            raise ValueError(f'clave repetida {clave!r}')
+        objeto[clave] = valor
+    return objeto
+
+
+def _tamano(objetos, vistos):
+    # Bytes de los objetos y de todo lo que contienen, contando una sola vez cada objeto compartido
+    total = 0
+    pendientes = list(objetos)
+    while pendientes:
+        objeto = pendientes.pop()
+        if id(objeto) in vistos:
+            continue
+        vistos.add(id(objeto))
+        total += sys.getsizeof(objeto)
+        if isinstance(objeto, dict):
+            pendientes.extend(objeto.keys())
+            pendientes.extend(objeto.values())
+        elif isinstance(objeto, (tuple, list, set, frozenset)):
+            pendientes.extend(objeto)
+    return total
+
+
+class Curriculo:
+    def __init__(self, ciclos, entradas):
+        # ciclos: {ciclo: descripción de los grados}, en el orden en que se muestran
+        self.ciclos = ciclos
+        self._entradas = tuple(entradas)
+        self._por_clave = {(entrada.area, entrada.ciclo): entrada for entrada in self._entradas}
+        self.areas = tuple(dict.fromkeys(entrada.area for entrada in self._entradas))
+        self._por_competencia = self._agrupar('competencia')
+        self._por_enfoque = self._agrupar('enfoque_transversal')
+
+    def _agrupar(self, campo):
+        grupos = {}
+        for entrada in self._entradas:
+            grupos.setdefault(getattr(entrada, campo), []).append(entrada)
+        return {clave: tuple(grupo) for clave, grupo in grupos.items()}
+
+    @classmethod
+    def cargar(cls, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo, object_pairs_hook=_sin_duplicados)
+        except ValueError as e:
+            raise CurriculoInvalido(f'{ruta}: JSON inválido ({e})')
+        return cls.desde_datos(datos, ruta)
+
+    @classmethod
+    def desde_datos(cls, datos, origen='currículo'):
+        # datos: {"ciclos": {ciclo: grados}, "areas": {area: {ciclo: entrada}}}; reúne todos los errores
+        if not isinstance(datos, dict) or not isinstance(datos.get('ciclos'), dict) \
+                or not isinstance(datos.get('areas'), dict):
+            raise CurriculoInvalido(f'{origen}: se esperaba un objeto con "ciclos" y "areas"')
+
+        errores = []
+        ciclos = {}
+        for ciclo, grados in datos['ciclos'].items():
+            if not isinstance(grados, str) or not grados.strip():
+                errores.append(f'{origen}: ciclos/{ciclo}: la descripción debe ser un texto')
+            ciclos[sys.intern(ciclo)] = grados
+
+        entradas = []
+        for area, por_ciclo in datos['areas'].items():
+            if not isinstance(por_ciclo, dict) or not por_ciclo:
+                errores.append(f'{origen}: {area}: debe ser un objeto con al menos un ciclo')
+                continue
+            for ciclo, entrada in por_ciclo.items():
+                ruta = f'{origen}: {area}/{ciclo}'
+                if ciclo not in ciclos:
+                    errores.append(f'{ruta}: ciclo no declarado en "ciclos"')
+                errores_entrada = _errores_entrada(ruta, entrada)
+                if errores_entrada:
+                    errores.extend(errores_entrada)
+                    continue
+                entradas.append(Entrada(
+                    sys.intern(area), sys.intern(ciclo),
+                    *(tuple(sys.intern(v.strip()) for v in entrada[campo]) if campo in CAMPOS_LISTA
+                      else sys.intern(entrada[campo].strip()) for campo in CAMPOS)
+                ))
+
+        if errores:
+            raise CurriculoInvalido('\n'.join(errores))
+        # Las entradas de cada área, en el orden de los ciclos
+        orden = {ciclo: i for i, ciclo in enumerate(ciclos)}
+        areas = {area: i for i, area in enumerate(datos['areas'])}
+        entradas.sort(key=lambda entrada: (areas[entrada.area], orden[entrada.ciclo]))
+        return cls(ciclos, entradas)
+
+    def __iter__(self):
+        return iter(self._entradas)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def buscar(self, area, ciclo):
+        try:
+            return self._por_clave.get((area, ciclo))
+        except TypeError:
+            # area o ciclo no hashables (listas u objetos en el JSON de la petición)
+            return None
+
+    def por_competencia(self, competencia):
+        return self._por_competencia.get(competencia, ())
+
+    def por_enfoque(self, enfoque):
+        return self._por_enfoque.get(enfoque, ())
+
+    def ciclos_de(self, area):
+        return tuple(ciclo for ciclo in self.ciclos if (area, ciclo) in self._por_clave)
+
+    def como_dict(self):
+        # {area: {ciclo: contenido}}, la forma que sirve /api/curriculo
+        resultado = {}
+        for entrada in self._entradas:
+            resultado.setdefault(entrada.area, {})[entrada.ciclo] = entrada.como_dict()
+        return resultado
+
+    def memoria(self):
+        # Huella en este worker: registros, tuplas, textos e índices, contra la de los mismos datos como
+        # dicts y listas recién leídos del JSON
+        vistos = set()
+        registros = _tamano(self._entradas, vistos)
+        indices = _tamano([self._por_clave, self._por_competencia, self._por_enfoque, self.areas, self.ciclos], vistos)
+        textos = [texto for entrada in self._entradas for campo in entrada
+                  for texto in (campo if isinstance(campo, tuple) else (campo,))]
+        sin_compactar = _tamano([json.loads(json.dumps({'ciclos': self.ciclos, 'areas': self.como_dict()}))], set())
+        return {
+            'entradas': len(self._entradas),
+            'areas': len(self.areas),
+            'ciclos': len(self.ciclos),
+            'competencias': len(self._por_competencia),
+            'enfoques': len(self._por_enfoque),
+            'textos_distintos': len({id(texto) for texto in textos}),
+            'textos_referenciados': len(textos),
+            'bytes_registros': registros,
+            'bytes_indices': indices,
+            'bytes_total': registros + indices,
+            'bytes_como_json_cargado': sin_compactar,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Valida un archivo de currículo y muestra su huella en memoria')
+    parser.add_argument('ruta', nargs='?', default='curriculo.json')
+    args = parser.parse_args(argv)
+    try:
+        curriculo = Curriculo.cargar(args.ruta)
+    except (OSError, CurriculoInvalido) as e:
+        print(e, file=sys.stderr)
+        return 1
+    for clave, valor in curriculo.memoria().items():
+        print(f'{clave:26} {valor}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
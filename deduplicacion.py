@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+import time
+
+from cache_documentos import escribir_atomico
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# DEDUPLICACIÓN DE PETICIONES EN CURSO
+# La primera petición con una clave hace el trabajo y las idénticas que llegan mientras tanto esperan su
+# resultado. Dentro del worker esperan un evento; entre workers, el líder tiene tomado un flock sobre
+# <directorio>/<sha256 de la clave>.lock y al terminar deja el resultado en .resultado. Si el líder
+# falla (excepción, o el worker muere y el sistema suelta el lock) uno de los que esperaban toma el relevo.
+# Un trabajo que termina sin resultado útil lanza SinResultado: no se publica y se cuenta como falla.
+
+
+class SinResultado(Exception):
+    pass
+
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Deduplicador:
+    def __init__(self, directorio=None, espera_segundos=60, vigencia_segundos=60, escrituras_por_poda=100):
+        # espera_segundos: tras ese tiempo esperando a otro, se hace el trabajo por cuenta propia
+        # vigencia_segundos: los archivos más antiguos se borran en la poda
+        self.directorio = directorio if directorio and fcntl is not None else None
+        self.espera_segundos = espera_segundos
+        self.vigencia_segundos = vigencia_segundos
+        self.escrituras_por_poda = escrituras_por_poda
+        self._vuelos = {}
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        self.contadores = {'lideres': 0, 'seguidores': 0, 'seguidores_otro_worker': 0, 'relevos': 0, 'esperas_agotadas': 0}
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def ejecutar(self, clave, funcion, codificar=None, decodificar=None):
+        # funcion() -> resultado; codificar(resultado) -> bytes y decodificar(bytes) -> resultado habilitan
+        # la espera entre workers (sin ellos solo se deduplica dentro del worker)
+        while True:
+            with self._lock:
+                vuelo = self._vuelos.get(clave)
+                lider = vuelo is None
+                if lider:
+                    vuelo = self._vuelos[clave] = _Vuelo()
+                    self.contadores['lideres'] += 1
+                else:
+                    self.contadores['seguidores'] += 1
+
+            if lider:
+                break
+            if not vuelo.listo.wait(self.espera_segundos):
+                self._contar('esperas_agotadas')
+                return funcion()
+            if vuelo.error is None:
+                return vuelo.resultado
+            # El líder falló: el primero en volver a registrarse toma el relevo y los demás lo siguen
+            self._contar('relevos')
+
+        try:
+            if self.directorio and codificar is not None:
+                vuelo.resultado = self._entre_workers(clave, funcion, codificar, decodificar)
+            else:
+                vuelo.resultado = funcion()
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.listo.set()
+
+    def _ruta(self, clave, extension):
+        digest = hashlib.sha256(clave.encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, f'{digest}.{extension}')
+
+    def _entre_workers(self, clave, funcion, codificar, decodificar):
+        estado, valor = self.adquirir(clave, decodificar)
+        if estado == 'resultado':
+            return valor
+        if estado == 'agotada':
+            return funcion()
+        try:
+            resultado = funcion()
+            self.publicar(clave, resultado, codificar)
+            return resultado
+        finally:
+            self.soltar(valor)
+
+    # Pasos de la espera entre workers, para quien hace el trabajo por su cuenta (el servidor asíncrono
+    # espera en un hilo y consulta como corrutina)
+
+    def adquirir(self, clave, decodificar):
+        # Bloquea hasta espera_segundos. Devuelve ('lider', lock): hacer el trabajo, publicar() y soltar(lock);
+        # ('resultado', valor): otro worker lo dejó listo mientras se esperaba; ('agotada', None): se hace sin lock
+        lock = open(self._ruta(clave, 'lock'), 'a+b')
+        try:
+            if not self._tomar(lock, 0):
+                # Otro worker está haciendo el mismo trabajo: se espera a que suelte el lock
+                self._contar('seguidores_otro_worker')
+                inicio = time.time()
+                if not self._tomar(lock, self.espera_segundos):
+                    self._contar('esperas_agotadas')
+                    lock.close()
+                    return 'agotada', None
+                try:
+                    # Solo sirve un resultado escrito mientras se esperaba; si no hay, el líder falló
+                    ruta_resultado = self._ruta(clave, 'resultado')
+                    if os.stat(ruta_resultado).st_mtime >= inicio:
+                        with open(ruta_resultado, 'rb') as archivo:
+                            valor = decodificar(archivo.read())
+                        lock.close()
+                        return 'resultado', valor
+                except (OSError, ValueError):
+                    pass
+                self._contar('relevos')
+            return 'lider', lock
+        except BaseException:
+            lock.close()
+            raise
+
+    def publicar(self, clave, resultado, codificar):
+        try:
+            escribir_atomico(self._ruta(clave, 'resultado'), codificar(resultado))
+        except OSError:
+            pass
+
+    def soltar(self, lock):
+        try:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        finally:
+            lock.close()
+        self._contar_escritura()
+
+    def _tomar(self, lock, segundos):
+        limite = time.monotonic() + segundos
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= limite:
+                    return False
+                time.sleep(0.05)
+
+    def _contar_escritura(self):
+        with self._lock:
+            self._escrituras += 1
+            podar = self._escrituras % self.escrituras_por_poda == 0
+        if podar:
+            self.podar()
+
+    def podar(self):
+        # Resultados y locks viejos; un lock tomado por otro worker no se toca
+        limite = time.time() - self.vigencia_segundos
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return
+        for nombre in nombres:
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                if os.stat(ruta).st_mtime >= limite:
+                    continue
+                if nombre.endswith('.lock'):
+                    with open(ruta, 'a+b') as lock:
+                        if not self._tomar(lock, 0):
+                            continue
+                        os.unlink(ruta)
+                elif nombre.endswith('.resultado'):
+                    os.unlink(ruta)
+            except OSError:
+                continue
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores, en_curso=len(self._vuelos))
@@ -0,0 +1,97 @@
+# CONTRATO DE SALIDA DE LA IA
+# Esquema de los ocho campos del contenido pedagógico, usado como definición de función (function
+# calling) para que el modelo responda con argumentos JSON estructurados, y validación de esas
+# respuestas para detectar campos faltantes o mal formados.
+
+CAMPOS_CONTENIDO = ('competencia', 'capacidades', 'estandar', 'criterios', 'instrumento',
+                    'competencia_transversal', 'enfoque_transversal', 'descripcion_enfoque')
+
+# Campos de lista y la cantidad exacta de elementos que llevan
+LONGITUDES = {'capacidades': 3, 'criterios': 2}
+
+ESQUEMA_CAMPOS = {
+    'competencia': {'type': 'string', 'description': 'Competencia del CNEB para el área'},
+    'capacidades': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 3, 'maxItems': 3,
+                    'description': 'Capacidades de la competencia'},
+    'estandar': {'type': 'string', 'description': 'Estándar de aprendizaje del ciclo'},
+    'criterios': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 2, 'maxItems': 2,
+                  'description': 'Criterios de evaluación observables para el tema'},
+    'instrumento': {'type': 'string', 'enum': ['Lista de cotejo']},
+    'competencia_transversal': {'type': 'string', 'description': 'Competencia transversal del CNEB'},
+    'enfoque_transversal': {'type': 'string', 'description': 'Enfoque transversal del CNEB'},
+    'descripcion_enfoque': {'type': 'string', 'description': 'Cómo se evidencia el enfoque en la unidad'},
+}
+
+# Tokens de salida estimados por campo, para dimensionar max_tokens según lo que se pide
+TOKENS_CAMPO = {
+    'competencia': 60,
+    'capacidades': 150,
+    'estandar': 150,
+    'criterios': 120,
+    'instrumento': 15,
+    'competencia_transversal': 40,
+    'enfoque_transversal': 30,
+    'descripcion_enfoque': 80,
+}
+TOKENS_ESTRUCTURA = 60
+
+FUNCION_CONTENIDO = 'registrar_contenido'
+FUNCION_LOTE = 'registrar_contenidos'
+
+
+def funcion_contenido(campos=CAMPOS_CONTENIDO):
+    return {
+        'name': FUNCION_CONTENIDO,
+        'description': 'Registra la información pedagógica de una unidad.',
+        'parameters': {
+            'type': 'object',
+            'properties': {campo: ESQUEMA_CAMPOS[campo] for campo in campos},
+            'required': list(campos),
+        },
+    }
+
+
+def funcion_lote():
+    propiedades = {'indice': {'type': 'integer', 'description': 'Número del tema'}}
+    propiedades.update(ESQUEMA_CAMPOS)
+    return {
+        'name': FUNCION_LOTE,
+        'description': 'Registra la información pedagógica de varias unidades, una por tema.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'elementos': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': propiedades,
+                        'required': ['indice'] + list(CAMPOS_CONTENIDO),
+                    },
+                },
+            },
+            'required': ['elementos'],
+        },
+    }
+
+
+def tokens_maximos(campos=CAMPOS_CONTENIDO, elementos=1):
+    return elementos * (TOKENS_ESTRUCTURA + sum(TOKENS_CAMPO[campo] for campo in campos))
+
+
+def validar_contenido(datos, campos=CAMPOS_CONTENIDO):
+    # Devuelve (campos válidos, nombres de los campos faltantes o inválidos)
+    validos = {}
+    faltantes = []
+    for campo in campos:
+        valor = datos.get(campo) if isinstance(datos, dict) else None
+        if campo in LONGITUDES:
+            if isinstance(valor, list):
+                elementos = [v.strip() for v in valor if isinstance(v, str) and v.strip()]
+                if len(elementos) >= LONGITUDES[campo]:
+                    validos[campo] = elementos[:LONGITUDES[campo]]
+                    continue
+        elif isinstance(valor, str) and valor.strip():
+            validos[campo] = valor.strip()
+            continue
+        faltantes.append(campo)
+    return validos, faltantes
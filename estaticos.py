@@ -0,0 +1,50 @@
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# RESPUESTAS PRECALCULADAS
+# Contenido que no cambia mientras el proceso vive (la página, el currículo): se serializa y se
+# comprime una sola vez al arrancar, y cada petición solo elige la variante según Accept-Encoding.
+
+
+class RecursoEstatico:
+    def __init__(self, datos, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(datos).hexdigest()[:32]
+        self.variantes = {'identity': datos}
+
+        comprimido = gzip.compress(datos, compresslevel=9, mtime=0)
+        if len(comprimido) < len(datos):
+            self.variantes['gzip'] = comprimido
+        if brotli is not None:
+            comprimido = brotli.compress(datos, quality=11)
+            if len(comprimido) < len(datos):
+                self.variantes['br'] = comprimido
+
+    def codificacion(self, accept_encodings):
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self.variantes and accept_encodings[codificacion]:
+                return codificacion
+        return 'identity'
+
+    def respuesta(self, request):
+        codificacion = self.codificacion(request.accept_encodings)
+        # Cada codificación es una representación distinta y lleva su propio ETag fuerte
+        etag = self.etag if codificacion == 'identity' else f'{self.etag}-{codificacion}'
+        headers = {'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+
+        if request.if_none_match.contains_weak(etag):
+            respuesta = Response(status=304, headers=headers)
+        else:
+            respuesta = Response(self.variantes[codificacion], mimetype=self.mimetype, headers=headers)
+            if codificacion != 'identity':
+                respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.set_etag(etag)
+        return respuesta
@@ -0,0 +1,251 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# SERVIDOR FALSO DE CHAT COMPLETIONS
+# Imita POST /v1/chat/completions de OpenAI para pruebas de carga sin gastar créditos: responde con
+# argumentos de función armados a partir del esquema que manda la app (uno o varios elementos), con
+# latencia según una distribución configurable, errores HTTP, JSON truncado o campos faltantes a la tasa
+# pedida, y streaming por SSE. Se apunta la app con OPENAI_API_BASE=http://127.0.0.1:<puerto>/v1.
+#
+#   python ia_falsa.py --puerto 8090 --latencia lognormal:1.2,0.4 --tasa-errores 0.02 --tasa-malformado 0.05
+
+
+def distribucion(texto):
+    # 'fija:s' (o solo 's'), 'uniforme:a,b', 'normal:media,desv', 'lognormal:mediana,sigma' -> función sin
+    # argumentos que devuelve segundos
+    tipo, _, parametros = texto.partition(':') if ':' in texto else ('fija', '', texto)
+    try:
+        valores = [float(v) for v in parametros.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'distribución inválida: {texto}')
+    if tipo == 'fija' and len(valores) == 1:
+        return lambda: valores[0]
+    if tipo == 'uniforme' and len(valores) == 2:
+        return lambda: random.uniform(*valores)
+    if tipo == 'normal' and len(valores) == 2:
+        return lambda: max(0.0, random.gauss(*valores))
+    if tipo == 'lognormal' and len(valores) == 2:
+        mediana, sigma = valores
+        return lambda: random.lognormvariate(0, sigma) * mediana
+    raise argparse.ArgumentTypeError(f'distribución inválida: {texto}')
+
+
+class Configuracion:
+    def __init__(self, latencia='fija:0.5', intervalo=0.02, tasa_errores=0.0, codigo_error=500,
+                 tasa_malformado=0.0, tasa_incompletos=0.0, semilla=None):
+        self.latencia = distribucion(latencia) if isinstance(latencia, str) else latencia
+        self.intervalo = intervalo
+        self.tasa_errores = tasa_errores
+        self.codigo_error = codigo_error
+        self.tasa_malformado = tasa_malformado
+        self.tasa_incompletos = tasa_incompletos
+        self.aleatorio = random.Random(semilla)
+
+
+def valor_ejemplo(campo, esquema, tema):
+    if 'enum' in esquema:
+        return esquema['enum'][0]
+    if esquema.get('type') == 'array':
+        cantidad = esquema.get('minItems', 2)
+        return [f'{campo.capitalize()} {i + 1} sobre {tema}' for i in range(cantidad)]
+    if esquema.get('type') == 'integer':
+        return 1
+    return f'{campo.replace("_", " ").capitalize()} de ejemplo para {tema}'
+
+
+def argumentos_ejemplo(funcion, prompt, config):
+    parametros = funcion.get('parameters', {}).get('properties', {})
+
+    def elemento(propiedades, tema):
+        datos = {campo: valor_ejemplo(campo, esquema, tema) for campo, esquema in propiedades.items()}
+        if datos and config.aleatorio.random() < config.tasa_incompletos:
+            datos.pop(config.aleatorio.choice(sorted(datos)))
+        return datos
+
+    if 'elementos' in parametros:
+        # Prompt de lote: una línea '1. Ciclo ..., Área ..., Tema ... (referencia ...)' por tema
+        temas = re.findall(r'^\d+\. Ciclo [^,]*, Área [^,]*, Tema (.*?)(?: \(referencia .*\))?$', prompt, re.M)
+        propiedades = parametros['elementos'].get('items', {}).get('properties', {})
+        elementos = []
+        for i, tema in enumerate(temas):
+            datos = elemento(propiedades, tema)
+            datos['indice'] = i + 1
+            elementos.append(datos)
+        return {'elementos': elementos}
+    tema = re.search(r'Tema (.*?)\.(?:\s|$)', prompt)
+    return elemento(parametros, tema.group(1) if tema else 'el tema')
+
+
+class ServidorIAFalsa(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, config):
+        super().__init__(direccion, _Manejador)
+        self.config = config
+        self._lock = threading.Lock()
+        self.contadores = {'peticiones': 0, 'streaming': 0, 'errores': 0, 'malformados': 0}
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan la conexión al terminar de leer un stream; no es un error del servidor
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _json(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/estadisticas':
+            return self._json(200, self.server.estadisticas())
+        self._json(404, {'error': {'message': 'No encontrado', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._json(404, {'error': {'message': 'No encontrado', 'type': 'invalid_request_error'}})
+        config = self.server.config
+        try:
+            peticion = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            return self._json(400, {'error': {'message': 'JSON inválido', 'type': 'invalid_request_error'}})
+
+        self.server.contar('peticiones')
+        time.sleep(config.latencia())
+        if config.aleatorio.random() < config.tasa_errores:
+            self.server.contar('errores')
+            tipo = 'rate_limit_error' if config.codigo_error == 429 else 'server_error'
+            return self._json(config.codigo_error, {'error': {'message': 'Error simulado', 'type': tipo}})
+
+        prompt = '\n'.join(m.get('content') or '' for m in peticion.get('messages', []) if m.get('role') == 'user')
+        funciones = peticion.get('functions') or []
+        funcion = funciones[0] if funciones else None
+        if funcion:
+            texto = json.dumps(argumentos_ejemplo(funcion, prompt, config), ensure_ascii=False)
+        else:
+            texto = 'Respuesta de ejemplo.'
+        if config.aleatorio.random() < config.tasa_malformado:
+            self.server.contar('malformados')
+            texto = texto[:config.aleatorio.randrange(1, len(texto))]
+
+        # Trozos de unas pocas palabras, como los deltas del API real
+        trozos = re.findall(r'\S*\s*', texto)[:-1] or [texto]
+        trozos = [''.join(trozos[i:i + 3]) for i in range(0, len(trozos), 3)]
+        modelo = peticion.get('model', 'falso')
+        base = {'id': f'chatcmpl-falso-{time.time_ns()}', 'created': int(time.time()), 'model': modelo}
+
+        if peticion.get('stream'):
+            self.server.contar('streaming')
+            return self._stream(base, funcion, trozos)
+
+        time.sleep(config.intervalo * len(trozos))
+        if funcion:
+            mensaje = {'role': 'assistant', 'content': None,
+                       'function_call': {'name': funcion['name'], 'arguments': texto}}
+        else:
+            mensaje = {'role': 'assistant', 'content': texto}
+        self._json(200, dict(base, object='chat.completion', choices=[
+            {'index': 0, 'message': mensaje, 'finish_reason': 'function_call' if funcion else 'stop'}
+        ], usage={'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(texto) // 4,
+                  'total_tokens': (len(prompt) + len(texto)) // 4}))
+
+    def _stream(self, base, funcion, trozos):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def enviar(datos):
+            linea = f'data: {datos}\n\n'.encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(linea), linea))
+            self.wfile.flush()
+
+        def chunk(delta, fin=None):
+            enviar(json.dumps(dict(base, object='chat.completion.chunk', choices=[
+                {'index': 0, 'delta': delta, 'finish_reason': fin}
+            ]), ensure_ascii=False))
+
+        try:
+            if funcion:
+                chunk({'role': 'assistant', 'content': None,
+                       'function_call': {'name': funcion['name'], 'arguments': ''}})
+            else:
+                chunk({'role': 'assistant', 'content': ''})
+            for trozo in trozos:
+                time.sleep(self.server.config.intervalo)
+                chunk({'function_call': {'arguments': trozo}} if funcion else {'content': trozo})
+            chunk({}, 'function_call' if funcion else 'stop')
+            enviar('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # La app corta el stream en cuanto el JSON se cierra
+            self.close_connection = True
+
+
+def iniciar(puerto=0, config=None, host='127.0.0.1'):
+    # Arranca el servidor en un hilo y lo devuelve; la URL base es servidor.url
+    servidor = ServidorIAFalsa((host, puerto), config or Configuracion())
+    servidor.url = f'http://{host}:{servidor.server_address[1]}/v1'
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def agregar_argumentos(parser):
+    parser.add_argument('--latencia', type=distribucion, default='fija:0.5',
+                        help="tiempo hasta el primer byte: 'fija:s', 'uniforme:a,b', 'normal:media,desv' "
+                             "o 'lognormal:mediana,sigma' (segundos)")
+    parser.add_argument('--intervalo', type=float, default=0.02, help='segundos entre trozos de la respuesta')
+    parser.add_argument('--tasa-errores', type=float, default=0.0, help='fracción de respuestas con error HTTP')
+    parser.add_argument('--codigo-error', type=int, default=500, help='código HTTP de los errores (500 o 429)')
+    parser.add_argument('--tasa-malformado', type=float, default=0.0, help='fracción de respuestas con JSON truncado')
+    parser.add_argument('--tasa-incompletos', type=float, default=0.0, help='fracción de elementos sin un campo')
+    parser.add_argument('--semilla', type=int, help='semilla para repetir la misma secuencia de fallas')
+
+
+def configuracion_desde(args):
+    return Configuracion(args.latencia, args.intervalo, args.tasa_errores, args.codigo_error,
+                         args.tasa_malformado, args.tasa_incompletos, args.semilla)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor local que imita el API de chat completions')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8090)
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    servidor = ServidorIAFalsa((args.host, args.puerto), configuracion_desde(args))
+    print(f'IA falsa en http://{args.host}:{servidor.server_address[1]}/v1', flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import json
+
+# PARSER INCREMENTAL DE OBJETOS JSON
+# Recibe el texto por trozos (tal como llega del streaming de la IA) y devuelve cada campo de
+# primer nivel en cuanto su valor se cierra, sin esperar al resto del objeto. Ignora cualquier
+# texto antes de la primera '{', igual que el parser no incremental.
+
+
+class ParserCamposJSON:
+    def __init__(self):
+        self.buffer = ''
+        self.terminado = False
+        self._pos = 0
+        self._estado = 'inicio'
+        self._profundidad = 0
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_clave = None
+        self._clave = None
+        self._inicio_valor = None
+
+    def alimentar(self, texto):
+        self.buffer += texto
+        campos = []
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.terminado:
+            c = buffer[self._pos]
+
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+                    if self._estado == 'clave' and self._profundidad == 1:
+                        self._clave = json.loads(buffer[self._inicio_clave:self._pos + 1])
+                        self._estado = 'dos_puntos'
+                self._pos += 1
+                continue
+
+            if self._estado == 'inicio':
+                if c == '{':
+                    self._profundidad = 1
+                    self._estado = 'clave'
+            elif c == '"':
+                self._en_cadena = True
+                if self._estado == 'clave' and self._profundidad == 1:
+                    self._inicio_clave = self._pos
+            elif c == ':' and self._estado == 'dos_puntos':
+                self._estado = 'valor'
+                self._inicio_valor = self._pos + 1
+            elif c in '{[':
+                self._profundidad += 1
+            elif c in '}]':
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self._cerrar_valor(campos)
+                    self.terminado = True
+            elif c == ',' and self._profundidad == 1 and self._estado == 'valor':
+                self._cerrar_valor(campos)
+                self._estado = 'clave'
+            self._pos += 1
+        return campos
+
+    def _cerrar_valor(self, campos):
+        if self._estado != 'valor':
+            return
+        valor = json.loads(self.buffer[self._inicio_valor:self._pos])
+        campos.append((self._clave, valor))
+        self._estado = 'clave'
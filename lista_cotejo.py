@@ -0,0 +1,139 @@
+import csv
+import io
+
+from cache_ia import normalizar
+from plantilla_docx import contenido_run
+
+# LISTA DE COTEJO
+# Nómina de estudiantes (lista JSON o CSV) y filas de la tabla de cotejo. Las filas de estudiantes se
+# emiten como XML en un solo bloque, con el ancho de cada celda ya escrito, en lugar de recorrer la
+# tabla celda por celda con python-docx.
+
+ESTUDIANTES_POR_DEFECTO = 20
+MAX_ESTUDIANTES = 200
+MAX_CRITERIOS = 12
+
+# Anchos en twips (1/1440 de pulgada): Nº 0.4", Nombres 3.2", criterios 0.6" mientras entren en la página
+ANCHO_NUMERO = 576
+ANCHO_NOMBRES = 4608
+ANCHO_CRITERIO = 864
+ANCHO_PAGINA = 10512  # carta con márgenes de 0.6"
+
+# Encabezados de CSV reconocidos como columna de nombres
+_COLUMNAS_NOMBRE = {'nombre', 'nombres', 'nombres y apellidos', 'apellidos y nombres', 'estudiante',
+                    'estudiantes', 'alumno', 'alumnos', 'alumno(a)', 'estudiante(a)'}
+
+
+def anchos_columnas(num_criterios):
+    disponible = ANCHO_PAGINA - ANCHO_NUMERO - ANCHO_NOMBRES
+    ancho = min(ANCHO_CRITERIO, disponible // num_criterios) if num_criterios else ANCHO_CRITERIO
+    return [ANCHO_NUMERO, ANCHO_NOMBRES] + [ancho] * num_criterios
+
+
+def _limpiar_nombres(nombres):
+    nombres = [' '.join(str(nombre).split()) for nombre in nombres]
+    if len(nombres) > MAX_ESTUDIANTES:
+        raise ValueError(f'La lista admite como máximo {MAX_ESTUDIANTES} estudiantes')
+    return nombres
+
+
+def leer_csv(texto):
+    # Una fila por estudiante; si hay encabezado se usa la columna de nombres (o apellidos + nombres)
+    texto = texto.lstrip('\ufeff')
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:2048], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    filas = [fila for fila in csv.reader(io.StringIO(texto), dialecto) if any(c.strip() for c in fila)]
+    if not filas:
+        return []
+
+    encabezado = [normalizar(celda) for celda in filas[0]]
+    if 'apellidos' in encabezado and 'nombres' in encabezado:
+        i_apellidos = encabezado.index('apellidos')
+        i_nombres = encabezado.index('nombres')
+        return _limpiar_nombres(
+            ', '.join(p for p in (fila[i_apellidos].strip() if i_apellidos < len(fila) else '',
+                                  fila[i_nombres].strip() if i_nombres < len(fila) else '') if p)
+            for fila in filas[1:]
+        )
+    for i, celda in enumerate(encabezado):
+        if celda in _COLUMNAS_NOMBRE:
+            return _limpiar_nombres(fila[i] if i < len(fila) else '' for fila in filas[1:])
+
+    # Sin encabezado: la primera celda que no sea solo un número de orden
+    nombres = []
+    for fila in filas:
+        celdas = [celda.strip() for celda in fila if celda.strip()]
+        nombres.append(next((celda for celda in celdas if not celda.rstrip('.').isdigit()), ''))
+    return _limpiar_nombres(nombres)
+
+
+def leer_estudiantes(estudiantes=None, num_estudiantes=None):
+    # estudiantes: lista de nombres o texto CSV; num_estudiantes: filas en blanco si no hay nómina
+    if estudiantes:
+        if isinstance(estudiantes, str):
+            nombres = leer_csv(estudiantes)
+        elif isinstance(estudiantes, list) and all(isinstance(n, str) for n in estudiantes):
+            nombres = _limpiar_nombres(estudiantes)
+        else:
+            raise ValueError('estudiantes debe ser una lista de nombres o un CSV')
+        if not nombres:
+            raise ValueError('La lista de estudiantes está vacía')
+        return nombres
+
+    if num_estudiantes in (None, ''):
+        return [''] * ESTUDIANTES_POR_DEFECTO
+    try:
+        cantidad = int(num_estudiantes)
+    except (TypeError, ValueError):
+        raise ValueError('num_estudiantes debe ser un número entero')
+    if not 1 <= cantidad <= MAX_ESTUDIANTES:
+        raise ValueError(f'num_estudiantes debe estar entre 1 y {MAX_ESTUDIANTES}')
+    return [''] * cantidad
+
+
+def leer_criterios_adicionales(criterios):
+    if not criterios:
+        return []
+    if not isinstance(criterios, list) or not all(isinstance(c, str) for c in criterios):
+        raise ValueError('criterios_adicionales debe ser una lista de textos')
+    criterios = [c.strip() for c in criterios if c.strip()]
+    if len(criterios) > MAX_CRITERIOS:
+        raise ValueError(f'La lista de cotejo admite como máximo {MAX_CRITERIOS} criterios')
+    return criterios
+
+
+def sumar_criterios(criterios, adicionales):
+    # Los criterios del contenido (del currículo, de la IA o editados) más los adicionales; el límite es
+    # sobre el total, que es lo que ocupa columnas en la tabla
+    criterios = list(criterios) + list(adicionales)
+    if len(criterios) > MAX_CRITERIOS:
+        raise ValueError(f'La lista de cotejo admite como máximo {MAX_CRITERIOS} criterios')
+    return criterios
+
+
+def _celda(ancho, contenido=b''):
+    parrafo = b'<w:p>' + contenido + b'</w:p>' if contenido else b'<w:p/>'
+    return b'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="%d"/></w:tcPr>%s</w:tc>' % (ancho, parrafo)
+
+
+def _run(texto):
+    # Mismo formato que run.font.size = Pt(9)
+    return b'<w:r><w:rPr><w:sz w:val="18"/></w:rPr>' + contenido_run(texto) + b'</w:r>'
+
+
+def filas_cotejo(estudiantes, num_criterios):
+    # XML de todas las filas de estudiantes: Nº, nombre (o vacío) y una celda vacía por criterio
+    anchos = anchos_columnas(num_criterios)
+    vacias = b''.join(_celda(ancho) for ancho in anchos[2:])
+    filas = []
+    for numero, nombre in enumerate(estudiantes, 1):
+        filas.append(b''.join((
+            b'<w:tr>',
+            _celda(anchos[0], _run(str(numero))),
+            _celda(anchos[1], _run(nombre) if nombre else b''),
+            vacias,
+            b'</w:tr>',
+        )))
+    return b''.join(filas)
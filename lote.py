@@ -0,0 +1,80 @@
+import io
+import json
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ZIP EN STREAMING PARA GENERACIÓN POR LOTES
+# Los elementos se procesan en paralelo con una ventana acotada de trabajos pendientes y cada
+# documento se escribe en el zip en cuanto termina, así la memoria no crece con el tamaño del lote.
+# Los errores de cada elemento van al manifiesto (manifiesto.json) en lugar de cortar la descarga.
+
+
+class _Salida(io.RawIOBase):
+    # Destino no posicionable: zipfile usa descriptores de datos y solo escribe hacia adelante
+    def __init__(self):
+        self._trozos = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+def zip_en_stream(elementos, procesar, nombre_entrada, hilos=4):
+    # procesar(elemento) -> (bytes, dict con datos extra para el manifiesto); puede lanzar excepción
+    # nombre_entrada(indice, elemento) -> nombre del archivo dentro del zip
+    salida = _Salida()
+    manifiesto = []
+    inicio = time.time()
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as paquete, \
+            ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='lote') as pool:
+        pendientes = {}
+        siguientes = iter(enumerate(elementos))
+        agotado = False
+
+        while pendientes or not agotado:
+            while not agotado and len(pendientes) < 2 * hilos:
+                try:
+                    indice, elemento = next(siguientes)
+                except StopIteration:
+                    agotado = True
+                    break
+                pendientes[pool.submit(procesar, elemento)] = (indice, elemento)
+
+            if not pendientes:
+                break
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                indice, elemento = pendientes.pop(futuro)
+                registro = {'indice': indice, 'elemento': elemento}
+                try:
+                    datos, extra = futuro.result()
+                except Exception as e:
+                    registro['error'] = str(e)
+                else:
+                    registro['archivo'] = nombre_entrada(indice, elemento)
+                    registro.update(extra)
+                    paquete.writestr(registro['archivo'], datos)
+                manifiesto.append(registro)
+            yield salida.vaciar()
+
+        manifiesto.sort(key=lambda registro: registro['indice'])
+        resumen = {
+            'total': len(manifiesto),
+            'correctos': sum(1 for registro in manifiesto if 'archivo' in registro),
+            'errores': sum(1 for registro in manifiesto if 'error' in registro),
+            'segundos': time.time() - inicio,
+            'elementos': manifiesto,
+        }
+        paquete.writestr('manifiesto.json', json.dumps(resumen, ensure_ascii=False, indent=2))
+
+    yield salida.vaciar()
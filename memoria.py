@@ -0,0 +1,270 @@
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# MEMORIA DE LOS WORKERS
+# - Instrumentación con tracemalloc (opcional: hace más lenta cada asignación). Por tipo de petición, la
+#   memoria que quedó asignada al terminar respecto de al empezar; por etapa (parseo de la respuesta de la
+#   IA, crear_documento_word, doc.save...), el pico sobre lo asignado al entrar. Además, cada `cada`
+#   peticiones de un tipo se toma una instantánea y se compara con la anterior del mismo tipo: las
+#   líneas donde más creció la memoria. Las asignaciones de peticiones concurrentes se mezclan, así que
+#   la atribución es exacta solo con un hilo por worker.
+# - Techo de RSS. Una petición puede terminar con el RSS sobre el techo. En ese caso se recolecta basura
+#   y se devuelve al sistema la memoria libre de malloc. Si sigue arriba, el worker se recicla con
+#   SIGTERM: gunicorn termina las peticiones en curso antes de salir y el maestro lanza otro.
+
+FILTROS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    # Las instantáneas que guarda este mismo monitor
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+# Sin reset_peak (Python 3.8) el pico de una etapa no se puede separar del de todo el proceso
+_PICO_POR_ETAPA = hasattr(tracemalloc, 'reset_peak')
+# Tras una recolección que bajó el RSS del techo, otro exceso dentro de este tiempo ya recicla
+ENFRIAMIENTO_SEGUNDOS = 60
+SITIOS_POR_INSTANTANEA = 10
+
+_libc = None
+
+
+def rss_bytes():
+    # Memoria residente actual del proceso; None fuera de Linux
+    try:
+        with open('/proc/self/statm') as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def devolver_memoria_libre():
+    # glibc no devuelve al sistema los huecos libres de su heap por su cuenta; malloc_trim sí
+    global _libc
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        return bool(_libc.malloc_trim(0))
+    except (OSError, AttributeError, TypeError):
+        return False
+
+
+def _sitio(marco):
+    # Ruta relativa al directorio de sys.path que la contiene (app, docx/..., lxml/...)
+    nombre = marco.filename
+    for base in sorted(sys.path, key=len, reverse=True):
+        if base and nombre.startswith(base + os.sep):
+            nombre = nombre[len(base) + 1:]
+            break
+    return f'{nombre}:{marco.lineno}'
+
+
+class MonitorMemoria:
+    def __init__(self, marcos=0, cada=50, max_rss_mb=0, registro=None):
+        # marcos: profundidad de las pilas de tracemalloc (0: sin instrumentar); max_rss_mb: techo (0: sin techo)
+        self.cada = cada
+        self.max_rss = int(max_rss_mb * 1024 * 1024)
+        self.registro = registro or logging.getLogger(__name__)
+        self._tipos = {}
+        self._etapas = {}
+        self._instantaneas = {}
+        self._crecimiento = {}
+        self._pila = threading.local()
+        self._lock = threading.Lock()
+        self._ultima_recoleccion = None
+        self.recuperaciones = 0
+        self.reciclando = False
+        # Si tracemalloc lo activa otro (benchmark.py), el monitor no lo toca: reset_peak falsearía sus picos
+        self._marcos = marcos
+        if marcos and not tracemalloc.is_tracing():
+            tracemalloc.start(marcos)
+
+    @property
+    def instrumentado(self):
+        return bool(self._marcos) and tracemalloc.is_tracing()
+
+    # Peticiones
+
+    def iniciar(self):
+        # Lo que devuelve se pasa a terminar()
+        return tracemalloc.get_traced_memory()[0] if self.instrumentado else None
+
+    def terminar(self, tipo, inicio):
+        if inicio is not None and self.instrumentado:
+            retenido = tracemalloc.get_traced_memory()[0] - inicio
+            with self._lock:
+                datos = self._tipos.setdefault(tipo, {'peticiones': 0, 'retenido_bytes': 0, 'retenido_max_bytes': 0})
+                datos['peticiones'] += 1
+                datos['retenido_bytes'] += retenido
+                datos['retenido_max_bytes'] = max(datos['retenido_max_bytes'], retenido)
+                tomar = self.cada and datos['peticiones'] % self.cada == 0
+            if tomar:
+                self._comparar_instantanea(tipo)
+        self.vigilar_rss()
+
+    def _agrupar(self, agrupar='lineno', marcos=1):
+        instantanea = tracemalloc.take_snapshot().filter_traces(FILTROS)
+        return [(tuple(_sitio(marco) for marco in list(estadistica.traceback)[:marcos]), estadistica.size,
+                 estadistica.count) for estadistica in instantanea.statistics(agrupar)]
+
+    def _comparar_instantanea(self, tipo):
+        actual = {sitio: (tamano, bloques) for sitio, tamano, bloques in self._agrupar()}
+        with self._lock:
+            anterior = self._instantaneas.get(tipo)
+            self._instantaneas[tipo] = actual
+            peticiones = self._tipos[tipo]['peticiones']
+        if anterior is None:
+            return
+        crecimiento = []
+        for sitio, (tamano, bloques) in actual.items():
+            tamano_anterior, bloques_anterior = anterior.get(sitio, (0, 0))
+            if tamano > tamano_anterior:
+                crecimiento.append({'sitio': sitio[0], 'bytes': tamano, 'bloques': bloques,
+                                    'crecimiento_bytes': tamano - tamano_anterior,
+                                    'crecimiento_bloques': bloques - bloques_anterior})
+        crecimiento.sort(key=lambda sitio: sitio['crecimiento_bytes'], reverse=True)
+        with self._lock:
+            self._crecimiento[tipo] = {
+                'peticiones': [peticiones - self.cada, peticiones],
+                'fecha': time.time(),
+                'sitios': crecimiento[:SITIOS_POR_INSTANTANEA],
+            }
+
+    # Etapas
+
+    @contextmanager
+    def etapa(self, nombre):
+        if not self.instrumentado:
+            yield
+            return
+        abiertas = getattr(self._pila, 'etapas', None)
+        if abiertas is None:
+            abiertas = self._pila.etapas = []
+        inicio, pico = tracemalloc.get_traced_memory()
+        if _PICO_POR_ETAPA:
+            # reset_peak es de todo el proceso: las etapas que contienen a esta se quedan con el pico de hasta ahora
+            for abierta in abiertas:
+                abierta[1] = max(abierta[1], pico)
+            tracemalloc.reset_peak()
+        propia = [inicio, 0]
+        abiertas.append(propia)
+        try:
+            yield
+        finally:
+            abiertas.pop()
+            actual, pico = tracemalloc.get_traced_memory()
+            pico = max(pico, propia[1])
+            for abierta in abiertas:
+                abierta[1] = max(abierta[1], pico)
+            with self._lock:
+                datos = self._etapas.setdefault(nombre, {'veces': 0, 'neto_bytes': 0, 'pico_bytes': 0,
+                                                         'pico_max_bytes': 0})
+                datos['veces'] += 1
+                datos['neto_bytes'] += actual - inicio
+                if _PICO_POR_ETAPA:
+                    datos['pico_bytes'] += pico - inicio
+                    datos['pico_max_bytes'] = max(datos['pico_max_bytes'], pico - inicio)
+
+    # Techo de RSS
+
+    def vigilar_rss(self):
+        if not self.max_rss or self.reciclando:
+            return
+        rss = rss_bytes()
+        if rss is None or rss <= self.max_rss:
+            return
+        with self._lock:
+            if self.reciclando:
+                return
+            ahora = time.monotonic()
+            recolectar = self._ultima_recoleccion is None or ahora - self._ultima_recoleccion > ENFRIAMIENTO_SEGUNDOS
+            if recolectar:
+                self._ultima_recoleccion = ahora
+            else:
+                self.reciclando = True
+
+        if recolectar:
+            gc.collect()
+            devolver_memoria_libre()
+            despues = rss_bytes()
+            if despues is not None and despues <= self.max_rss:
+                self.recuperaciones += 1
+                self.registro.info('Memoria: RSS de %.0f MB sobre el techo, %.0f MB tras recolectar',
+                                   rss / 2 ** 20, despues / 2 ** 20)
+                return
+            with self._lock:
+                if self.reciclando:
+                    return
+                self.reciclando = True
+            rss = despues or rss
+        self.reciclar(rss)
+
+    def reciclar(self, rss):
+        if 'gunicorn' not in sys.modules:
+            self.registro.warning('Memoria: RSS de %.0f MB sobre el techo de %.0f MB; fuera de gunicorn el proceso '
+                                  'no se recicla', rss / 2 ** 20, self.max_rss / 2 ** 20)
+            return
+        self.registro.warning('Memoria: RSS de %.0f MB sobre el techo de %.0f MB, se recicla el worker %d tras '
+                              'terminar las peticiones en curso', rss / 2 ** 20, self.max_rss / 2 ** 20, os.getpid())
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    # Reporte
+
+    def sitios(self, limite=20, agrupar='lineno'):
+        # Sitios con más memoria asignada ahora; agrupar 'traceback' da la pila completa de cada uno
+        if not self.instrumentado:
+            return []
+        marcos = tracemalloc.get_traceback_limit() if agrupar == 'traceback' else 1
+        return [{'sitio': sitio[0] if marcos == 1 else list(sitio), 'bytes': tamano, 'bloques': bloques}
+                for sitio, tamano, bloques in self._agrupar(agrupar, marcos)[:limite]]
+
+    def estado(self, limite=20, agrupar='lineno'):
+        instrumentado = self.instrumentado
+        actual, pico = tracemalloc.get_traced_memory() if instrumentado else (None, None)
+        sitios = self.sitios(limite, agrupar)
+        with self._lock:
+            peticiones = {tipo: dict(datos, retenido_medio_bytes=datos['retenido_bytes'] // datos['peticiones'])
+                          for tipo, datos in self._tipos.items()}
+            etapas = {}
+            for nombre, datos in self._etapas.items():
+                etapas[nombre] = {'veces': datos['veces'], 'neto_medio_bytes': datos['neto_bytes'] // datos['veces']}
+                if _PICO_POR_ETAPA:
+                    etapas[nombre]['pico_medio_bytes'] = datos['pico_bytes'] // datos['veces']
+                    etapas[nombre]['pico_max_bytes'] = datos['pico_max_bytes']
+            crecimiento = dict(self._crecimiento)
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'max_rss_bytes': self.max_rss or None,
+            'recuperaciones': self.recuperaciones,
+            'reciclando': self.reciclando,
+            'tracemalloc': {
+                'instrumentado': instrumentado,
+                'marcos': tracemalloc.get_traceback_limit() if instrumentado else 0,
+                'asignado_bytes': actual,
+                'pico_bytes': pico,
+                'sobrecarga_bytes': tracemalloc.get_tracemalloc_memory() if instrumentado else 0,
+            },
+            'peticiones': peticiones,
+            'etapas': etapas,
+            'crecimiento': crecimiento,
+            'sitios': sitios,
+        }
+
+    def reiniciar(self):
+        with self._lock:
+            self._tipos.clear()
+            self._etapas.clear()
+            self._instantaneas.clear()
+            self._crecimiento.clear()
+        if self.instrumentado and _PICO_POR_ETAPA:
+            tracemalloc.reset_peak()
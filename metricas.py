@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from cache_documentos import escribir_atomico
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# MÉTRICAS EN FORMATO PROMETHEUS
+# Cada proceso acumula contadores, histogramas y medidores en memoria y los vuelca cada pocos segundos a
+# su propio archivo JSON en un directorio compartido. /metrics suma los archivos de todos los procesos:
+# contadores e histogramas de todos (también de workers ya terminados, que se consolidan en un histórico),
+# medidores solo de los procesos vivos. Sin directorio, se expone únicamente el proceso actual.
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_BYTES = (1024, 4096, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _Definicion:
+    def __init__(self, tipo, nombre, ayuda, etiquetas, buckets=None):
+        self.tipo = tipo
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets) if buckets else None
+
+
+class Metricas:
+    def __init__(self, directorio=None, intervalo=2.0):
+        self.directorio = directorio or None
+        self.intervalo = intervalo
+        self._definiciones = {}
+        self._valores = {}
+        self._funciones = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._sucio = False
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    # Definición
+
+    def _definir(self, definicion):
+        self._definiciones[definicion.nombre] = definicion
+        self._valores.setdefault(definicion.nombre, {})
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        self._definir(_Definicion('counter', nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=()):
+        self._definir(_Definicion('gauge', nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, buckets=BUCKETS_SEGUNDOS, etiquetas=()):
+        self._definir(_Definicion('histogram', nombre, ayuda, etiquetas, buckets))
+
+    def medidor_funcion(self, nombre, ayuda, funcion):
+        # El valor se calcula en cada volcado: funcion() -> número (medidor sin etiquetas de este proceso)
+        self._definir(_Definicion('gauge', nombre, ayuda, ()))
+        self._funciones.append((nombre, funcion))
+
+    # Registro
+
+    def _clave(self, definicion, etiquetas):
+        return tuple(str(etiquetas.get(nombre, '')) for nombre in definicion.etiquetas)
+
+    def _proceso_actual(self):
+        # Tras un fork (gunicorn --preload) el hijo empieza de cero y con su propio hilo de volcado
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._nacimiento = time.time()
+            for valores in self._valores.values():
+                valores.clear()
+            if self.directorio:
+                threading.Thread(target=self._volcar_periodicamente, args=(pid,), daemon=True).start()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        definicion = self._definiciones[nombre]
+        clave = self._clave(definicion, etiquetas)
+        with self._lock:
+            self._proceso_actual()
+            valores = self._valores[nombre]
+            valores[clave] = valores.get(clave, 0) + valor
+            self._sucio = True
+
+    def observar(self, nombre, valor, **etiquetas):
+        definicion = self._definiciones[nombre]
+        clave = self._clave(definicion, etiquetas)
+        with self._lock:
+            self._proceso_actual()
+            valores = self._valores[nombre]
+            serie = valores.get(clave)
+            if serie is None:
+                # Conteo por bucket (no acumulado) + uno para +Inf, suma y cantidad
+                serie = valores[clave] = [0] * (len(definicion.buckets) + 1) + [0.0, 0]
+            serie[bisect_left(definicion.buckets, valor)] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+            self._sucio = True
+
+    @contextmanager
+    def en_curso(self, nombre, **etiquetas):
+        self.incrementar(nombre, 1, **etiquetas)
+        try:
+            yield
+        finally:
+            self.incrementar(nombre, -1, **etiquetas)
+
+    # Volcado y agregación entre procesos
+
+    def _instantanea(self):
+        with self._lock:
+            self._proceso_actual()
+            datos = {nombre: [[list(clave), valor] for clave, valor in valores.items()]
+                     for nombre, valores in self._valores.items()}
+            self._sucio = False
+        for nombre, funcion in self._funciones:
+            try:
+                datos[nombre] = [[[], funcion()]]
+            except Exception:
+                pass
+        return datos
+
+    def _ruta_proceso(self, pid):
+        return os.path.join(self.directorio, f'proceso-{pid}-{int(self._nacimiento * 1000)}.json')
+
+    def volcar(self):
+        if not self.directorio:
+            return
+        metricas = self._instantanea()
+        contenido = {'pid': os.getpid(), 'padre': os.getppid(), 'metricas': metricas}
+        try:
+            escribir_atomico(self._ruta_proceso(os.getpid()),
+                             json.dumps(contenido, separators=(',', ':')).encode('utf-8'))
+        except OSError:
+            pass
+
+    def _volcar_periodicamente(self, pid):
+        while os.getpid() == pid:
+            time.sleep(self.intervalo)
+            if self._sucio or self._funciones:
+                self.volcar()
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta, 'rb') as archivo:
+                return json.loads(archivo.read())
+        except (OSError, ValueError):
+            return None
+
+    def _sumar(self, total, metricas, incluir_medidores):
+        for nombre, series in metricas.items():
+            definicion = self._definiciones.get(nombre)
+            if definicion is None or (definicion.tipo == 'gauge' and not incluir_medidores):
+                continue
+            destino = total.setdefault(nombre, {})
+            for clave, valor in series:
+                clave = tuple(clave)
+                if isinstance(valor, list):
+                    anterior = destino.get(clave)
+                    destino[clave] = valor if anterior is None else [a + b for a, b in zip(anterior, valor)]
+                else:
+                    destino[clave] = destino.get(clave, 0) + valor
+
+    @contextmanager
+    def _bloqueo(self, modo):
+        # Lectura compartida y consolidación exclusiva: un scrape nunca ve un archivo ya sumado al histórico
+        # y a la vez el histórico anterior
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directorio, '.lock'), 'a+b') as lock:
+            fcntl.flock(lock, modo)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _consolidar(self, archivos):
+        # Los archivos de procesos terminados se suman al histórico de su padre (el maestro de gunicorn) y se
+        # borran; los de un maestro que ya no existe se descartan
+        if fcntl is None:
+            return
+        with self._bloqueo(fcntl.LOCK_EX):
+            for ruta, datos in archivos:
+                if not os.path.exists(ruta):
+                    continue
+                padre = datos.get('padre')
+                if _proceso_vivo(padre):
+                    ruta_historico = os.path.join(self.directorio, f'historico-{padre}.json')
+                    historico = self._leer(ruta_historico) or {'padre': padre, 'metricas': {}}
+                    total = {}
+                    self._sumar(total, historico['metricas'], False)
+                    self._sumar(total, datos['metricas'], False)
+                    historico['metricas'] = {nombre: [[list(c), v] for c, v in series.items()]
+                                             for nombre, series in total.items()}
+                    escribir_atomico(ruta_historico, json.dumps(historico, separators=(',', ':')).encode('utf-8'))
+                os.unlink(ruta)
+            for nombre in os.listdir(self.directorio):
+                if nombre.startswith('historico-'):
+                    padre = int(nombre[len('historico-'):-len('.json')])
+                    if not _proceso_vivo(padre):
+                        os.unlink(os.path.join(self.directorio, nombre))
+
+    def agregado(self):
+        if not self.directorio:
+            total = {}
+            self._sumar(total, self._instantanea(), True)
+            return total
+
+        self.volcar()
+        total = {}
+        terminados = []
+        with self._bloqueo(fcntl.LOCK_SH if fcntl else None):
+            self._leer_directorio(total, terminados)
+        if terminados:
+            try:
+                self._consolidar(terminados)
+            except OSError:
+                pass
+        return total
+
+    def _leer_directorio(self, total, terminados):
+        for nombre in sorted(os.listdir(self.directorio)):
+            if not nombre.endswith('.json'):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            datos = self._leer(ruta)
+            if datos is None:
+                continue
+            if nombre.startswith('historico-'):
+                if _proceso_vivo(datos.get('padre')):
+                    self._sumar(total, datos['metricas'], False)
+                continue
+            vivo = _proceso_vivo(datos.get('pid'))
+            if not vivo:
+                terminados.append((ruta, datos))
+                if not _proceso_vivo(datos.get('padre')):
+                    continue
+            self._sumar(total, datos['metricas'], vivo)
+
+    # Exposición
+
+    def exponer(self):
+        total = self.agregado()
+        lineas = []
+        for nombre, definicion in self._definiciones.items():
+            lineas.append(f'# HELP {nombre} {definicion.ayuda}')
+            lineas.append(f'# TYPE {nombre} {definicion.tipo}')
+            for clave, valor in sorted(total.get(nombre, {}).items()):
+                etiquetas = [f'{e}="{_escapar(v)}"' for e, v in zip(definicion.etiquetas, clave)]
+                if definicion.tipo != 'histogram':
+                    texto = '{' + ','.join(etiquetas) + '}' if etiquetas else ''
+                    lineas.append(f'{nombre}{texto} {_numero(valor)}')
+                    continue
+                acumulado = 0
+                for limite, cantidad in zip(definicion.buckets + (float('inf'),), valor):
+                    acumulado += cantidad
+                    texto = ','.join(etiquetas + [f'le="{_numero(limite)}"'])
+                    lineas.append(f'{nombre}_bucket{{{texto}}} {acumulado}')
+                texto = '{' + ','.join(etiquetas) + '}' if etiquetas else ''
+                lineas.append(f'{nombre}_sum{texto} {_numero(valor[-2])}')
+                lineas.append(f'{nombre}_count{texto} {valor[-1]}')
+        return '\n'.join(lineas) + '\n'
@@ -0,0 +1,182 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from cache_documentos import escribir_atomico
+
+# PERFILES DE PETICIONES
+# Una petición perfilada corre bajo cProfile (se guarda como .pstats) y a la vez la muestrea un hilo que
+# cada pocos milisegundos lee la pila del hilo de la petición (se guarda como pilas colapsadas .folded, el
+# formato de flamegraph.pl y speedscope). El muestreo solo, sin cProfile, es lo bastante barato para
+# aplicarlo a todas las peticiones y conservar únicamente las que superan un umbral de latencia. La
+# carpeta guarda como máximo max_perfiles perfiles; los más antiguos se borran.
+
+FORMATOS = {
+    'pstats': 'application/octet-stream',
+    'folded': 'text/plain; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def _nombre_marco(marco):
+    codigo = marco.f_code
+    return f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}'
+
+
+class _Muestreador:
+    # Un solo hilo muestrea las pilas de todos los hilos registrados; duerme mientras no haya ninguno
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._pilas = {}
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Event()
+        self._hilo = None
+
+    def registrar(self, id_hilo):
+        pilas = Counter()
+        with self._lock:
+            self._pilas[id_hilo] = pilas
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+                self._hilo.start()
+            self._hay_trabajo.set()
+        return pilas
+
+    def quitar(self, id_hilo):
+        with self._lock:
+            self._pilas.pop(id_hilo, None)
+            if not self._pilas:
+                self._hay_trabajo.clear()
+
+    def _muestrear(self):
+        while True:
+            self._hay_trabajo.wait()
+            time.sleep(self.intervalo)
+            with self._lock:
+                registrados = dict(self._pilas)
+            marcos = sys._current_frames()
+            for id_hilo, pilas in registrados.items():
+                marco = marcos.get(id_hilo)
+                nombres = []
+                while marco is not None:
+                    nombres.append(_nombre_marco(marco))
+                    marco = marco.f_back
+                if nombres:
+                    pilas[';'.join(reversed(nombres))] += 1
+            del marcos
+
+
+class _Sesion:
+    def __init__(self, motivo, perfil, pilas):
+        self.id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self.motivo = motivo
+        self.perfil = perfil
+        self.pilas = pilas
+        self.inicio = time.perf_counter()
+
+
+class Perfilador:
+    def __init__(self, directorio, max_perfiles=50, intervalo=0.005):
+        self.directorio = directorio
+        self.max_perfiles = max_perfiles
+        self._muestreador = _Muestreador(intervalo)
+        os.makedirs(directorio, exist_ok=True)
+
+    def iniciar(self, motivo=None):
+        # motivo: 'cabecera' o 'muestreo' activa cProfile; None solo muestrea, por si la petición resulta lenta
+        pilas = self._muestreador.registrar(threading.get_ident())
+        perfil = None
+        if motivo is not None:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Ya hay otro perfilador activo en este hilo
+                perfil = None
+        return _Sesion(motivo, perfil, pilas)
+
+    def terminar(self, sesion, metadatos, umbral=None):
+        # Devuelve el id del perfil guardado, o None si no correspondía guardarlo
+        segundos = time.perf_counter() - sesion.inicio
+        if sesion.perfil is not None:
+            sesion.perfil.disable()
+        self._muestreador.quitar(threading.get_ident())
+
+        motivo = sesion.motivo
+        if motivo is None:
+            if not umbral or segundos < umbral:
+                return None
+            motivo = 'lento'
+
+        datos = dict(metadatos, id=sesion.id, motivo=motivo, segundos=round(segundos, 4),
+                     fecha=time.time(), pid=os.getpid(), muestras=sum(sesion.pilas.values()),
+                     formatos=['json', 'folded'])
+        try:
+            if sesion.perfil is not None:
+                sesion.perfil.create_stats()
+                escribir_atomico(self._ruta(sesion.id, 'pstats'), marshal.dumps(sesion.perfil.stats))
+                datos['formatos'] += ['pstats', 'txt']
+            colapsadas = ''.join(f'{pila} {n}\n' for pila, n in sesion.pilas.most_common())
+            escribir_atomico(self._ruta(sesion.id, 'folded'), colapsadas.encode('utf-8'))
+            escribir_atomico(self._ruta(sesion.id, 'json'), json.dumps(datos, ensure_ascii=False).encode('utf-8'))
+        except OSError:
+            return None
+        self._podar()
+        return sesion.id
+
+    def _ruta(self, id_perfil, formato):
+        return os.path.join(self.directorio, f'{id_perfil}.{formato}')
+
+    def _podar(self):
+        try:
+            ids = sorted(nombre[:-len('.json')] for nombre in os.listdir(self.directorio) if nombre.endswith('.json'))
+        except OSError:
+            return
+        for id_perfil in ids[:max(0, len(ids) - self.max_perfiles)]:
+            for formato in FORMATOS:
+                try:
+                    os.unlink(self._ruta(id_perfil, formato))
+                except OSError:
+                    pass
+
+    def listar(self):
+        perfiles = []
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return perfiles
+        for nombre in sorted(nombres, reverse=True):
+            if not nombre.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), 'rb') as archivo:
+                    perfiles.append(json.loads(archivo.read()))
+            except (OSError, ValueError):
+                continue
+        return perfiles
+
+    def leer(self, id_perfil, formato):
+        # Contenido del perfil en el formato pedido; None si no existe ('txt' es el reporte de pstats)
+        if formato not in FORMATOS or not id_perfil.replace('-', '').isalnum():
+            return None
+        if formato == 'txt':
+            ruta = self._ruta(id_perfil, 'pstats')
+            if not os.path.exists(ruta):
+                return None
+            salida = io.StringIO()
+            pstats.Stats(ruta, stream=salida).strip_dirs().sort_stats('cumulative').print_stats(60)
+            return salida.getvalue().encode('utf-8')
+        try:
+            with open(self._ruta(id_perfil, formato), 'rb') as archivo:
+                return archivo.read()
+        except OSError:
+            return None
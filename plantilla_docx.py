@@ -0,0 +1,182 @@
+import re
+import threading
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+# MOTOR DE PLANTILLA DOCX
+# El documento se construye una sola vez con python-docx usando marcas en lugar de los textos
+# variables; el word/document.xml resultante se parte en trozos fijos y slots. Cada petición
+# solo rellena los slots con texto escapado y añade document.xml a un zip con el resto de
+# partes (estilos, tema, numeración...) ya comprimidas.
+# Un slot de filas ocupa una fila entera de tabla en el esqueleto y se reemplaza por XML de filas ya
+# armado (bytes), así una tabla puede tener tantas filas como haga falta sin otro esqueleto.
+# Un documento ya armado se puede volver a separar en el XML de cada slot, para editar solo algunos.
+
+MIEMBRO_DOCUMENTO = 'word/document.xml'
+FECHA_ZIP = (1980, 1, 1, 0, 0, 0)
+
+_PATRON_SLOT = re.compile(rb'<w:t>@@SLOT:([A-Za-z0-9_]+)@@</w:t>')
+_SEPARADORES = re.compile(r'(\t|\n|\r)')
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def marca_slot(nombre):
+    return f'@@SLOT:{nombre}@@'
+
+
+class _Marcas(dict):
+    # Devuelve una marca para cualquier clave que pida el constructor del documento
+    def __missing__(self, clave):
+        return marca_slot(clave)
+
+
+def contenido_run(texto):
+    # Reproduce lo que hace python-docx al asignar run.text: \t -> w:tab, \n y \r -> w:br
+    if not isinstance(texto, str):
+        texto = str(texto)
+    if _CARACTERES_INVALIDOS.search(texto):
+        raise ValueError('El texto contiene caracteres no válidos para XML')
+
+    partes = []
+    for trozo in _SEPARADORES.split(texto):
+        if trozo == '\t':
+            partes.append('<w:tab/>')
+        elif trozo == '\n' or trozo == '\r':
+            partes.append('<w:br/>')
+        elif trozo:
+            if len(trozo.strip()) < len(trozo):
+                partes.append(f'<w:t xml:space="preserve">{escape(trozo)}</w:t>')
+            else:
+                partes.append(f'<w:t>{escape(trozo)}</w:t>')
+    return ''.join(partes).encode('utf-8')
+
+
+class Esqueleto:
+    def __init__(self, documento_xml, zip_base, external_attr, filas=()):
+        self.trozos = _PATRON_SLOT.split(documento_xml)
+        self.slots = [nombre.decode('ascii') for nombre in self.trozos[1::2]]
+        self.filas = frozenset(filas)
+        for i, nombre in enumerate(self.slots):
+            if nombre in self.filas:
+                # La marca ocupa toda su fila: se recorta desde <w:tr> hasta </w:tr>
+                antes, despues = self.trozos[2 * i], self.trozos[2 * i + 2]
+                self.trozos[2 * i] = antes[:antes.rindex(b'<w:tr>')]
+                self.trozos[2 * i + 2] = despues[despues.index(b'</w:tr>') + len(b'</w:tr>'):]
+        self.zip_base = zip_base
+        self.external_attr = external_attr
+
+    def emitir(self, nombre, valor):
+        return valor if nombre in self.filas else contenido_run(valor)
+
+    def unir(self, partes):
+        # partes: XML de cada slot, en el orden de self.slots
+        trozos = list(self.trozos)
+        trozos[1::2] = partes
+        return b''.join(trozos)
+
+    def separar(self, documento_xml):
+        # Inverso de unir(): el XML de cada slot de un document.xml armado con este esqueleto. Los trozos
+        # fijos siempre tienen etiquetas que el texto escapado de un slot no puede contener
+        ultimo = self.trozos[-1]
+        if not documento_xml.startswith(self.trozos[0]) or not documento_xml.endswith(ultimo):
+            raise ValueError('El documento no corresponde al esqueleto')
+        partes = []
+        inicio = len(self.trozos[0])
+        for i in range(len(self.slots)):
+            siguiente = self.trozos[2 * i + 2]
+            if i == len(self.slots) - 1:
+                fin = len(documento_xml) - len(ultimo)
+            else:
+                fin = documento_xml.find(siguiente, inicio)
+            if fin < inicio:
+                raise ValueError('El documento no corresponde al esqueleto')
+            partes.append(documento_xml[inicio:fin])
+            inicio = fin + len(siguiente)
+        return partes
+
+    def documento_xml(self, textos):
+        return self.unir([self.emitir(nombre, textos[nombre]) for nombre in self.slots])
+
+    def empaquetar(self, documento_xml):
+        # writestr modifica el ZipInfo, así que cada documento usa uno nuevo
+        info = zipfile.ZipInfo(MIEMBRO_DOCUMENTO, date_time=FECHA_ZIP)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = self.external_attr
+        salida = BytesIO(self.zip_base)
+        with zipfile.ZipFile(salida, 'a', compression=zipfile.ZIP_DEFLATED) as paquete:
+            paquete.writestr(info, documento_xml)
+        return salida.getvalue()
+
+    def renderizar(self, textos):
+        return self.empaquetar(self.documento_xml(textos))
+
+
+def leer_documento_xml(archivo):
+    with zipfile.ZipFile(BytesIO(archivo)) as paquete:
+        return paquete.read(MIEMBRO_DOCUMENTO)
+
+
+def compilar_esqueleto(doc, filas=()):
+    original = BytesIO()
+    doc.save(original)
+    original.seek(0)
+
+    base = BytesIO()
+    documento_xml = None
+    external_attr = 0
+    with zipfile.ZipFile(original) as entrada, \
+            zipfile.ZipFile(base, 'w', compression=zipfile.ZIP_DEFLATED) as paquete:
+        for info in entrada.infolist():
+            if info.filename == MIEMBRO_DOCUMENTO:
+                documento_xml = entrada.read(info)
+                external_attr = info.external_attr
+                continue
+            copia = zipfile.ZipInfo(info.filename, date_time=FECHA_ZIP)
+            copia.compress_type = zipfile.ZIP_DEFLATED
+            copia.external_attr = info.external_attr
+            paquete.writestr(copia, entrada.read(info))
+
+    return Esqueleto(documento_xml, base.getvalue(), external_attr, filas)
+
+
+class MotorPlantilla:
+    def __init__(self, construir, filas=()):
+        # construir(textos, num_criterios) -> docx.Document
+        # filas: slots que el constructor pone solos en una fila de tabla y reciben XML de filas
+        self._construir = construir
+        self._filas = filas
+        self._esqueletos = {}
+        self._lock = threading.Lock()
+
+    def esqueleto(self, num_criterios):
+        esqueleto = self._esqueletos.get(num_criterios)
+        if esqueleto is None:
+            with self._lock:
+                esqueleto = self._esqueletos.get(num_criterios)
+                if esqueleto is None:
+                    doc = self._construir(_Marcas(), num_criterios)
+                    esqueleto = compilar_esqueleto(doc, self._filas)
+                    self._esqueletos[num_criterios] = esqueleto
+        return esqueleto
+
+    def renderizar(self, textos, num_criterios):
+        return self.esqueleto(num_criterios).renderizar(textos)
+
+    def reemitir(self, archivo, num_criterios_anterior, textos, num_criterios):
+        # Arma un documento a partir de otro ya armado con este motor (archivo: su .docx): solo se emiten los
+        # slots de textos; los demás conservan el XML que tenían. Lanza ValueError si el archivo no encaja
+        anterior = self.esqueleto(num_criterios_anterior)
+        try:
+            xml_anterior = leer_documento_xml(archivo)
+        except (zipfile.BadZipFile, KeyError):
+            raise ValueError('El archivo no es un documento de este motor')
+        partes = dict(zip(anterior.slots, anterior.separar(xml_anterior)))
+        esqueleto = self.esqueleto(num_criterios)
+        faltantes = [nombre for nombre in esqueleto.slots if nombre not in textos and nombre not in partes]
+        if faltantes:
+            raise ValueError(f'Faltan textos para los slots {", ".join(faltantes)}')
+        return esqueleto.empaquetar(esqueleto.unir([
+            esqueleto.emitir(nombre, textos[nombre]) if nombre in textos else partes[nombre]
+            for nombre in esqueleto.slots
+        ]))
@@ -0,0 +1,85 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+from cache_ia import normalizar
+
+# ÍNDICE DE RECUPERACIÓN DE TEMAS
+# TF-IDF sobre trigramas de caracteres (sin tildes ni mayúsculas). Cada tema, competencia y
+# capacidad del currículo es una fila de la matriz; el puntaje de una entrada (área, ciclo) es el
+# de su fila más parecida a la consulta, así una consulta corta no se diluye en textos largos.
+
+
+def trigramas(texto):
+    texto = f'  {normalizar(texto)} '
+    return [texto[i:i + 3] for i in range(len(texto) - 2)]
+
+
+class IndiceTemas:
+    def __init__(self, entradas):
+        # entradas: lista de ((area, ciclo), [textos de la entrada])
+        self.claves = []
+        filas = []
+        inicios = []
+        for clave, textos in entradas:
+            textos = [texto for texto in textos if texto]
+            if not textos:
+                continue
+            self.claves.append(clave)
+            inicios.append(len(filas))
+            filas.extend(Counter(trigramas(texto)) for texto in textos)
+
+        vocabulario = {}
+        for conteo in filas:
+            for trigrama in conteo:
+                vocabulario.setdefault(trigrama, len(vocabulario))
+        self.vocabulario = vocabulario
+
+        frecuencias = np.zeros(len(vocabulario), dtype=np.float32)
+        for conteo in filas:
+            for trigrama in conteo:
+                frecuencias[vocabulario[trigrama]] += 1
+        self.idf = (np.log((1 + len(filas)) / (1 + frecuencias)) + 1).astype(np.float32)
+
+        matriz = np.zeros((len(filas), len(vocabulario)), dtype=np.float32)
+        for i, conteo in enumerate(filas):
+            for trigrama, n in conteo.items():
+                matriz[i, vocabulario[trigrama]] = 1 + math.log(n)
+        matriz *= self.idf
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        self.matriz = matriz / np.maximum(normas, 1e-12)
+        self.inicios = np.array(inicios, dtype=np.intp)
+
+    @classmethod
+    def desde_curriculo(cls, curriculo):
+        entradas = []
+        for entrada in curriculo:
+            textos = list(entrada.temas)
+            textos.append(entrada.competencia)
+            textos.extend(entrada.capacidades)
+            entradas.append(((entrada.area, entrada.ciclo), textos))
+        return cls(entradas)
+
+    def vector(self, texto):
+        vector = np.zeros(len(self.vocabulario), dtype=np.float32)
+        for trigrama, n in Counter(trigramas(texto)).items():
+            indice = self.vocabulario.get(trigrama)
+            if indice is not None:
+                vector[indice] = 1 + math.log(n)
+        vector *= self.idf
+        norma = np.linalg.norm(vector)
+        return vector / norma if norma > 0 else vector
+
+    def buscar(self, consulta, ciclo=None, k=3):
+        # Devuelve [((area, ciclo), puntaje), ...] de mayor a menor
+        if not self.claves:
+            return []
+        puntajes = np.maximum.reduceat(self.matriz @ self.vector(consulta), self.inicios)
+        if ciclo is not None:
+            # Si el ciclo existe en el currículo, solo se comparan entradas de ese ciclo
+            mascara = np.array([clave[1] == ciclo for clave in self.claves])
+            if mascara.any():
+                puntajes = np.where(mascara, puntajes, -1.0)
+        orden = np.argsort(-puntajes)[:k]
+        return [(self.claves[i], float(puntajes[i])) for i in orden if puntajes[i] > 0]
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# LLAMADAS A LA IA CON LATENCIA ACOTADA
+# - Presupuesto: límite total de tiempo para todas las llamadas de una petición; cada llamada usa el
+#   timeout por llamada recortado a lo que quede del presupuesto.
+# - Cobertura (hedging): si la llamada no respondió tras el retraso configurado (~p95 normal), se lanza
+#   una segunda idéntica y se usa la primera que responda bien.
+# - Interruptor (circuit breaker): si la tasa reciente de errores y timeouts supera el umbral, las
+#   llamadas se rechazan sin tocar la red durante el enfriamiento; luego una sola llamada de prueba
+#   decide si se vuelve a cerrar.
+
+_limite = ContextVar('limite_ia', default=None)
+
+
+class InterruptorAbierto(Exception):
+    pass
+
+
+class PresupuestoAgotado(Exception):
+    pass
+
+
+@contextmanager
+def presupuesto(segundos):
+    # Anidado, se respeta el límite más cercano
+    limite = time.monotonic() + segundos
+    actual = _limite.get()
+    token = _limite.set(limite if actual is None else min(actual, limite))
+    try:
+        yield
+    finally:
+        _limite.reset(token)
+
+
+def restante(limite=None):
+    # Segundos que quedan del presupuesto (el dado o el de la petición actual); None si no hay presupuesto
+    limite = limite if limite is not None else _limite.get()
+    return None if limite is None else limite - time.monotonic()
+
+
+def tiempo_llamada(timeout, limite=None):
+    queda = restante(limite)
+    if queda is None:
+        return timeout
+    if queda <= 0.05:
+        raise PresupuestoAgotado()
+    return min(timeout, queda)
+
+
+class Interruptor:
+    def __init__(self, umbral=0.5, minimo=10, ventana_segundos=60, enfriamiento_segundos=30, registro=None):
+        # umbral: fracción de fallas (0 lo desactiva); minimo: llamadas en la ventana antes de evaluarla
+        self.umbral = umbral
+        self.minimo = minimo
+        self.ventana_segundos = ventana_segundos
+        self.enfriamiento_segundos = enfriamiento_segundos
+        self.registro = registro or logging.getLogger(__name__)
+        self.estado = 'cerrado'
+        self._resultados = deque()
+        self._abierto_desde = 0.0
+        self._sondeo_en_curso = False
+        self._lock = threading.Lock()
+        self.aperturas = 0
+
+    def _cambiar(self, estado, detalle):
+        self.registro.warning('Interruptor de la IA: %s -> %s (%s)', self.estado, estado, detalle)
+        self.estado = estado
+
+    def abierto(self):
+        # Sin efectos: True mientras dura el enfriamiento, para saltarse la IA sin armar la consulta
+        if not self.umbral:
+            return False
+        with self._lock:
+            return self.estado == 'abierto' and time.monotonic() - self._abierto_desde < self.enfriamiento_segundos
+
+    def permitir(self):
+        if not self.umbral:
+            return True
+        with self._lock:
+            if self.estado == 'cerrado':
+                return True
+            if self.estado == 'abierto':
+                if time.monotonic() - self._abierto_desde < self.enfriamiento_segundos:
+                    return False
+                self._cambiar('semiabierto', 'fin del enfriamiento, se prueba una llamada')
+            if self._sondeo_en_curso:
+                return False
+            self._sondeo_en_curso = True
+            return True
+
+    def registrar(self, exito):
+        # exito None: la llamada se canceló sin resultado; solo libera la llamada de prueba
+        if not self.umbral:
+            return
+        ahora = time.monotonic()
+        with self._lock:
+            if exito is None:
+                self._sondeo_en_curso = False
+                return
+            if self.estado == 'semiabierto':
+                self._sondeo_en_curso = False
+                if exito:
+                    self._resultados.clear()
+                    self._cambiar('cerrado', 'la llamada de prueba respondió')
+                else:
+                    self._abierto_desde = ahora
+                    self.aperturas += 1
+                    self._cambiar('abierto', 'la llamada de prueba falló')
+                return
+            if self.estado == 'abierto':
+                return
+
+            self._resultados.append((ahora, exito))
+            while self._resultados and ahora - self._resultados[0][0] > self.ventana_segundos:
+                self._resultados.popleft()
+            fallas = sum(1 for _, ok in self._resultados if not ok)
+            if len(self._resultados) >= self.minimo and fallas / len(self._resultados) >= self.umbral:
+                self._abierto_desde = ahora
+                self.aperturas += 1
+                self._cambiar('abierto', f'{fallas} fallas en {len(self._resultados)} llamadas recientes')
+                self._resultados.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'estado': self.estado if self.umbral else 'desactivado',
+                'aperturas': self.aperturas,
+                'llamadas_en_ventana': len(self._resultados),
+                'fallas_en_ventana': sum(1 for _, ok in self._resultados if not ok),
+            }
+
+
+class LlamadorIA:
+    def __init__(self, interruptor, timeout_segundos=20, cobertura_segundos=0, contar=None, registro=None):
+        # contar(evento): 'coberturas' o 'coberturas_ganadas'
+        self.interruptor = interruptor
+        self.timeout_segundos = timeout_segundos
+        self.cobertura_segundos = cobertura_segundos
+        self.contar = contar or (lambda evento: None)
+        self.registro = registro or logging.getLogger(__name__)
+
+    def llamar(self, funcion, limite=None, **argumentos):
+        # funcion(request_timeout=..., **argumentos); limite: instante (monotonic) en que vence el presupuesto,
+        # si no se usa el de la petición actual
+        if not self.interruptor.permitir():
+            raise InterruptorAbierto()
+        timeout = tiempo_llamada(self.timeout_segundos, limite)
+        if not self.cobertura_segundos or argumentos.get('stream') or timeout <= self.cobertura_segundos:
+            return self._intento(funcion, timeout, argumentos)
+        return self._con_cobertura(funcion, timeout, limite, argumentos)
+
+    def _intento(self, funcion, timeout, argumentos):
+        try:
+            resultado = funcion(request_timeout=timeout, **argumentos)
+        except Exception:
+            self.interruptor.registrar(False)
+            raise
+        self.interruptor.registrar(True)
+        return resultado
+
+    def _con_cobertura(self, funcion, timeout, limite, argumentos):
+        listo = threading.Event()
+        lock = threading.Lock()
+        estado = {'resultado': None, 'ganador': None, 'errores': [], 'lanzados': 0}
+
+        def intento(numero, timeout_intento):
+            try:
+                resultado = self._intento(funcion, timeout_intento, argumentos)
+            except Exception as e:
+                with lock:
+                    estado['errores'].append(e)
+                    if len(estado['errores']) == estado['lanzados'] and estado['ganador'] is None:
+                        listo.set()
+                return
+            with lock:
+                if estado['ganador'] is None:
+                    estado['ganador'] = numero
+                    estado['resultado'] = resultado
+                    listo.set()
+
+        def lanzar(numero, timeout_intento):
+            with lock:
+                estado['lanzados'] += 1
+            threading.Thread(target=intento, args=(numero, timeout_intento), daemon=True).start()
+
+        inicio = time.monotonic()
+        lanzar(1, timeout)
+        if not listo.wait(self.cobertura_segundos):
+            queda = timeout - (time.monotonic() - inicio)
+            if queda > 0.05:
+                self.contar('coberturas')
+                lanzar(2, queda)
+        # Cada intento termina a más tardar en su timeout
+        listo.wait(timeout + 1)
+
+        with lock:
+            if estado['ganador'] is None:
+                if estado['errores'] and len(estado['errores']) == estado['lanzados']:
+                    raise estado['errores'][-1]
+                raise PresupuestoAgotado()
+            if estado['ganador'] == 2:
+                self.contar('coberturas_ganadas')
+                self.registro.info('Cobertura de la IA: la segunda llamada respondió primero (%.2f s)',
+                                   time.monotonic() - inicio)
+            return estado['resultado']
+
+    # Variante asíncrona: funcion es una corrutina (openai.ChatCompletion.acreate) y la cobertura es otra
+    # tarea; la que pierde se cancela
+
+    async def allamar(self, funcion, limite=None, **argumentos):
+        if not self.interruptor.permitir():
+            raise InterruptorAbierto()
+        timeout = tiempo_llamada(self.timeout_segundos, limite)
+        if not self.cobertura_segundos or argumentos.get('stream') or timeout <= self.cobertura_segundos:
+            return await self._aintento(funcion, timeout, argumentos)
+
+        inicio = time.monotonic()
+        primera = asyncio.ensure_future(self._aintento(funcion, timeout, argumentos))
+        hechas, _ = await asyncio.wait({primera}, timeout=self.cobertura_segundos)
+        queda = timeout - (time.monotonic() - inicio)
+        if hechas or queda <= 0.05:
+            return await primera
+
+        self.contar('coberturas')
+        segunda = asyncio.ensure_future(self._aintento(funcion, queda, argumentos))
+        pendientes = {primera, segunda}
+        error = None
+        try:
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is not None:
+                        error = tarea.exception()
+                        continue
+                    if tarea is segunda:
+                        self.contar('coberturas_ganadas')
+                        self.registro.info('Cobertura de la IA: la segunda llamada respondió primero (%.2f s)',
+                                           time.monotonic() - inicio)
+                    return tarea.result()
+            raise error
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+    async def _aintento(self, funcion, timeout, argumentos):
+        try:
+            resultado = await funcion(request_timeout=timeout, **argumentos)
+        except asyncio.CancelledError:
+            self.interruptor.registrar(None)
+            raise
+        except Exception:
+            self.interruptor.registrar(False)
+            raise
+        self.interruptor.registrar(True)
+        return resultado
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from cache_documentos import escribir_atomico
+
+# REVISIONES DE DOCUMENTOS
+# Cada documento generado queda registrado con las entradas que lo produjeron (ciclo, área, tema,
+# contenido y nómina) bajo su id de revisión, que es la misma clave de la cache de documentos: las
+# mismas entradas dan siempre la misma revisión. Una edición parte de esas entradas, sin volver a
+# consultar el currículo ni la IA. En memoria se guardan las últimas; en disco, visibles para todos los
+# workers, hasta que vencen.
+
+_PATRON_ID = re.compile(r'[0-9a-f]{64}')
+
+
+class AlmacenRevisiones:
+    def __init__(self, directorio=None, max_memoria=1000, ttl_segundos=30 * 24 * 3600, escrituras_por_poda=100):
+        self.directorio = directorio
+        self.max_memoria = max_memoria
+        self.ttl_segundos = ttl_segundos
+        self.escrituras_por_poda = escrituras_por_poda
+        self._memoria = OrderedDict()
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, id_revision):
+        return os.path.join(self.directorio, id_revision[:2], f'{id_revision}.json')
+
+    def _recordar(self, id_revision, entradas):
+        with self._lock:
+            self._memoria[id_revision] = entradas
+            self._memoria.move_to_end(id_revision)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def registrar(self, id_revision, entradas):
+        # entradas: dict serializable en JSON; una revisión ya registrada en este worker no se reescribe
+        with self._lock:
+            if id_revision in self._memoria:
+                self._memoria.move_to_end(id_revision)
+                return
+        self._recordar(id_revision, entradas)
+        if self.directorio:
+            try:
+                escribir_atomico(self._ruta(id_revision),
+                                 json.dumps(entradas, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            except OSError:
+                return
+            self._quizas_podar()
+
+    def obtener(self, id_revision):
+        if not _PATRON_ID.fullmatch(id_revision):
+            return None
+        with self._lock:
+            entradas = self._memoria.get(id_revision)
+            if entradas is not None:
+                self._memoria.move_to_end(id_revision)
+                return entradas
+
+        if not self.directorio:
+            return None
+        try:
+            ruta = self._ruta(id_revision)
+            with open(ruta, 'rb') as archivo:
+                entradas = json.loads(archivo.read())
+            # La fecha de modificación hace de "último uso" para la poda
+            os.utime(ruta)
+        except (OSError, ValueError):
+            return None
+        self._recordar(id_revision, entradas)
+        return entradas
+
+    def _quizas_podar(self):
+        with self._lock:
+            self._escrituras += 1
+            if self._escrituras < self.escrituras_por_poda:
+                return
+            self._escrituras = 0
+        self.podar()
+
+    def podar(self):
+        limite = time.time() - self.ttl_segundos
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    if os.stat(ruta).st_mtime < limite:
+                        os.unlink(ruta)
+                except OSError:
+                    pass
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import queue
+import threading
+
+from trabajos import ColaLlena
+
+# SERVICIO DE RENDER EN PROCESOS
+# El constructor python-docx es CPU puro y retiene el GIL: corrido en un worker con hilos (o en el
+# servidor asíncrono) frena todas las demás peticiones del proceso. El servicio lo corre en procesos
+# aparte, lanzados desde un forkserver con los módulos ya importados y calentados (calentar() arma un
+# documento de prueba antes de aceptar trabajos). Cada proceso atiende un trabajo a la vez por su pipe:
+# recibe solo los argumentos (contenido y nómina) y devuelve los bytes del .docx. Tras max_trabajos se
+# reemplaza por uno nuevo, para acotar lo que crece la memoria; con todos ocupados y max_en_cola
+# esperando, renderizar() rechaza con ColaLlena.
+
+# Tiempo máximo esperando un proceso libre (solo se agota si los procesos no logran arrancar)
+ESPERA_PROCESO_SEGUNDOS = 120
+
+
+def _servir(conexion, funcion, calentar):
+    if calentar is not None:
+        calentar()
+    conexion.send('listo')
+    while True:
+        try:
+            argumentos = conexion.recv()
+        except EOFError:
+            return
+        if argumentos is None:
+            return
+        try:
+            respuesta = ('ok', funcion(*argumentos))
+        except Exception as e:
+            respuesta = ('error', f'{type(e).__name__}: {e}')
+        conexion.send(respuesta)
+
+
+class _Proceso:
+    def __init__(self, proceso, conexion):
+        self.proceso = proceso
+        self.conexion = conexion
+        self.trabajos = 0
+
+
+class ServicioRender:
+    def __init__(self, funcion, procesos=2, max_trabajos=500, max_en_cola=32, calentar=None, precargar=()):
+        # funcion(*argumentos) -> bytes y calentar() deben poder importarse por nombre desde el proceso hijo
+        self.funcion = funcion
+        self.procesos = procesos
+        self.max_trabajos = max_trabajos
+        self.max_en_cola = max_en_cola
+        self.calentar = calentar
+        # forkserver: los procesos no heredan los hilos ni los locks del worker que los crea
+        self._contexto = multiprocessing.get_context('forkserver')
+        self._contexto.set_forkserver_preload(list(precargar))
+        self._lock = threading.Lock()
+        self._pid = None
+        self.contadores = {'trabajos': 0, 'rechazados': 0, 'reciclados': 0, 'caidos': 0}
+
+    def _iniciar(self):
+        # Los procesos se lanzan con el primer trabajo de cada worker (no en el maestro de gunicorn --preload)
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._libres = queue.Queue()
+            self._pendientes = 0
+        for _ in range(self.procesos):
+            self._lanzar()
+
+    def _lanzar(self):
+        padre, hijo = self._contexto.Pipe()
+        proceso = self._contexto.Process(target=_servir, args=(hijo, self.funcion, self.calentar), daemon=True)
+        proceso.start()
+        hijo.close()
+
+        def esperar_calentamiento():
+            # Solo entra a la rotación cuando terminó de calentar
+            try:
+                padre.recv()
+            except (EOFError, OSError):
+                self._contar('caidos')
+                padre.close()
+                proceso.join()
+                return
+            self._libres.put(_Proceso(proceso, padre))
+
+        threading.Thread(target=esperar_calentamiento, daemon=True).start()
+
+    def _retirar(self, proceso):
+        try:
+            proceso.conexion.send(None)
+        except OSError:
+            pass
+        proceso.conexion.close()
+        threading.Thread(target=proceso.proceso.join, daemon=True).start()
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def renderizar(self, *argumentos):
+        self._iniciar()
+        with self._lock:
+            if self._pendientes >= self.procesos + self.max_en_cola:
+                self.contadores['rechazados'] += 1
+                raise ColaLlena()
+            self._pendientes += 1
+        try:
+            # Si el proceso murió a mitad del trabajo (por ejemplo, sin memoria) se reintenta una vez en otro
+            for _ in range(2):
+                try:
+                    proceso = self._libres.get(timeout=ESPERA_PROCESO_SEGUNDOS)
+                except queue.Empty:
+                    raise RuntimeError('No hay procesos de render disponibles')
+                try:
+                    proceso.conexion.send(argumentos)
+                    estado, valor = proceso.conexion.recv()
+                    break
+                except (EOFError, OSError):
+                    self._contar('caidos')
+                    self._retirar(proceso)
+                    self._lanzar()
+            else:
+                raise RuntimeError('El proceso de render terminó inesperadamente')
+
+            proceso.trabajos += 1
+            self._contar('trabajos')
+            if proceso.trabajos >= self.max_trabajos:
+                self._contar('reciclados')
+                self._retirar(proceso)
+                self._lanzar()
+            else:
+                self._libres.put(proceso)
+            if estado == 'error':
+                raise RuntimeError(valor)
+            return valor
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def estadisticas(self):
+        with self._lock:
+            iniciado = self._pid == os.getpid()
+            return dict(self.contadores,
+                        procesos=self.procesos,
+                        libres=self._libres.qsize() if iniciado else 0,
+                        pendientes=self._pendientes if iniciado else 0)
@@ -0,0 +1,467 @@
+import argparse
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp import web
+from werkzeug.http import parse_etags
+
+import app as prototipo
+from esquema_ia import CAMPOS_CONTENIDO, FUNCION_CONTENIDO, funcion_contenido, tokens_maximos, validar_contenido
+from cache_ia import clave_ia
+from deduplicacion import SinResultado
+from resiliencia_ia import presupuesto
+from admision import Rechazada, ip_cliente
+
+# SERVIDOR ASÍNCRONO (asyncio + aiohttp)
+# Alternativa a gunicorn app:app para cuando casi todo el tiempo de cada petición es espera a la IA: un
+# solo proceso atiende cientos de /generar simultáneos, cada uno como una corrutina que espera a la IA
+# por un pool de conexiones keep-alive (openai.ChatCompletion.acreate) en lugar de ocupar un hilo. El
+# documento se arma en un pool de hilos acotado. Las demás rutas (página, currículo, trabajos, stream,
+# admin, métricas) son las de app.py, servidas por un puente WSGI que corre la app Flask en otro pool.
+#
+#   python servidor_async.py --puerto 8000
+#   gunicorn servidor_async:crear_aplicacion -k aiohttp.GunicornWebWorker -w 2
+
+# Generaciones simultáneas por proceso; sobre ese número /generar responde 503 (salvo las que tienen entrada en
+# el currículo, que pasan siempre)
+ASYNC_MAX_EN_CURSO = int(os.environ.get('ASYNC_MAX_EN_CURSO', '500'))
+# Conexiones abiertas a la IA por proceso (las demás consultas esperan turno dentro de su presupuesto)
+IA_CONEXIONES = int(os.environ.get('IA_CONEXIONES', '100'))
+# Hilos para armar documentos y para el puente hacia la app Flask
+ASYNC_RENDER_HILOS = int(os.environ.get('ASYNC_RENDER_HILOS', '4'))
+ASYNC_WSGI_HILOS = int(os.environ.get('ASYNC_WSGI_HILOS', '8'))
+ASYNC_MAX_CUERPO_MB = int(os.environ.get('ASYNC_MAX_CUERPO_MB', '10'))
+
+metricas = prototipo.metricas
+contar_ia = prototipo.contar_ia
+
+# Consultas a la IA en curso en este proceso, por clave normalizada del tema
+_consultas_en_curso = {}
+
+
+# IA sin bloquear: mismas etapas que generar_contenido_ia de app.py (sin el agrupador, que es por hilos)
+
+async def llamar_funcion_ia(ciclo, area, tema, campos, contexto=None):
+    contar_ia('llamadas')
+    try:
+        with metricas.en_curso('prototipo_ia_en_curso'), prototipo.admision.ocupando('ia'):
+            response = await prototipo.llamador_ia.allamar(
+                prototipo.cliente_ia().ChatCompletion.acreate,
+                model=prototipo.IA_MODELO,
+                messages=prototipo.mensajes_ia(ciclo, area, tema, campos, contexto),
+                functions=[funcion_contenido(campos)],
+                function_call={"name": FUNCION_CONTENIDO},
+                temperature=0.7,
+                max_tokens=tokens_maximos(campos)
+            )
+    except Exception as e:
+        contar_ia(prototipo.evento_error_ia(e))
+        return None
+
+    try:
+        datos = prototipo.argumentos_funcion(response.choices[0].message)
+    except Exception:
+        contar_ia('respuestas_invalidas')
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+async def completar_contenido(ciclo, area, tema, datos):
+    contenido, faltantes = validar_contenido(datos)
+    if not faltantes:
+        return contenido
+
+    contar_ia('reparaciones')
+    parche = await llamar_funcion_ia(ciclo, area, tema, faltantes, contexto=contenido)
+    if parche is not None:
+        reparados, faltantes = validar_contenido(parche, faltantes)
+        contenido.update(reparados)
+    if faltantes:
+        contar_ia('reparaciones_fallidas')
+        return None
+    return {campo: contenido[campo] for campo in CAMPOS_CONTENIDO}
+
+
+async def generar_contenido_ia(ciclo, area, tema):
+    contenido = prototipo.buscar_por_tema(ciclo, tema)
+    if contenido is not None:
+        return contenido
+
+    cache_ia = prototipo.cache_ia
+    if cache_ia is not None:
+        try:
+            contenido = prototipo.contar_cache('ia', await asyncio.to_thread(cache_ia.obtener, ciclo, area, tema))
+            if contenido is not None:
+                return contenido
+        except Exception:
+            metricas.incrementar('prototipo_cache_total', cache='ia', resultado='error')
+
+    async def consultar():
+        return prototipo.con_resultado(await consultar_y_guardar(ciclo, area, tema))
+
+    try:
+        contenido = await una_sola_vez(clave_ia(ciclo, area, tema), consultar)
+    except SinResultado:
+        return prototipo.generar_contenido_generico(ciclo, area, tema)
+    prototipo.indice_sugerencias.agregar(tema, area, ciclo, origen='ia')
+    return contenido
+
+
+async def consultar_y_guardar(ciclo, area, tema):
+    if prototipo.interruptor_ia.abierto():
+        contar_ia('rechazos_interruptor')
+        return None
+    contenido = None
+    with presupuesto(prototipo.IA_PRESUPUESTO_SEGUNDOS):
+        datos = await llamar_funcion_ia(ciclo, area, tema, CAMPOS_CONTENIDO)
+        if datos is not None:
+            contenido = await completar_contenido(ciclo, area, tema, datos)
+    if contenido is not None and prototipo.cache_ia is not None:
+        try:
+            await asyncio.to_thread(prototipo.cache_ia.guardar, ciclo, area, tema, contenido)
+        except Exception:
+            pass
+    return contenido
+
+
+async def entre_workers(clave, consultar):
+    # Como Deduplicador.ejecutar entre workers (misma clave y formato que app.py, así también se comparten
+    # con workers síncronos): la espera del flock y del resultado corre en un hilo
+    deduplicador = prototipo.deduplicador
+    if not deduplicador.directorio:
+        return await consultar()
+    clave = f'ia|{clave}'
+    estado, valor = await asyncio.to_thread(deduplicador.adquirir, clave, json.loads)
+    if estado == 'resultado':
+        return valor
+    if estado == 'agotada':
+        return await consultar()
+    try:
+        resultado = await consultar()
+        await asyncio.to_thread(deduplicador.publicar, clave, resultado,
+                                lambda valor: json.dumps(valor, ensure_ascii=False).encode('utf-8'))
+        return resultado
+    finally:
+        deduplicador.soltar(valor)
+
+
+async def una_sola_vez(clave, consultar):
+    # Como Deduplicador.ejecutar, dentro del proceso: las consultas idénticas esperan a la primera y, si
+    # esa falla, una de ellas toma el relevo. La primera, a su vez, espera a la de otro worker
+    while True:
+        futuro = _consultas_en_curso.get(clave)
+        if futuro is None:
+            break
+        try:
+            return await asyncio.shield(futuro)
+        except Exception:
+            continue
+
+    futuro = _consultas_en_curso[clave] = asyncio.get_running_loop().create_future()
+    try:
+        resultado = await entre_workers(clave, consultar)
+        futuro.set_result(resultado)
+        return resultado
+    except BaseException:
+        futuro.set_exception(RuntimeError('La consulta a la IA no terminó'))
+        futuro.exception()
+        raise
+    finally:
+        del _consultas_en_curso[clave]
+
+
+# /generar
+
+def error_json(mensaje, codigo, headers=None):
+    return web.json_response({'error': mensaje}, status=codigo, headers=headers,
+                             dumps=functools.partial(json.dumps, ensure_ascii=False))
+
+
+def disposicion_adjunto(nombre):
+    try:
+        nombre.encode('ascii')
+        return f'attachment; filename={nombre}'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii')
+        return f"attachment; filename={simple}; filename*=UTF-8''{quote(nombre)}"
+
+
+async def datos_peticion(request):
+    # Igual que datos_peticion de app.py: JSON o multipart con la nómina como archivo CSV
+    if request.content_type != 'multipart/form-data':
+        try:
+            datos = await request.json()
+        except ValueError:
+            return {}
+        return datos if isinstance(datos, dict) else {}
+    formulario = await request.post()
+    datos = {clave: valor for clave, valor in formulario.items() if isinstance(valor, str)}
+    if 'criterios_adicionales' in formulario:
+        datos['criterios_adicionales'] = formulario.getall('criterios_adicionales')
+    archivo = formulario.get('estudiantes')
+    if isinstance(archivo, web.FileField):
+        contenido = archivo.file.read()
+        try:
+            datos['estudiantes'] = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            datos['estudiantes'] = contenido.decode('cp1252', errors='replace')
+    return datos
+
+
+def admitir_generacion(request, ciclo, area, en_curso):
+    # Mismo carril prioritario y fichas por cliente que app.admitir_generacion; los turnos son los
+    # ASYNC_MAX_EN_CURSO de este proceso, sin cola. Lanza Rechazada
+    prioritaria = prototipo.curriculo.buscar(area, ciclo) is not None
+    carril = 'prioritario' if prioritaria else 'general'
+    try:
+        if not prioritaria and en_curso > ASYNC_MAX_EN_CURSO:
+            raise Rechazada(503, 'Servidor ocupado, intenta nuevamente', 1)
+        ip = ip_cliente(request.remote, request.headers.get('X-Forwarded-For'), prototipo.PROXY_SALTOS)
+        prototipo.admision.admitir(request.headers.get('X-Api-Key'), ip, prioritaria, ocupar=False)
+    except Rechazada as e:
+        metricas.incrementar('prototipo_admision_total', carril=carril, resultado=e.codigo)
+        raise
+    metricas.incrementar('prototipo_admision_total', carril=carril, resultado='admitida')
+
+
+async def generar_documento(request):
+    estado = request.app['estado']
+    estado.en_curso += 1
+    try:
+        data = await datos_peticion(request)
+        ciclo = data.get('ciclo')
+        area = data.get('area')
+        tema = data.get('tema')
+
+        if not all([ciclo, area, tema]):
+            return error_json('Faltan datos requeridos', 400)
+
+        try:
+            opciones = prototipo.opciones_cotejo(data)
+        except ValueError as e:
+            return error_json(str(e), 400)
+
+        try:
+            admitir_generacion(request, ciclo, area, estado.en_curso)
+        except Rechazada as e:
+            return error_json(str(e), e.codigo, {'Retry-After': str(e.reintentar)})
+
+        etapas = {}
+        with prototipo.medir(etapas, 'buscar_en_db'):
+            contenido = prototipo.buscar_en_db(ciclo, area)
+        if not contenido:
+            inicio = time.perf_counter()
+            prototipo.cliente_ia().aiosession.set(request.app['sesion_ia'])
+            contenido = await generar_contenido_ia(ciclo, area, tema)
+            etapas['ia'] = time.perf_counter() - inicio
+            metricas.observar('prototipo_etapa_segundos', etapas['ia'], etapa='ia')
+
+        # Con DOCX_MOTOR=python-docx el hilo solo espera al servicio de render en procesos
+        etag, archivo, revision = await asyncio.get_running_loop().run_in_executor(
+            estado.hilos_render,
+            functools.partial(prototipo.producir_documento, ciclo, area, tema, etapas,
+                              contenido=contenido, **opciones)
+        )
+
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'X-Revision': revision}
+        if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+            prototipo.cache_documentos.registrar_no_modificado()
+            metricas.incrementar('prototipo_cache_total', cache='documentos', resultado='no_modificado')
+            return web.Response(status=304, headers=headers)
+
+        headers['Content-Disposition'] = disposicion_adjunto(prototipo.nombre_archivo(ciclo, area))
+        return web.Response(body=archivo, content_type=prototipo.MIMETYPE_DOCX, headers=headers)
+
+    except ValueError as e:
+        # Criterios adicionales que con los del contenido no entran en la tabla
+        return error_json(str(e), 400)
+    except prototipo.ColaLlena:
+        return error_json('Hay demasiados documentos en proceso, intenta nuevamente en unos segundos', 503,
+                          {'Retry-After': '5'})
+    except Exception as e:
+        return error_json(str(e), 500)
+    finally:
+        estado.en_curso -= 1
+
+
+@web.middleware
+async def medir_peticion(request, handler):
+    # Las rutas que pasan por el puente ya se miden con los hooks de Flask
+    if handler is puente_wsgi:
+        return await handler(request)
+    endpoint = request.match_info.route.name or 'desconocido'
+    inicio = time.perf_counter()
+    inicio_memoria = prototipo.memoria.iniciar()
+    codigo = 500
+    metricas.incrementar('prototipo_peticiones_en_curso', 1, endpoint=endpoint)
+    try:
+        respuesta = await handler(request)
+        codigo = respuesta.status
+        if respuesta.content_length is not None:
+            metricas.observar('prototipo_respuesta_bytes', respuesta.content_length, endpoint=endpoint)
+        return respuesta
+    finally:
+        metricas.incrementar('prototipo_peticiones_en_curso', -1, endpoint=endpoint)
+        metricas.incrementar('prototipo_peticiones_total', endpoint=endpoint, codigo=codigo)
+        metricas.observar('prototipo_peticion_segundos', time.perf_counter() - inicio, endpoint=endpoint)
+        prototipo.memoria.terminar(endpoint, inicio_memoria)
+
+
+# Puente WSGI: el resto de las rutas las responde la app Flask en un hilo; los trozos de la respuesta
+# (streams SSE, zip de lotes) pasan de a uno por una cola acotada
+
+def entorno_wsgi(request, cuerpo):
+    host, _, puerto = (request.host or 'localhost').partition(':')
+    entorno = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': host,
+        'SERVER_PORT': puerto or ('443' if request.scheme == 'https' else '80'),
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_LENGTH': str(len(cuerpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(cuerpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if 'Content-Type' in request.headers:
+        entorno['CONTENT_TYPE'] = request.headers['Content-Type']
+    for nombre in request.headers:
+        clave = 'HTTP_' + nombre.upper().replace('-', '_')
+        if clave in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH') or clave in entorno:
+            continue
+        entorno[clave] = ','.join(request.headers.getall(nombre))
+    return entorno
+
+
+async def puente_wsgi(request):
+    loop = asyncio.get_running_loop()
+    cuerpo = await request.read()
+    entorno = entorno_wsgi(request, cuerpo)
+    cola = asyncio.Queue(maxsize=8)
+    abandonado = threading.Event()
+
+    def entregar(elemento):
+        futuro = asyncio.run_coroutine_threadsafe(cola.put(elemento), loop)
+        while True:
+            try:
+                futuro.result(timeout=1)
+                return True
+            except TiempoAgotado:
+                if abandonado.is_set():
+                    futuro.cancel()
+                    return False
+
+    def correr():
+        inicio = []
+
+        def start_response(status, headers, exc_info=None):
+            inicio[:] = [status, headers]
+            return lambda datos: None
+
+        try:
+            resultado = prototipo.app(entorno, start_response)
+        except BaseException as e:
+            entregar(('error', e))
+            return
+        try:
+            if not entregar(('inicio', *inicio)):
+                return
+            for trozo in resultado:
+                if trozo and not entregar(('datos', trozo)):
+                    return
+        except BaseException as e:
+            entregar(('error', e))
+            return
+        finally:
+            # Cierra el generador de la respuesta: corre teardown_request y libera los streams abandonados
+            if hasattr(resultado, 'close'):
+                resultado.close()
+        entregar(('fin', None))
+
+    loop.run_in_executor(request.app['estado'].hilos_wsgi, correr)
+    respuesta = None
+    try:
+        while True:
+            tipo, *valor = await cola.get()
+            if tipo == 'error':
+                raise valor[0]
+            if tipo == 'inicio':
+                status, headers = valor
+                codigo, _, motivo = status.partition(' ')
+                respuesta = web.StreamResponse(status=int(codigo), reason=motivo or None)
+                for nombre, contenido in headers:
+                    respuesta.headers.add(nombre, contenido)
+                await respuesta.prepare(request)
+            elif tipo == 'datos':
+                await respuesta.write(valor[0])
+            else:
+                await respuesta.write_eof()
+                return respuesta
+    except ConnectionResetError:
+        # El cliente cerró la conexión antes de terminar de leer
+        return respuesta
+    finally:
+        abandonado.set()
+
+
+# Aplicación
+
+class _Estado:
+    def __init__(self):
+        self.en_curso = 0
+        self.hilos_render = ThreadPoolExecutor(max_workers=ASYNC_RENDER_HILOS, thread_name_prefix='render')
+        self.hilos_wsgi = ThreadPoolExecutor(max_workers=ASYNC_WSGI_HILOS, thread_name_prefix='wsgi')
+
+
+async def abrir_recursos(aplicacion):
+    # Una sola sesión por proceso: las conexiones a la IA se reutilizan entre peticiones (keep-alive)
+    conector = aiohttp.TCPConnector(limit=IA_CONEXIONES, keepalive_timeout=60)
+    aplicacion['sesion_ia'] = aiohttp.ClientSession(connector=conector)
+    aplicacion['estado'] = _Estado()
+    # Aquí todo /generar sin currículo pasa por la IA: openai se importa antes de aceptar conexiones y no
+    # frena el event loop con la primera consulta
+    prototipo.cliente_ia()
+
+
+async def cerrar_recursos(aplicacion):
+    await aplicacion['sesion_ia'].close()
+    aplicacion['estado'].hilos_render.shutdown(wait=False)
+    aplicacion['estado'].hilos_wsgi.shutdown(wait=False)
+
+
+async def crear_aplicacion():
+    aplicacion = web.Application(middlewares=[medir_peticion], client_max_size=ASYNC_MAX_CUERPO_MB * 1024 * 1024)
+    aplicacion.on_startup.append(abrir_recursos)
+    aplicacion.on_cleanup.append(cerrar_recursos)
+    aplicacion.router.add_post('/generar', generar_documento, name='generar_documento')
+    aplicacion.router.add_route('*', '/{ruta:.*}', puente_wsgi)
+    return aplicacion
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sirve la app con asyncio (aiohttp)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--puerto', type=int, default=int(os.environ.get('PORT', '8000')))
+    args = parser.parse_args(argv)
+    web.run_app(crear_aplicacion(), host=args.host, port=args.puerto)
+
+
+if __name__ == '__main__':
+    main()
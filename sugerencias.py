@@ -0,0 +1,111 @@
+import threading
+from collections import Counter, defaultdict
+
+from cache_ia import normalizar
+from recuperacion import trigramas
+
+# ÍNDICE DE SUGERENCIAS DE TEMAS
+# Trie de prefijos (sin tildes ni mayúsculas) sobre el inicio de cada palabra del tema, más un índice
+# invertido de trigramas para tolerar errores de escritura. Los temas nuevos se agregan de a uno, sin
+# reconstruir el índice.
+
+PROFUNDIDAD_TRIE = 24
+MINIMO_TRIGRAMAS = 0.5
+# Una consulta corta tiene pocos trigramas y casi cualquier tema con la misma sílaba llega a la mitad
+# ("frac" con "Amor y fraternidad"): el mínimo sube 0.125 por cada carácter por debajo de este largo
+LARGO_TRIGRAMAS = 6
+
+
+def minimo_trigramas(largo):
+    return MINIMO_TRIGRAMAS + 0.125 * max(0, LARGO_TRIGRAMAS - largo)
+
+
+class IndiceSugerencias:
+    def __init__(self):
+        self._raiz = {}
+        self._trigramas = defaultdict(set)
+        self._temas = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def agregar(self, tema, area, ciclo, origen='curriculo'):
+        normalizado = normalizar(tema)
+        if not normalizado:
+            return
+        clave = (normalizado, normalizar(area), normalizar(ciclo))
+        with self._lock:
+            if clave in self._ids:
+                return
+            id_tema = len(self._temas)
+            self._temas.append({'tema': tema, 'area': area, 'ciclo': ciclo, 'origen': origen})
+            self._ids[clave] = id_tema
+
+            # Se indexa el texto desde el inicio de cada palabra, hasta PROFUNDIDAD_TRIE caracteres
+            palabras = normalizado.split(' ')
+            for i in range(len(palabras)):
+                nodo = self._raiz
+                for caracter in ' '.join(palabras[i:])[:PROFUNDIDAD_TRIE]:
+                    nodo = nodo.setdefault(caracter, {})
+                    nodo.setdefault('', {})[id_tema] = min(i, nodo.get('', {}).get(id_tema, i))
+            for trigrama in set(trigramas(normalizado)):
+                self._trigramas[trigrama].add(id_tema)
+
+    def _por_prefijo(self, consulta):
+        nodo = self._raiz
+        for caracter in consulta[:PROFUNDIDAD_TRIE]:
+            nodo = nodo.get(caracter)
+            if nodo is None:
+                return {}
+        return nodo.get('', {})
+
+    def sugerir(self, consulta='', area=None, ciclo=None, limite=8):
+        consulta = normalizar(consulta)
+        area = normalizar(area) if area else None
+        ciclo = normalizar(ciclo) if ciclo else None
+
+        with self._lock:
+            puntajes = {}
+            if consulta:
+                for id_tema, palabra in self._por_prefijo(consulta).items():
+                    # Coincidir con el inicio del tema vale más que con una palabra intermedia
+                    puntajes[id_tema] = 2.0 if palabra == 0 else 1.5
+                if len(consulta) >= 4:
+                    # La última palabra puede estar a medio escribir: sin el relleno del final
+                    buscados = set(trigramas(consulta)[:-1])
+                    minimo = minimo_trigramas(len(consulta))
+                    comunes = Counter()
+                    for trigrama in buscados:
+                        comunes.update(self._trigramas.get(trigrama, ()))
+                    for id_tema, n in comunes.items():
+                        parecido = n / len(buscados)
+                        if parecido >= minimo:
+                            puntajes[id_tema] = max(puntajes.get(id_tema, 0), parecido)
+            elif area and ciclo:
+                # Sin texto: todos los temas del área y ciclo elegidos
+                puntajes = {id_tema: 0.0 for (_, a, c), id_tema in self._ids.items() if a == area and c == ciclo}
+
+            resultados = []
+            for id_tema, puntaje in puntajes.items():
+                tema = self._temas[id_tema]
+                if area and normalizar(tema['area']) == area:
+                    puntaje += 0.5
+                    if ciclo and normalizar(tema['ciclo']) == ciclo:
+                        puntaje += 0.5
+                resultados.append((-puntaje, id_tema, dict(tema, puntaje=round(puntaje, 3))))
+
+        resultados.sort()
+        vistos = set()
+        sugerencias = []
+        for _, _, tema in resultados:
+            # El mismo tema en varias áreas se sugiere una sola vez (la de mayor puntaje)
+            texto = normalizar(tema['tema'])
+            if texto in vistos:
+                continue
+            vistos.add(texto)
+            sugerencias.append(tema)
+            if len(sugerencias) >= limite:
+                break
+        return sugerencias
+
+    def __len__(self):
+        return len(self._temas)
@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# Caches, trabajos y archivos compartidos en un directorio propio de la corrida, antes de importar app: las
+# pruebas no leen ni ensucian los del servidor. La cache de la IA va en una carpeta que todavía no existe,
+# como en un checkout nuevo con IA_CACHE_PATH propio
+_DIRECTORIO = tempfile.mkdtemp(prefix='prototipo-pruebas-')
+os.environ.update({
+    'OPENAI_API_KEY': '',
+    'DOCX_CACHE_DIR': os.path.join(_DIRECTORIO, 'docx'),
+    'IA_CACHE_PATH': os.path.join(_DIRECTORIO, 'ia', 'cache.sqlite3'),
+    'TRABAJOS_DIR': os.path.join(_DIRECTORIO, 'trabajos'),
+    'REVISIONES_DIR': os.path.join(_DIRECTORIO, 'revisiones'),
+    'DEDUP_DIR': os.path.join(_DIRECTORIO, 'dedup'),
+    'METRICAS_DIR': os.path.join(_DIRECTORIO, 'metricas'),
+    'PERFILES_DIR': os.path.join(_DIRECTORIO, 'perfiles'),
+    'ADMISION_PATH': '',
+    'ARRANQUE_CONGELAR': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
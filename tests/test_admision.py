@@ -0,0 +1,85 @@
+import pytest
+
+import app
+from admision import ControlAdmision, Rechazada
+
+
+def test_sin_fichas_rechaza_con_429():
+    control = ControlAdmision({'tasa': 0.5, 'rafaga': 2})
+    control.admitir(ip='1.2.3.4')
+    control.admitir(ip='1.2.3.4')
+    with pytest.raises(Rechazada) as rechazo:
+        control.admitir(ip='1.2.3.4')
+    assert rechazo.value.codigo == 429
+    assert rechazo.value.reintentar >= 1
+    # Otro cliente tiene su propio balde
+    control.admitir(ip='5.6.7.8')
+    assert control.estado()['decisiones']['limitadas'] == 1
+
+
+def test_carril_prioritario_no_gasta_fichas_ni_turno():
+    control = ControlAdmision({'tasa': 0.001, 'rafaga': 1, 'max_en_curso': 1, 'max_cola': 0})
+    with control.admitir(ip='a'):
+        for _ in range(3):
+            control.admitir(ip='a', prioritaria=True)
+    assert control.estado()['decisiones']['prioritarias'] == 3
+
+
+def test_sin_turno_rechaza_con_503_y_devuelve_la_ficha():
+    control = ControlAdmision({'tasa': 0.001, 'rafaga': 2, 'max_en_curso': 1, 'max_cola': 0})
+    turno = control.admitir(ip='a')
+    for _ in range(3):
+        with pytest.raises(Rechazada) as rechazo:
+            control.admitir(ip='a')
+        assert rechazo.value.codigo == 503
+    turno.liberar()
+    # La ficha que queda no se perdió en los rechazos
+    control.admitir(ip='a').liberar()
+    with pytest.raises(Rechazada) as rechazo:
+        control.admitir(ip='a')
+    assert rechazo.value.codigo == 429
+
+
+def test_lote_gasta_una_ficha_por_elemento():
+    control = ControlAdmision({'tasa': 0.001, 'rafaga': 5})
+    control.admitir(ip='a', ocupar=False, fichas=3)
+    with pytest.raises(Rechazada):
+        control.admitir(ip='a', ocupar=False, fichas=3)
+    control.admitir(ip='a', ocupar=False, fichas=2)
+
+
+def test_lote_mayor_que_la_rafaga_pasa_con_el_balde_lleno_y_lo_deja_en_negativo():
+    control = ControlAdmision({'tasa': 0.001, 'rafaga': 5})
+    control.admitir(ip='a', ocupar=False, fichas=20)
+    with pytest.raises(Rechazada) as rechazo:
+        control.admitir(ip='a', ocupar=False)
+    assert rechazo.value.codigo == 429
+
+
+@pytest.fixture
+def limites_admision():
+    anteriores = app.admision.limites
+    yield app.admision
+    app.admision.ajustar(anteriores)
+
+
+def test_generar_lote_pasa_por_la_admision(limites_admision):
+    limites_admision.ajustar({'tasa': 0.001, 'rafaga': 2})
+    cliente = app.app.test_client()
+    elementos = [{'ciclo': 'III', 'area': 'Área inexistente', 'tema': f'Tema {i}'} for i in range(3)]
+    entorno = {'REMOTE_ADDR': '10.0.0.1'}
+
+    respuesta = cliente.post('/generar/lote', json={'elementos': elementos[:2]}, environ_base=entorno)
+    assert respuesta.status_code == 200
+    respuesta.close()
+
+    respuesta = cliente.post('/generar/lote', json={'elementos': elementos}, environ_base=entorno)
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers['Retry-After']) >= 1
+
+    # Un lote solo con entradas del currículo va por el carril prioritario
+    entrada = next(iter(app.curriculo))
+    respuesta = cliente.post('/generar/lote', json={'elementos': [{'ciclo': entrada.ciclo, 'area': entrada.area,
+                                                                    'tema': 'Repaso'}]}, environ_base=entorno)
+    assert respuesta.status_code == 200
+    respuesta.close()
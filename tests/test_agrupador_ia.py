@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+from agrupador_ia import AgrupadorIA
+from resiliencia_ia import presupuesto
+
+
+def consultar_en_paralelo(agrupador, temas, segundos=None):
+    resultados = [None] * len(temas)
+
+    def consultar(i, tema):
+        if segundos is None:
+            resultados[i] = agrupador.consultar('III', 'Matemática', tema)
+        else:
+            with presupuesto(segundos):
+                resultados[i] = agrupador.consultar('III', 'Matemática', tema)
+
+    hilos = [threading.Thread(target=consultar, args=(i, tema)) for i, tema in enumerate(temas)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def test_las_consultas_simultaneas_van_en_un_lote():
+    lotes = []
+    individuales = []
+
+    def consultar_lote(peticiones, limite=None):
+        lotes.append(list(peticiones))
+        # El segundo elemento no se pudo leer: su llamador lo reintenta solo
+        return [None if tema == 'Dos' else {'tema': tema} for _, _, tema in peticiones]
+
+    def consultar_uno(ciclo, area, tema):
+        individuales.append(tema)
+        return {'tema': tema, 'individual': True}
+
+    agrupador = AgrupadorIA(consultar_lote, consultar_uno, ventana_segundos=0.2, max_elementos=3)
+    resultados = consultar_en_paralelo(agrupador, ['Uno', 'Dos', 'Tres'])
+    assert len(lotes) == 1 and len(lotes[0]) == 3
+    assert resultados == [{'tema': 'Uno'}, {'tema': 'Dos', 'individual': True}, {'tema': 'Tres'}]
+    assert individuales == ['Dos']
+    assert agrupador.estadisticas()['reintentos_individuales'] == 1
+
+
+def test_una_consulta_sola_va_directo_a_la_individual():
+    agrupador = AgrupadorIA(lambda *args, **kwargs: 1 / 0, lambda ciclo, area, tema: {'tema': tema},
+                            ventana_segundos=0.01)
+    assert agrupador.consultar('III', 'Matemática', 'Uno') == {'tema': 'Uno'}
+    assert agrupador.estadisticas()['individuales'] == 1
+    assert agrupador.estadisticas()['lotes'] == 0
+
+
+def test_el_lote_recibe_el_presupuesto_mas_corto_y_nadie_espera_de_mas():
+    limites = []
+
+    def consultar_lote(peticiones, limite=None):
+        # Como la IA sin responder: la llamada respeta el límite y termina por timeout
+        limites.append(limite - time.monotonic())
+        time.sleep(max(0.0, limite - time.monotonic()))
+        raise TimeoutError()
+
+    agrupador = AgrupadorIA(consultar_lote, lambda *args: None, ventana_segundos=5, max_elementos=2,
+                            registro=logging.getLogger('pruebas'))
+    inicio = time.monotonic()
+    resultados = consultar_en_paralelo(agrupador, ['Uno', 'Dos'], segundos=0.3)
+    assert time.monotonic() - inicio < 0.45
+    assert resultados == [None, None]
+    assert 0 < limites[0] <= 0.3
+
+
+def test_un_error_del_lote_se_registra_y_cada_uno_reintenta(caplog):
+    def consultar_lote(peticiones, limite=None):
+        raise RuntimeError('sin conexión')
+
+    agrupador = AgrupadorIA(consultar_lote, lambda ciclo, area, tema: {'tema': tema}, ventana_segundos=5,
+                            max_elementos=2)
+    with caplog.at_level(logging.ERROR):
+        resultados = consultar_en_paralelo(agrupador, ['Uno', 'Dos'])
+    assert resultados == [{'tema': 'Uno'}, {'tema': 'Dos'}]
+    assert agrupador.estadisticas()['errores_lote'] == 1
+    assert 'sin conexión' in caplog.text
@@ -0,0 +1,62 @@
+import hashlib
+import os
+
+import app
+from cache_documentos import CacheDocumentos, clave_documento
+
+
+def test_la_clave_no_depende_del_orden_de_los_campos():
+    assert clave_documento('III', {'a': 1, 'b': [1, 2]}) == clave_documento('III', {'b': [1, 2], 'a': 1})
+    assert clave_documento('III', {'a': 1}) != clave_documento('IV', {'a': 1})
+
+
+def test_el_etag_es_el_sha256_del_documento():
+    cache = CacheDocumentos()
+    assert cache.guardar('clave', b'documento') == (hashlib.sha256(b'documento').hexdigest(), b'documento')
+    assert cache.obtener('clave') == cache.guardar('clave', b'documento')
+    assert cache.obtener('otra') is None
+
+
+def test_la_memoria_expulsa_las_menos_usadas():
+    cache = CacheDocumentos(max_bytes_memoria=10)
+    cache.guardar('a', b'12345')
+    cache.guardar('b', b'12345')
+    cache.obtener('a')
+    cache.guardar('c', b'12345')
+    assert cache.obtener('b') is None
+    assert cache.obtener('a') is not None
+    assert cache.estadisticas()['bytes_memoria'] <= 10
+
+
+def test_otro_worker_lee_del_disco(tmp_path):
+    guardado = CacheDocumentos(str(tmp_path)).guardar('clave', b'documento')
+    otro_worker = CacheDocumentos(str(tmp_path))
+    assert otro_worker.obtener('clave') == guardado
+    assert otro_worker.obtener('clave') == guardado
+    assert otro_worker.contadores['hits_disco'] == 1
+    assert otro_worker.contadores['hits_memoria'] == 1
+
+
+def test_la_poda_deja_el_disco_bajo_el_presupuesto(tmp_path):
+    cache = CacheDocumentos(str(tmp_path), max_bytes_memoria=0, max_bytes_disco=250)
+    for i in range(5):
+        etag, _ = cache.guardar(f'clave{i}', bytes([i]) * 100)
+        # Uso más antiguo cuanto menor el índice
+        os.utime(cache._ruta('objetos', etag), (1000 + i, 1000 + i))
+    cache.podar_disco()
+    objetos = [os.path.join(carpeta, nombre) for carpeta, _, nombres in os.walk(tmp_path / 'objetos')
+               for nombre in nombres]
+    assert sum(os.path.getsize(ruta) for ruta in objetos) <= 250
+    # Las claves cuyo objeto se podó cuentan como miss
+    assert cache.obtener('clave0') is None
+    assert cache.obtener('clave4') is not None
+
+
+def test_generar_responde_304_con_el_mismo_etag():
+    entrada = next(iter(app.curriculo))
+    cliente = app.app.test_client()
+    datos = {'ciclo': entrada.ciclo, 'area': entrada.area, 'tema': 'Repaso de ETag'}
+    respuesta = cliente.post('/generar', json=datos)
+    assert respuesta.status_code == 200
+    etag = respuesta.headers['ETag']
+    assert cliente.post('/generar', json=datos, headers={'If-None-Match': etag}).status_code == 304
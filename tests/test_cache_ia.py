@@ -0,0 +1,47 @@
+import json
+
+from cache_ia import CacheIA
+
+CONTENIDO = {'competencia': 'Resuelve problemas de cantidad', 'criterios': ['Uno', 'Dos']}
+
+
+def test_crea_la_carpeta_de_la_base(tmp_path):
+    ruta = tmp_path / 'no' / 'existe' / 'ia.sqlite3'
+    cache = CacheIA(str(ruta))
+    cache.guardar('III', 'Matemática', 'Fracciones', CONTENIDO)
+    assert ruta.exists()
+    assert cache.obtener('III', 'Matemática', 'Fracciones') == CONTENIDO
+
+
+def test_la_clave_ignora_tildes_mayusculas_y_espacios(tmp_path):
+    cache = CacheIA(str(tmp_path / 'ia.sqlite3'))
+    cache.guardar('III', 'Matemática', 'Fracciones  equivalentes', CONTENIDO)
+    assert cache.obtener('iii', 'MATEMATICA', ' fracciones equivalentes ') == CONTENIDO
+    assert cache.obtener('III', 'Matemática', 'Decimales') is None
+
+
+def test_las_entradas_vencidas_no_se_devuelven(tmp_path):
+    cache = CacheIA(str(tmp_path / 'ia.sqlite3'), ttl_segundos=-1)
+    cache.guardar('III', 'Matemática', 'Fracciones', CONTENIDO)
+    assert cache.obtener('III', 'Matemática', 'Fracciones') is None
+    assert cache.estadisticas()['entradas'] == 0
+
+
+def test_sobre_el_presupuesto_se_expulsan_las_menos_usadas(tmp_path):
+    tamano = len(json.dumps(CONTENIDO, ensure_ascii=False).encode('utf-8'))
+    cache = CacheIA(str(tmp_path / 'ia.sqlite3'), max_bytes=2 * tamano)
+    cache.guardar('III', 'Matemática', 'Uno', CONTENIDO)
+    cache.guardar('III', 'Matemática', 'Dos', CONTENIDO)
+    cache.obtener('III', 'Matemática', 'Uno')
+    cache.guardar('III', 'Matemática', 'Tres', CONTENIDO)
+    assert cache.obtener('III', 'Matemática', 'Dos') is None
+    assert cache.obtener('III', 'Matemática', 'Uno') == CONTENIDO
+    assert cache.obtener('III', 'Matemática', 'Tres') == CONTENIDO
+
+
+def test_purgar_por_filtro(tmp_path):
+    cache = CacheIA(str(tmp_path / 'ia.sqlite3'))
+    cache.guardar('III', 'Matemática', 'Fracciones', CONTENIDO)
+    cache.guardar('IV', 'Comunicación', 'Cuentos', CONTENIDO)
+    assert cache.purgar(area='matematica') == 1
+    assert [fila['tema'] for fila in cache.listar()] == ['cuentos']
@@ -0,0 +1,59 @@
+import copy
+import json
+
+import pytest
+
+import app
+from curriculo import Curriculo, CurriculoInvalido
+from lista_cotejo import MAX_CRITERIOS
+
+
+def datos_del_archivo():
+    with open(app.CURRICULO_PATH, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def test_el_archivo_del_repositorio_es_valido():
+    curriculo = Curriculo.cargar(app.CURRICULO_PATH)
+    assert len(curriculo) == sum(len(por_ciclo) for por_ciclo in datos_del_archivo()['areas'].values())
+    assert curriculo.como_dict() == datos_del_archivo()['areas']
+
+
+def test_los_textos_repetidos_quedan_una_sola_vez():
+    entradas = list(Curriculo.cargar(app.CURRICULO_PATH))
+    instrumentos = {id(entrada.instrumento) for entrada in entradas}
+    assert len(instrumentos) == len({entrada.instrumento for entrada in entradas})
+
+
+def test_indices():
+    curriculo = Curriculo.cargar(app.CURRICULO_PATH)
+    entrada = next(iter(curriculo))
+    assert curriculo.buscar(entrada.area, entrada.ciclo) is entrada
+    assert curriculo.buscar(['lista'], entrada.ciclo) is None
+    assert entrada in curriculo.por_competencia(entrada.competencia)
+    assert entrada in curriculo.por_enfoque(entrada.enfoque_transversal)
+    assert entrada.ciclo in curriculo.ciclos_de(entrada.area)
+
+
+def test_reune_todos_los_errores():
+    datos = datos_del_archivo()
+    area, por_ciclo = next(iter(datos['areas'].items()))
+    ciclo = next(iter(por_ciclo))
+    entrada = por_ciclo[ciclo]
+    del entrada['estandar']
+    entrada['criterios'] = ['c'] * (MAX_CRITERIOS + 1)
+    entrada['extra'] = 'x'
+    datos['areas'][area]['VIII'] = copy.deepcopy(por_ciclo[next(iter(list(por_ciclo)[1:]))])
+    with pytest.raises(CurriculoInvalido) as error:
+        Curriculo.desde_datos(datos)
+    mensaje = str(error.value)
+    for esperado in ("falta 'estandar'", f'más de {MAX_CRITERIOS} criterios', "campo desconocido 'extra'",
+                     'ciclo no declarado'):
+        assert esperado in mensaje
+
+
+def test_claves_repetidas_en_el_archivo(tmp_path):
+    ruta = tmp_path / 'curriculo.json'
+    ruta.write_text('{"ciclos": {"III": "a", "III": "b"}, "areas": {}}', encoding='utf-8')
+    with pytest.raises(CurriculoInvalido):
+        Curriculo.cargar(str(ruta))
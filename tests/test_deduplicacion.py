@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+import app
+from deduplicacion import Deduplicador, SinResultado
+
+
+def esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        assert time.monotonic() < limite, 'la condición no se cumplió a tiempo'
+        time.sleep(0.01)
+
+
+def en_hilo(funcion):
+    resultado = {}
+
+    def correr():
+        try:
+            resultado['valor'] = funcion()
+        except BaseException as e:
+            resultado['error'] = e
+
+    hilo = threading.Thread(target=correr)
+    hilo.start()
+    return hilo, resultado
+
+
+def lider_que_falla(soltar, empezo=None):
+    def funcion():
+        if empezo is not None:
+            empezo.set()
+        soltar.wait(5)
+        raise SinResultado()
+    return funcion
+
+
+def test_seguidores_reciben_el_resultado_del_lider():
+    deduplicador = Deduplicador()
+    soltar = threading.Event()
+    llamadas = []
+
+    def funcion():
+        llamadas.append(1)
+        soltar.wait(5)
+        return 'hecho'
+
+    lider, resultado_lider = en_hilo(lambda: deduplicador.ejecutar('clave', funcion))
+    esperar(lambda: deduplicador.contadores['lideres'] == 1)
+    seguidor, resultado_seguidor = en_hilo(lambda: deduplicador.ejecutar('clave', funcion))
+    esperar(lambda: deduplicador.contadores['seguidores'] == 1)
+    soltar.set()
+    lider.join()
+    seguidor.join()
+
+    assert resultado_lider == {'valor': 'hecho'}
+    assert resultado_seguidor == {'valor': 'hecho'}
+    assert len(llamadas) == 1
+
+
+def test_si_el_lider_falla_un_seguidor_hace_el_trabajo():
+    deduplicador = Deduplicador()
+    soltar = threading.Event()
+    llamadas_seguidor = []
+
+    def funcion_seguidor():
+        llamadas_seguidor.append(1)
+        return 'del seguidor'
+
+    lider, resultado_lider = en_hilo(lambda: deduplicador.ejecutar('clave', lider_que_falla(soltar)))
+    esperar(lambda: deduplicador.contadores['lideres'] == 1)
+    seguidor, resultado_seguidor = en_hilo(lambda: deduplicador.ejecutar('clave', funcion_seguidor))
+    esperar(lambda: deduplicador.contadores['seguidores'] == 1)
+    soltar.set()
+    lider.join()
+    seguidor.join()
+
+    assert isinstance(resultado_lider['error'], SinResultado)
+    assert resultado_seguidor == {'valor': 'del seguidor'}
+    assert llamadas_seguidor == [1]
+    assert deduplicador.contadores['relevos'] == 1
+
+
+@pytest.mark.skipif(Deduplicador('x').directorio is None, reason='sin fcntl no hay espera entre workers')
+def test_si_el_lider_de_otro_worker_falla_no_publica_y_se_toma_el_relevo(tmp_path):
+    # Dos instancias sobre el mismo directorio hacen de dos workers
+    worker_a = Deduplicador(str(tmp_path))
+    worker_b = Deduplicador(str(tmp_path))
+    codificar = lambda valor: valor.encode('utf-8')
+    decodificar = lambda datos: datos.decode('utf-8')
+    soltar = threading.Event()
+    empezo = threading.Event()
+
+    lider, resultado_lider = en_hilo(
+        lambda: worker_a.ejecutar('clave', lider_que_falla(soltar, empezo), codificar, decodificar))
+    # El trabajo corre con el lock ya tomado
+    assert empezo.wait(5)
+    seguidor, resultado_seguidor = en_hilo(
+        lambda: worker_b.ejecutar('clave', lambda: 'del otro worker', codificar, decodificar))
+    esperar(lambda: worker_b.contadores['seguidores_otro_worker'] == 1)
+    soltar.set()
+    lider.join()
+    seguidor.join()
+
+    assert isinstance(resultado_lider['error'], SinResultado)
+    assert resultado_seguidor == {'valor': 'del otro worker'}
+    assert worker_b.contadores['relevos'] == 1
+
+
+def test_consulta_a_la_ia_sin_contenido_no_se_comparte(monkeypatch):
+    # La primera consulta falla (devuelve None); la petición idéntica que esperaba consulta por su cuenta en
+    # lugar de quedarse con el contenido genérico
+    soltar = threading.Event()
+    contenido = {'competencia': 'De la segunda consulta'}
+    llamadas = []
+
+    def consultar_y_guardar(ciclo, area, tema):
+        llamadas.append(tema)
+        if len(llamadas) == 1:
+            soltar.wait(5)
+            return None
+        return contenido
+
+    monkeypatch.setattr(app, 'consultar_y_guardar', consultar_y_guardar)
+    monkeypatch.setattr(app, 'cache_ia', None)
+    tema = f'Tema sin coincidencias {time.time_ns()}'
+    seguidores = app.deduplicador.contadores['seguidores']
+
+    lider, resultado_lider = en_hilo(lambda: app.generar_contenido_ia('III', 'Matemática', tema))
+    esperar(lambda: len(llamadas) == 1)
+    seguidor, resultado_seguidor = en_hilo(lambda: app.generar_contenido_ia('III', 'Matemática', tema))
+    esperar(lambda: app.deduplicador.contadores['seguidores'] > seguidores)
+    soltar.set()
+    lider.join()
+    seguidor.join()
+
+    assert resultado_lider['valor'] == app.generar_contenido_generico('III', 'Matemática', tema)
+    assert resultado_seguidor == {'valor': contenido}
+    assert len(llamadas) == 2
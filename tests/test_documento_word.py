@@ -0,0 +1,30 @@
+import io
+
+from docx import Document
+
+import app
+
+
+def texto(doc):
+    partes = [parrafo.text for parrafo in doc.paragraphs]
+    for tabla in doc.tables:
+        for fila in tabla.rows:
+            partes.extend(celda.text for celda in fila.cells)
+    return '\n'.join(partes)
+
+
+def test_dos_documentos_en_el_mismo_hilo_no_se_pisan():
+    primera, segunda = list(app.curriculo)[:2]
+    doc = app.crear_documento_word(primera.ciclo, primera.area, 'Primer tema', primera.como_dict())
+    antes = texto(doc)
+    assert 'Primer tema' in antes
+
+    app.crear_documento_word(segunda.ciclo, segunda.area, 'Segundo tema', segunda.como_dict())
+    # Tampoco lo toca un documento armado sobre la plantilla que reusa el render con python-docx
+    textos = app.textos_documento(segunda.ciclo, segunda.area, 'Tercer tema', segunda.como_dict())
+    app.construir_documento(textos, len(segunda.criterios), app.documento_base())
+
+    assert texto(doc) == antes
+    guardado = io.BytesIO()
+    doc.save(guardado)
+    assert 'Primer tema' in texto(Document(io.BytesIO(guardado.getvalue())))
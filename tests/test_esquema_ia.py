@@ -0,0 +1,59 @@
+import app
+from esquema_ia import CAMPOS_CONTENIDO, LONGITUDES, funcion_contenido, validar_contenido
+
+COMPLETO = {
+    'competencia': 'Resuelve problemas de cantidad',
+    'capacidades': ['Uno', 'Dos', 'Tres'],
+    'estandar': 'Estándar',
+    'criterios': ['Criterio 1', 'Criterio 2'],
+    'instrumento': 'Lista de cotejo',
+    'competencia_transversal': 'Gestiona su aprendizaje',
+    'enfoque_transversal': 'Enfoque ambiental',
+    'descripcion_enfoque': 'Descripción',
+}
+
+
+def test_respuesta_completa():
+    assert validar_contenido(COMPLETO) == (COMPLETO, [])
+
+
+def test_campos_faltantes_o_mal_formados():
+    datos = dict(COMPLETO, estandar='   ', capacidades=['Uno', 7], criterios=['A', 'B', 'C'])
+    del datos['instrumento']
+    validos, faltantes = validar_contenido(datos)
+    assert faltantes == ['capacidades', 'estandar', 'instrumento']
+    # Sobran elementos: se toman los que pide el esquema
+    assert validos['criterios'] == ['A', 'B', 'C'][:LONGITUDES['criterios']]
+
+
+def test_la_funcion_pide_solo_los_campos_indicados():
+    funcion = funcion_contenido(['estandar', 'criterios'])
+    assert funcion['parameters']['required'] == ['estandar', 'criterios']
+    assert set(funcion['parameters']['properties']) == {'estandar', 'criterios'}
+
+
+def test_argumentos_de_la_llamada_o_json_en_el_texto():
+    assert app.argumentos_funcion({'function_call': {'arguments': '{"a": 1}'}}) == {'a': 1}
+    assert app.argumentos_funcion({'content': 'Claro: {"a": 1} listo'}) == {'a': 1}
+
+
+def test_se_reparan_solo_los_campos_faltantes(monkeypatch):
+    pedidos = []
+
+    def llamar_funcion_ia(ciclo, area, tema, campos, contexto=None):
+        pedidos.append(list(campos))
+        assert contexto['competencia'] == COMPLETO['competencia']
+        return {campo: COMPLETO[campo] for campo in campos}
+
+    monkeypatch.setattr(app, 'llamar_funcion_ia', llamar_funcion_ia)
+    incompleto = {campo: valor for campo, valor in COMPLETO.items() if campo not in ('estandar', 'criterios')}
+    contenido = app.completar_contenido('III', 'Matemática', 'Fracciones', incompleto)
+    assert contenido == COMPLETO
+    assert list(contenido) == list(CAMPOS_CONTENIDO)
+    assert pedidos == [['estandar', 'criterios']]
+
+
+def test_reparacion_fallida(monkeypatch):
+    monkeypatch.setattr(app, 'llamar_funcion_ia', lambda *args, **kwargs: {'estandar': ''})
+    incompleto = dict(COMPLETO, estandar=None)
+    assert app.completar_contenido('III', 'Matemática', 'Fracciones', incompleto) is None
@@ -0,0 +1,52 @@
+import json
+
+from json_incremental import ParserCamposJSON
+
+OBJETO = {
+    'competencia': 'Resuelve problemas de "cantidad"',
+    'capacidades': ['Traduce cantidades', 'Usa {estrategias}, y procedimientos', 'Argumenta'],
+    'estandar': 'Línea 1\nLínea 2 \\ con barra',
+    'criterios': [{'texto': 'Anidado', 'peso': [1, 2]}],
+    'numero': 3.5,
+    'vacio': None,
+}
+TEXTO = 'Aquí va el JSON: ' + json.dumps(OBJETO, ensure_ascii=False, indent=1) + '\nFin.'
+
+
+def alimentar_por_trozos(trozos):
+    parser = ParserCamposJSON()
+    campos = []
+    for trozo in trozos:
+        campos.extend(parser.alimentar(trozo))
+    return parser, campos
+
+
+def test_todos_los_cortes_en_dos_trozos():
+    for corte in range(len(TEXTO) + 1):
+        parser, campos = alimentar_por_trozos([TEXTO[:corte], TEXTO[corte:]])
+        assert dict(campos) == OBJETO, f'corte en {corte}: {TEXTO[corte - 5:corte + 5]!r}'
+        assert [clave for clave, _ in campos] == list(OBJETO)
+        assert parser.terminado
+
+
+def test_de_a_un_caracter():
+    parser, campos = alimentar_por_trozos(TEXTO)
+    assert dict(campos) == OBJETO
+    assert parser.terminado
+
+
+def test_cada_campo_sale_cuando_se_cierra_su_valor():
+    parser = ParserCamposJSON()
+    assert parser.alimentar('{"competencia": "Resuelve') == []
+    assert parser.alimentar(' problemas", "capacidades": ["Uno",') == [('competencia', 'Resuelve problemas')]
+    assert parser.alimentar(' "Dos"]') == []
+    # El último campo se cierra con la llave del objeto
+    assert parser.alimentar('}') == [('capacidades', ['Uno', 'Dos'])]
+    assert parser.terminado
+    assert parser.alimentar('{"otro": 1}') == []
+
+
+def test_objeto_incompleto_no_termina():
+    parser, campos = alimentar_por_trozos(['{"competencia": "A", "estandar": "sin cerrar'])
+    assert campos == [('competencia', 'A')]
+    assert not parser.terminado
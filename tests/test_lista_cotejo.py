@@ -0,0 +1,45 @@
+import pytest
+
+import app
+from lista_cotejo import (ANCHO_PAGINA, ESTUDIANTES_POR_DEFECTO, MAX_CRITERIOS, anchos_columnas,
+                          leer_criterios_adicionales, leer_estudiantes, sumar_criterios)
+
+
+def test_csv_con_apellidos_y_nombres():
+    texto = '\ufeffN°;Apellidos;Nombres\n1;Pérez Soto;Ana María\n2;Quispe;  Luis \n'
+    assert leer_estudiantes(texto) == ['Pérez Soto, Ana María', 'Quispe, Luis']
+
+
+def test_csv_sin_encabezado_salta_el_numero_de_orden():
+    assert leer_estudiantes('1.,Ana\n2.,Luis\n') == ['Ana', 'Luis']
+
+
+def test_sin_nomina_filas_en_blanco():
+    assert leer_estudiantes() == [''] * ESTUDIANTES_POR_DEFECTO
+    assert leer_estudiantes(num_estudiantes='3') == ['', '', '']
+    with pytest.raises(ValueError):
+        leer_estudiantes(num_estudiantes='0')
+
+
+def test_los_criterios_entran_en_la_pagina():
+    for num_criterios in range(MAX_CRITERIOS + 1):
+        assert sum(anchos_columnas(num_criterios)) <= ANCHO_PAGINA
+
+
+def test_el_limite_de_criterios_es_sobre_el_total():
+    assert leer_criterios_adicionales([' Uno ', '', 'Dos']) == ['Uno', 'Dos']
+    with pytest.raises(ValueError):
+        leer_criterios_adicionales(['x'] * (MAX_CRITERIOS + 1))
+    assert len(sumar_criterios(['a'] * 5, ['b'] * (MAX_CRITERIOS - 5))) == MAX_CRITERIOS
+    with pytest.raises(ValueError):
+        sumar_criterios(['a'] * 5, ['b'] * (MAX_CRITERIOS - 4))
+
+
+def test_generar_rechaza_mas_criterios_de_los_que_entran():
+    entrada = next(iter(app.curriculo))
+    cliente = app.app.test_client()
+    datos = {'ciclo': entrada.ciclo, 'area': entrada.area, 'tema': 'Cotejo'}
+    libres = MAX_CRITERIOS - len(entrada.criterios)
+    assert cliente.post('/generar', json=dict(datos, criterios_adicionales=['c'] * libres)).status_code == 200
+    respuesta = cliente.post('/generar', json=dict(datos, criterios_adicionales=['c'] * (libres + 1)))
+    assert respuesta.status_code == 400
@@ -0,0 +1,56 @@
+import io
+import json
+import time
+import zipfile
+
+import app
+from lote import zip_en_stream
+
+
+def procesar(elemento):
+    if elemento.get('fallar'):
+        raise ValueError('Elemento inválido')
+    # Los elementos terminan en desorden
+    time.sleep(elemento.get('demora', 0))
+    return elemento['texto'].encode('utf-8') * 1000, {'tamano': len(elemento['texto'])}
+
+
+def nombre(indice, elemento):
+    return f'{indice:03d}.txt'
+
+
+def test_el_zip_en_trozos_se_lee_con_zipfile():
+    elementos = [{'texto': f'Documento {i}', 'demora': 0.01 * (i % 3)} for i in range(10)]
+    elementos[4] = {'fallar': True}
+    trozos = list(zip_en_stream(elementos, procesar, nombre, hilos=3))
+    assert len(trozos) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(trozos))) as paquete:
+        assert paquete.testzip() is None
+        manifiesto = json.loads(paquete.read('manifiesto.json'))
+        assert manifiesto['total'] == 10
+        assert manifiesto['correctos'] == 9
+        assert manifiesto['errores'] == 1
+        assert [registro['indice'] for registro in manifiesto['elementos']] == list(range(10))
+        assert manifiesto['elementos'][4]['error'] == 'Elemento inválido'
+        for registro in manifiesto['elementos']:
+            if 'archivo' in registro:
+                esperado = elementos[registro['indice']]['texto'].encode('utf-8') * 1000
+                assert paquete.read(registro['archivo']) == esperado
+                assert registro['tamano'] == len(elementos[registro['indice']]['texto'])
+
+
+def test_generar_lote_devuelve_un_docx_por_elemento():
+    entradas = list(app.curriculo)[:2]
+    elementos = [{'ciclo': entrada.ciclo, 'area': entrada.area, 'tema': 'Repaso'} for entrada in entradas]
+    elementos.append({'ciclo': 'III'})
+    respuesta = app.app.test_client().post('/generar/lote', json={'elementos': elementos})
+    assert respuesta.status_code == 200
+
+    with zipfile.ZipFile(io.BytesIO(respuesta.get_data())) as paquete:
+        manifiesto = json.loads(paquete.read('manifiesto.json'))
+        assert manifiesto['correctos'] == 2
+        assert manifiesto['elementos'][2]['error'] == 'Faltan datos requeridos'
+        for registro in manifiesto['elementos'][:2]:
+            with zipfile.ZipFile(io.BytesIO(paquete.read(registro['archivo']))) as docx:
+                assert 'word/document.xml' in docx.namelist()
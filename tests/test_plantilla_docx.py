@@ -0,0 +1,46 @@
+import io
+import zipfile
+
+import pytest
+
+import app
+from lista_cotejo import leer_estudiantes
+from plantilla_docx import MIEMBRO_DOCUMENTO, contenido_run, leer_documento_xml
+
+
+def documento_python_docx(textos, num_criterios):
+    salida = io.BytesIO()
+    app.construir_documento(textos, num_criterios).save(salida)
+    return salida.getvalue()
+
+
+def casos():
+    for entrada in app.curriculo:
+        yield entrada.ciclo, entrada.area, entrada.temas[0], entrada.como_dict(), None
+    entrada = next(iter(app.curriculo))
+    contenido = dict(entrada.como_dict(),
+                     competencia='Texto con <etiquetas> & "comillas"\tcon tabulación\ny salto de línea',
+                     criterios=[f'  Criterio {i} con espacios  ' for i in range(12)])
+    yield entrada.ciclo, entrada.area, 'Tema  raro\r\n', contenido, leer_estudiantes('Ana Pérez\nLuis & Co', None)
+
+
+@pytest.mark.parametrize('ciclo, area, tema, contenido, estudiantes', list(casos()))
+def test_el_motor_de_plantilla_arma_el_mismo_documento_que_python_docx(ciclo, area, tema, contenido, estudiantes):
+    textos = app.textos_documento(ciclo, area, tema, contenido, estudiantes)
+    num_criterios = len(contenido['criterios'])
+    plantilla = app.motor_plantilla.renderizar(textos, num_criterios)
+    referencia = documento_python_docx(textos, num_criterios)
+
+    assert leer_documento_xml(plantilla) == leer_documento_xml(referencia)
+    with zipfile.ZipFile(io.BytesIO(plantilla)) as paquete, zipfile.ZipFile(io.BytesIO(referencia)) as otro:
+        assert paquete.testzip() is None
+        assert sorted(paquete.namelist()) == sorted(otro.namelist())
+        for nombre in paquete.namelist():
+            if nombre != MIEMBRO_DOCUMENTO:
+                assert paquete.read(nombre) == otro.read(nombre), nombre
+
+
+def test_contenido_run_rechaza_caracteres_de_control():
+    with pytest.raises(ValueError):
+        contenido_run('texto\x00')
+    assert contenido_run('a\tb') == b'<w:t>a</w:t><w:tab/><w:t>b</w:t>'
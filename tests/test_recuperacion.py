@@ -0,0 +1,24 @@
+import app
+from recuperacion import IndiceTemas
+
+
+def test_cada_tema_del_curriculo_recupera_su_entrada():
+    indice = IndiceTemas.desde_curriculo(app.curriculo)
+    for entrada in app.curriculo:
+        for tema in entrada.temas:
+            (clave, puntaje), = indice.buscar(tema, entrada.ciclo, k=1)
+            assert clave == (entrada.area, entrada.ciclo), tema
+            assert puntaje >= app.IA_RECUPERACION_UMBRAL
+
+
+def test_tolera_tildes_mayusculas_y_errores_de_escritura():
+    indice = IndiceTemas([(('Matemática', 'III'), ['Fracciones equivalentes']),
+                          (('Comunicación', 'III'), ['Fábulas y leyendas'])])
+    assert indice.buscar('FRACCIONES EQIVALENTES', 'III', k=1)[0][0] == ('Matemática', 'III')
+    assert indice.buscar('fabulas', 'III', k=1)[0][0] == ('Comunicación', 'III')
+
+
+def test_un_tema_sin_relacion_no_se_sirve_desde_el_curriculo():
+    entrada = next(iter(app.curriculo))
+    assert app.buscar_por_tema(entrada.ciclo, 'Xylófonos cuánticos de zirconio') is None
+    assert app.buscar_por_tema(entrada.ciclo, entrada.temas[0]) == entrada.como_dict()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from resiliencia_ia import (Interruptor, InterruptorAbierto, LlamadorIA, PresupuestoAgotado, presupuesto,
+                            restante, tiempo_llamada)
+
+
+def test_el_timeout_se_recorta_al_presupuesto():
+    assert tiempo_llamada(20) == 20
+    with presupuesto(1):
+        assert 0.9 < tiempo_llamada(20) <= 1
+        with presupuesto(5):
+            # Anidado manda el límite más cercano
+            assert restante() <= 1
+    with presupuesto(0):
+        with pytest.raises(PresupuestoAgotado):
+            tiempo_llamada(20)
+
+
+def test_el_interruptor_se_abre_y_una_llamada_de_prueba_lo_cierra():
+    interruptor = Interruptor(umbral=0.5, minimo=4, enfriamiento_segundos=0.1)
+    for exito in (True, False, False, True):
+        assert interruptor.permitir()
+        interruptor.registrar(exito)
+    assert interruptor.abierto()
+    assert not interruptor.permitir()
+
+    time.sleep(0.15)
+    assert interruptor.permitir()
+    # Una sola llamada de prueba a la vez
+    assert not interruptor.permitir()
+    interruptor.registrar(True)
+    assert interruptor.estadisticas()['estado'] == 'cerrado'
+
+
+def test_con_el_interruptor_abierto_no_se_llama():
+    interruptor = Interruptor(umbral=0.5, minimo=1, enfriamiento_segundos=60)
+    interruptor.registrar(False)
+    llamadas = []
+    with pytest.raises(InterruptorAbierto):
+        LlamadorIA(interruptor).llamar(lambda **argumentos: llamadas.append(argumentos))
+    assert llamadas == []
+
+
+def test_la_cobertura_usa_la_primera_respuesta():
+    eventos = []
+    primera = threading.Event()
+
+    def lenta_la_primera(request_timeout, **argumentos):
+        if not primera.is_set():
+            primera.set()
+            time.sleep(0.5)
+            return 'primera'
+        return 'segunda'
+
+    llamador = LlamadorIA(Interruptor(umbral=0), timeout_segundos=2, cobertura_segundos=0.05, contar=eventos.append)
+    assert llamador.llamar(lenta_la_primera) == 'segunda'
+    assert eventos == ['coberturas', 'coberturas_ganadas']
+
+
+def test_la_cobertura_asincrona_cancela_la_que_pierde():
+    canceladas = []
+
+    async def funcion(request_timeout, orden):
+        numero = orden.pop(0)
+        try:
+            await asyncio.sleep(0.5 if numero == 1 else 0.01)
+        except asyncio.CancelledError:
+            canceladas.append(numero)
+            raise
+        return numero
+
+    llamador = LlamadorIA(Interruptor(umbral=0), timeout_segundos=2, cobertura_segundos=0.05)
+    assert asyncio.run(llamador.allamar(funcion, orden=[1, 2])) == 2
+    assert canceladas == [1]
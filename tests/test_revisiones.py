@@ -0,0 +1,59 @@
+import app
+from plantilla_docx import leer_documento_xml
+from revisiones import AlmacenRevisiones
+
+
+def generar(cliente, **datos):
+    entrada = next(iter(app.curriculo))
+    datos = dict({'ciclo': entrada.ciclo, 'area': entrada.area, 'tema': 'Revisiones'}, **datos)
+    respuesta = cliente.post('/generar', json=datos)
+    assert respuesta.status_code == 200
+    return respuesta
+
+
+def test_otro_worker_lee_la_revision_del_disco(tmp_path):
+    AlmacenRevisiones(str(tmp_path)).registrar('a' * 64, {'tema': 'Uno'})
+    otro_worker = AlmacenRevisiones(str(tmp_path))
+    assert otro_worker.obtener('a' * 64) == {'tema': 'Uno'}
+    assert otro_worker.obtener('b' * 64) is None
+    # Solo ids de revisión: nada fuera del directorio
+    assert otro_worker.obtener('../' + 'a' * 61) is None
+
+
+def test_las_mismas_entradas_dan_la_misma_revision():
+    cliente = app.app.test_client()
+    assert generar(cliente).headers['X-Revision'] == generar(cliente).headers['X-Revision']
+
+
+def test_editar_un_campo_da_el_mismo_documento_que_generarlo_de_cero():
+    cliente = app.app.test_client()
+    revision = generar(cliente).headers['X-Revision']
+    entradas = cliente.get(f'/documentos/{revision}').get_json()
+
+    respuesta = cliente.patch(f'/documentos/{revision}', json={
+        'tema': 'Revisiones editadas',
+        'contenido': {'estandar': 'Estándar <editado> & nuevo'},
+        'criterios_adicionales': ['Criterio extra'],
+    })
+    assert respuesta.status_code == 200
+    assert respuesta.headers['X-Revision-Anterior'] == revision
+    nueva = respuesta.headers['X-Revision']
+    assert nueva != revision
+
+    editadas = cliente.get(f'/documentos/{nueva}').get_json()
+    assert editadas['contenido']['estandar'] == 'Estándar <editado> & nuevo'
+    assert editadas['contenido']['criterios'] == entradas['contenido']['criterios'] + ['Criterio extra']
+
+    contenido = editadas['contenido']
+    textos = app.textos_documento(editadas['ciclo'], editadas['area'], editadas['tema'], contenido,
+                                  editadas['estudiantes'])
+    de_cero = app.motor_plantilla.renderizar(textos, len(contenido['criterios']))
+    assert leer_documento_xml(respuesta.get_data()) == leer_documento_xml(de_cero)
+
+
+def test_cambios_invalidos():
+    cliente = app.app.test_client()
+    revision = generar(cliente).headers['X-Revision']
+    assert cliente.patch(f'/documentos/{revision}', json={'contenido': {'otro': 'x'}}).status_code == 400
+    assert cliente.patch(f'/documentos/{revision}', json={'criterios_adicionales': ['x'] * 20}).status_code == 400
+    assert cliente.patch('/documentos/inexistente', json={'tema': 'x'}).status_code == 404
@@ -0,0 +1,33 @@
+import app
+from sugerencias import IndiceSugerencias
+
+
+def indice():
+    indice = IndiceSugerencias()
+    for tema in ('Fracciones', 'Amor y fraternidad', 'Suma y resta', 'Figuras geométricas'):
+        indice.agregar(tema, 'Matemática', 'III')
+    return indice
+
+
+def temas(sugerencias):
+    return [sugerencia['tema'] for sugerencia in sugerencias]
+
+
+def test_prefijo_de_cualquier_palabra():
+    assert temas(indice().sugerir('geom')) == ['Figuras geométricas']
+
+
+def test_consulta_corta_no_sugiere_temas_con_una_silaba_en_comun():
+    assert temas(indice().sugerir('frac')) == ['Fracciones']
+
+
+def test_errores_de_escritura_en_consultas_largas():
+    assert temas(indice().sugerir('geomtria')) == ['Figuras geométricas']
+    assert temas(indice().sugerir('fracsiones')) == ['Fracciones']
+
+
+def test_limite_fuera_de_rango():
+    cliente = app.app.test_client()
+    for limite in ('0', '-5'):
+        assert len(cliente.get(f'/api/temas/sugerir?q=a&limite={limite}').get_json()['sugerencias']) == 1
+    assert len(cliente.get('/api/temas/sugerir?q=a&limite=200').get_json()['sugerencias']) <= 50
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+import app
+from trabajos import ColaLlena, GestorTrabajos
+
+
+def esperar_estado(obtener, id_trabajo, estados=('completado', 'error'), segundos=10):
+    limite = time.monotonic() + segundos
+    while True:
+        estado = obtener(id_trabajo)
+        if estado and estado['estado'] in estados:
+            return estado
+        assert time.monotonic() < limite, f'el trabajo quedó en {estado and estado["estado"]}'
+        time.sleep(0.02)
+
+
+def test_el_trabajo_deja_estado_y_archivo_en_disco(tmp_path):
+    gestor = GestorTrabajos(str(tmp_path), hilos=1)
+    enviado = gestor.enviar(lambda datos, etapas: ('etag', datos.encode('utf-8'), 'doc.docx', 'rev'), 'hola')
+    assert enviado['estado'] == 'en_cola'
+    # Otro worker ve el mismo estado
+    estado = esperar_estado(GestorTrabajos(str(tmp_path)).obtener, enviado['id'])
+    assert estado['estado'] == 'completado'
+    assert estado['etag'] == 'etag' and estado['revision'] == 'rev'
+    with open(gestor.ruta_archivo(enviado['id']), 'rb') as archivo:
+        assert archivo.read() == b'hola'
+
+
+def test_un_error_queda_en_el_estado(tmp_path):
+    gestor = GestorTrabajos(str(tmp_path), hilos=1)
+
+    def fallar(datos, etapas):
+        raise ValueError('sin contenido')
+
+    estado = esperar_estado(gestor.obtener, gestor.enviar(fallar, None)['id'])
+    assert (estado['estado'], estado['error']) == ('error', 'sin contenido')
+
+
+def test_cola_llena(tmp_path):
+    gestor = GestorTrabajos(str(tmp_path), hilos=1, max_en_cola=1)
+    soltar = threading.Event()
+
+    def esperar(datos, etapas):
+        soltar.wait(5)
+        return 'etag', b'', 'doc.docx', None
+
+    gestor.enviar(esperar, None)
+    gestor.enviar(esperar, None)
+    with pytest.raises(ColaLlena):
+        gestor.enviar(esperar, None)
+    soltar.set()
+
+
+def test_ids_invalidos(tmp_path):
+    assert GestorTrabajos(str(tmp_path)).obtener('../algo') is None
+
+
+def test_generar_jobs_hasta_la_descarga():
+    entrada = next(iter(app.curriculo))
+    cliente = app.app.test_client()
+    respuesta = cliente.post('/generar/jobs', json={'ciclo': entrada.ciclo, 'area': entrada.area, 'tema': 'Jobs'})
+    assert respuesta.status_code == 202
+    id_trabajo = respuesta.get_json()['id']
+    estado = esperar_estado(lambda id_trabajo: cliente.get(f'/generar/jobs/{id_trabajo}').get_json(), id_trabajo)
+    assert estado['estado'] == 'completado'
+    descarga = cliente.get(f'/generar/jobs/{id_trabajo}/archivo')
+    assert descarga.status_code == 200
+    assert descarga.get_data()[:2] == b'PK'
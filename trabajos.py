@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_documentos import escribir_atomico
+
+# TRABAJOS DE GENERACIÓN EN SEGUNDO PLANO
+# Cada trabajo se ejecuta en un pool de hilos acotado del worker que lo recibió. Su estado y el
+# .docx terminado se escriben en disco para que cualquier worker pueda responder a las consultas.
+
+_PATRON_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class ColaLlena(Exception):
+    pass
+
+
+class GestorTrabajos:
+    def __init__(self, directorio, hilos=4, max_en_cola=32, ttl_segundos=3600):
+        self.directorio = directorio
+        self.hilos = hilos
+        self.max_en_cola = max_en_cola
+        self.ttl_segundos = ttl_segundos
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='trabajo')
+        self._pendientes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, id_trabajo, extension):
+        return os.path.join(self.directorio, f'{id_trabajo}.{extension}')
+
+    def _guardar_estado(self, estado):
+        datos = json.dumps(estado, ensure_ascii=False).encode('utf-8')
+        escribir_atomico(self._ruta(estado['id'], 'json'), datos)
+
+    def enviar(self, funcion, datos):
+        # funcion(datos, etapas) -> (etag, archivo, nombre_archivo, revision); etapas acumula segundos por etapa
+        with self._lock:
+            if self._pendientes >= self.hilos + self.max_en_cola:
+                raise ColaLlena()
+            self._pendientes += 1
+
+        estado = {
+            'id': uuid.uuid4().hex,
+            'estado': 'en_cola',
+            'creado': time.time(),
+            'etapas': {},
+        }
+        respuesta = dict(estado)
+        try:
+            self._guardar_estado(estado)
+            self._pool.submit(self._ejecutar, funcion, datos, estado)
+        except BaseException:
+            with self._lock:
+                self._pendientes -= 1
+            raise
+        self._limpiar()
+        # Copia: el hilo del trabajo sigue modificando estado
+        return respuesta
+
+    def _ejecutar(self, funcion, datos, estado):
+        inicio = time.time()
+        estado['etapas']['cola'] = inicio - estado['creado']
+        estado['estado'] = 'procesando'
+        try:
+            self._guardar_estado(estado)
+            etag, archivo, nombre, revision = funcion(datos, estado['etapas'])
+            escribir_atomico(self._ruta(estado['id'], 'docx'), archivo)
+            estado.update(estado='completado', etag=etag, nombre_archivo=nombre, revision=revision)
+        except Exception as e:
+            estado.update(estado='error', error=str(e))
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+        estado['etapas']['total'] = time.time() - estado['creado']
+        estado['terminado'] = time.time()
+        try:
+            self._guardar_estado(estado)
+        except OSError:
+            pass
+
+    def registrar(self, etapas, etag, archivo, nombre, revision=None):
+        # Guarda como trabajo completado un documento generado fuera del pool (p. ej. en streaming)
+        ahora = time.time()
+        estado = {
+            'id': uuid.uuid4().hex,
+            'estado': 'completado',
+            'creado': ahora,
+            'terminado': ahora,
+            'etapas': dict(etapas),
+            'etag': etag,
+            'nombre_archivo': nombre,
+            'revision': revision,
+        }
+        escribir_atomico(self._ruta(estado['id'], 'docx'), archivo)
+        self._guardar_estado(estado)
+        return estado
+
+    def obtener(self, id_trabajo):
+        if not _PATRON_ID.fullmatch(id_trabajo):
+            return None
+        try:
+            with open(self._ruta(id_trabajo, 'json'), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def ruta_archivo(self, id_trabajo):
+        return self._ruta(id_trabajo, 'docx')
+
+    def en_curso(self):
+        with self._lock:
+            return self._pendientes
+
+    def _limpiar(self):
+        limite = time.time() - self.ttl_segundos
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return
+        for nombre in nombres:
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                if os.stat(ruta).st_mtime < limite:
+                    os.unlink(ruta)
+            except OSError:
+                pass